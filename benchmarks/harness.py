@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import configparser
+import contextlib
+import dataclasses
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+ROOT_PATH = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_PATH))
+
+from benchmarks.server import ServerSettings, StandInServer  # noqa: E402
+from trsync.aio import AsyncClient, AsyncHttp  # noqa: E402
+from trsync.cache import credentials  # noqa: E402
+from trsync.client import Client  # noqa: E402
+from trsync.config import serialize_config, update_config  # noqa: E402
+from trsync.error import AuthenticationError, CommunicationError  # noqa: E402
+from trsync.model import Instance  # noqa: E402
+from trsync.session import SessionPool  # noqa: E402
+
+# Instances x workspaces by instance
+DEFAULT_SCENARIOS = "1x10,10x100,50x1000,200x20000"
+# Count of enabled workspaces by instance in generated config
+ENABLED_WORKSPACES_COUNT = 10
+PASSWORD_SETTER_TOKEN = "benchmark"
+# Seconds after which a window step is considered stuck
+WINDOW_STEP_TIMEOUT = 600.0
+
+
+@dataclasses.dataclass
+class Scenario:
+    instances_count: int
+    workspaces_count: int
+
+    @classmethod
+    def parse(cls, value: str) -> "Scenario":
+        instances_count, workspaces_count = value.lower().split("x")
+        return cls(int(instances_count), int(workspaces_count))
+
+    def __str__(self) -> str:
+        return f"{self.instances_count}x{self.workspaces_count}"
+
+
+@dataclasses.dataclass
+class Result:
+    scenario: str
+    step: str
+    wall_time: float
+    requests: typing.Dict[str, int]
+    peak_memory: typing.Optional[int]
+    failures: int = 0
+
+    def display(self) -> str:
+        memory = (
+            f"{self.peak_memory / 1024 / 1024:8.1f}MiB"
+            if self.peak_memory is not None
+            else "       -   "
+        )
+        return (
+            f"{self.scenario:>12} {self.step:<14} {self.wall_time * 1000:10.1f}ms "
+            f"{memory} {sum(self.requests.values()):7d} req {self.failures:5d} fail"
+        )
+
+
+class Measure:
+    def __init__(self, server: StandInServer, track_memory: bool) -> None:
+        self._server = server
+        self._track_memory = track_memory
+        self.failures = 0
+
+    @contextlib.contextmanager
+    def __call__(
+        self, results: typing.List[Result], scenario: Scenario, step: str
+    ) -> typing.Iterator["Measure"]:
+        # Each step starts without known credentials, as at process start
+        credentials.clear()
+        self.failures = 0
+        counts_before = self._server.counts()
+        if self._track_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            wall_time = time.perf_counter() - start
+            peak_memory = None
+            if self._track_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            counts = {
+                route: count - counts_before.get(route, 0)
+                for route, count in self._server.counts().items()
+                if count != counts_before.get(route, 0)
+            }
+            result = Result(
+                scenario=str(scenario),
+                step=step,
+                wall_time=wall_time,
+                requests=counts,
+                peak_memory=peak_memory,
+                failures=self.failures,
+            )
+            results.append(result)
+            print(result.display())
+
+
+def build_instances(server: StandInServer, scenario: Scenario) -> typing.List[Instance]:
+    return [
+        Instance(
+            address=server.address(instance_index),
+            username="user",
+            password=f"password{instance_index}",
+            unsecure=True,
+            all_workspaces=[],
+            enabled_workspaces=list(
+                range(min(ENABLED_WORKSPACES_COUNT, scenario.workspaces_count))
+            ),
+        )
+        for instance_index in range(scenario.instances_count)
+    ]
+
+
+def bench_client(
+    server: StandInServer,
+    scenario: Scenario,
+    measure: Measure,
+    results: typing.List[Result],
+) -> None:
+    instances = build_instances(server, scenario)
+    session_pool = SessionPool()
+    try:
+        with measure(results, scenario, "client") as step:
+            for instance in instances:
+                try:
+                    Client(instance, session_pool=session_pool).get_workspaces()
+                except (AuthenticationError, CommunicationError):
+                    step.failures += 1
+    finally:
+        session_pool.close()
+
+
+def bench_async_client(
+    server: StandInServer,
+    scenario: Scenario,
+    measure: Measure,
+    results: typing.List[Result],
+) -> None:
+    instances = build_instances(server, scenario)
+
+    async def fetch_all(step: Measure) -> None:
+        http = AsyncHttp()
+        try:
+            fetched = await asyncio.gather(
+                *(AsyncClient(instance, http).get_workspaces() for instance in instances),
+                return_exceptions=True,
+            )
+        finally:
+            http.close()
+        for result in fetched:
+            if isinstance(result, (AuthenticationError, CommunicationError)):
+                step.failures += 1
+            elif isinstance(result, BaseException):
+                raise result
+
+    with measure(results, scenario, "async client") as step:
+        asyncio.run(fetch_all(step))
+
+
+def write_config(
+    server: StandInServer, scenario: Scenario, home: pathlib.Path
+) -> None:
+    # Config as saved by the window, passwords are known by password setter
+    instances = build_instances(server, scenario)
+    config = configparser.ConfigParser()
+    update_config(config, instances, str(home / "Tracim"), raw_passwords=False)
+    (home / ".trsync.conf").write_text(serialize_config(config))
+    for instance in instances:
+        server.passwords[instance.address] = instance.password
+
+
+def pump_until(root, done: typing.Callable[[], bool]) -> None:
+    deadline = time.monotonic() + WINDOW_STEP_TIMEOUT
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Window step did not finish")
+        root.update()
+
+
+def bench_app(
+    server: StandInServer,
+    scenario: Scenario,
+    measure: Measure,
+    results: typing.List[Result],
+) -> None:
+    import tkinter as tk
+    from trsync.app import App
+
+    def idle(app: App) -> bool:
+        return not app._loop_pump._tasks and app._dispatcher._queue.empty()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        write_config(server, scenario, pathlib.Path(home))
+        root = tk.Tk()
+        try:
+            with measure(results, scenario, "app load"):
+                app = App(
+                    root,
+                    password_setter_port=server.port,
+                    password_setter_token=PASSWORD_SETTER_TOKEN,
+                )
+                pump_until(root, lambda: idle(app))
+
+            # Restarted window is displayed from snapshot, then refreshed
+            app.destroy()
+            with measure(results, scenario, "app reload"):
+                app = App(
+                    root,
+                    password_setter_port=server.port,
+                    password_setter_token=PASSWORD_SETTER_TOKEN,
+                )
+                pump_until(root, lambda: idle(app))
+
+            for instance in app._instances:
+                instance.password += "-changed"
+            with measure(results, scenario, "app save"):
+                app._save_to_config()
+                pump_until(root, lambda: idle(app))
+                app._config_writer.flush()
+            app.destroy()
+        finally:
+            root.destroy()
+
+
+def bench_double_lists(
+    server: StandInServer,
+    scenario: Scenario,
+    measure: Measure,
+    results: typing.List[Result],
+) -> None:
+    import tkinter as tk
+    from trsync.utils import DoubleLists
+
+    root = tk.Tk()
+    try:
+        lists = DoubleLists(root, left_label="Gauche", right_label="Droite")
+        lists.pack()
+        with measure(results, scenario, "double lists"):
+            # One instance tab fill, then moves of all workspaces back and forth
+            for workspace_id in range(scenario.workspaces_count):
+                lists.add_left(workspace_id, f"Espace n°{workspace_id}")
+            root.update()
+            lists.move_all_right()
+            root.update()
+            lists.move_all_left()
+            root.update()
+            lists.reset()
+            root.update()
+    finally:
+        root.destroy()
+
+
+def bench_typeahead(
+    server: StandInServer,
+    scenario: Scenario,
+    measure: Measure,
+    results: typing.List[Result],
+) -> None:
+    import tkinter as tk
+    from trsync.utils import DoubleLists
+
+    root = tk.Tk()
+    try:
+        lists = DoubleLists(root, left_label="Gauche", right_label="Droite")
+        lists.pack()
+        for workspace_id in range(scenario.workspaces_count):
+            lists.add_left(workspace_id, f"Espace n°{workspace_id}")
+        root.update()
+        query_entry = lists._left_list._query_entry
+        slowest = 0.0
+        with measure(results, scenario, "typeahead"):
+            # Query typed then erased character by character, one frame each
+            for character in "ESPACE 12":
+                start = time.perf_counter()
+                query_entry.insert("end", character)
+                root.update()
+                slowest = max(slowest, time.perf_counter() - start)
+            while query_entry.get():
+                start = time.perf_counter()
+                query_entry.delete(len(query_entry.get()) - 1)
+                root.update()
+                slowest = max(slowest, time.perf_counter() - start)
+        print(f"{'':>12} {'':<14} {slowest * 1000:10.1f}ms slowest keystroke")
+    finally:
+        root.destroy()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trsync configure benchmarks")
+    parser.add_argument(
+        "--scenarios",
+        default=DEFAULT_SCENARIOS,
+        help="Comma separated instances x workspaces counts (ex. 1x10,200x20000)",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="In seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not trace peak memory (tracing slows down measured code)",
+    )
+    parser.add_argument(
+        "--no-window",
+        action="store_true",
+        help="Skip steps needing a display (ex. use xvfb-run to get one)",
+    )
+    parser.add_argument("--json", type=pathlib.Path, help="Write results into file")
+    args = parser.parse_args()
+
+    scenarios = [Scenario.parse(value) for value in args.scenarios.split(",")]
+    with_window = not args.no_window and (
+        os.name == "nt" or bool(os.environ.get("DISPLAY"))
+    )
+    if not with_window:
+        print("Window steps skipped, no display available")
+
+    steps = [bench_client, bench_async_client]
+    if with_window:
+        steps += [bench_app, bench_double_lists, bench_typeahead]
+
+    results: typing.List[Result] = []
+    original_home = os.environ.get("HOME")
+    for scenario in scenarios:
+        server = StandInServer(
+            ServerSettings(
+                workspaces_count=scenario.workspaces_count,
+                latency=args.latency,
+                error_rate=args.error_rate,
+            )
+        ).start()
+        measure = Measure(server, track_memory=not args.no_memory)
+        try:
+            for step in steps:
+                step(server, scenario, measure, results)
+        finally:
+            server.stop()
+            if original_home is not None:
+                os.environ["HOME"] = original_home
+
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps([dataclasses.asdict(result) for result in results], indent=2)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import collections
+import dataclasses
+import json
+import random
+import re
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Instances are served by the same server, under a path prefix
+# (ex. "127.0.0.1:8080/i3"), so many instances can be simulated
+INSTANCE_PREFIX_PATTERN = re.compile(r"^/i\d+(?=/)")
+WORKSPACES_PATH_PATTERN = re.compile(r"^/api/users/(\d+)/workspaces$")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Default backlog makes concurrent connections wait for SYN retries
+    request_queue_size = 1024
+
+
+@dataclasses.dataclass
+class ServerSettings:
+    workspaces_count: int = 10
+    # Seconds waited before each answer
+    latency: float = 0.0
+    # Part (between 0 and 1) of requests answered with a 503 error
+    error_rate: float = 0.0
+    user_id: int = 1
+    seed: int = 0
+
+
+class StandInServer:
+    # Stand-in of Tracim and password setter APIs used by trsync configure
+    def __init__(self, settings: ServerSettings) -> None:
+        self.settings = settings
+        self.passwords: typing.Dict[str, str] = {}
+        self._counts: typing.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(settings.seed)
+        self._bodies: typing.Dict[typing.Tuple[int, int], bytes] = {}
+        self._server = _Server(("127.0.0.1", 0), _build_handler(self))
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def address(self, instance_index: int) -> str:
+        return f"127.0.0.1:{self.port}/i{instance_index}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def counts(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self._counts[route] += 1
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.settings.error_rate
+
+    def workspaces_body(self, start: int, count: int) -> bytes:
+        # Bodies are cached, building 20k workspaces JSON would dominate timings
+        key = (start, count)
+        if (body := self._bodies.get(key)) is None:
+            end = min(self.settings.workspaces_count, start + count)
+            body = json.dumps(
+                [
+                    {"workspace_id": workspace_id, "label": f"Espace n°{workspace_id}"}
+                    for workspace_id in range(start, end)
+                ]
+            ).encode()
+            self._bodies[key] = body
+        return body
+
+
+def _build_handler(server: StandInServer) -> typing.Type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are sent separately, Nagle would delay body
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self._handle("GET")
+
+        def do_POST(self) -> None:
+            self._handle("POST")
+
+        def _handle(self, method: str) -> None:
+            url = urlparse(self.path)
+            path = INSTANCE_PREFIX_PATTERN.sub("", url.path)
+            query = parse_qs(url.query)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            if server.settings.latency:
+                time.sleep(server.settings.latency)
+
+            route, status, content = self._route(method, path, query, body)
+            server.count(f"{method} {route}")
+            if status == 200 and server.should_fail():
+                status, content = 503, b"Service unavailable"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _route(
+            self,
+            method: str,
+            path: str,
+            query: typing.Dict[str, typing.List[str]],
+            body: bytes,
+        ) -> typing.Tuple[str, int, bytes]:
+            if path == "/api/auth/whoami" and method == "GET":
+                return path, 200, json.dumps({"user_id": server.settings.user_id}).encode()
+
+            if (match := WORKSPACES_PATH_PATTERN.match(path)) and method == "GET":
+                route = "/api/users/{id}/workspaces"
+                if int(match.group(1)) != server.settings.user_id:
+                    return route, 403, b""
+                total = server.settings.workspaces_count
+                if "count" not in query:
+                    return route, 200, server.workspaces_body(0, total)
+                start = int(query.get("page_token", ["0"])[0])
+                count = int(query["count"][0])
+                items = server.workspaces_body(start, count)
+                page = b'{"items":%s,"has_next":%s,"next_page_token":"%d"}' % (
+                    items,
+                    b"true" if start + count < total else b"false",
+                    start + count,
+                )
+                return route, 200, page
+
+            if path.startswith("/password/"):
+                route = "/password/{name}"
+                name = unquote(path[len("/password/") :])
+                if method == "POST":
+                    server.passwords[name] = body.decode()
+                    return route, 201, b""
+                if name not in server.passwords:
+                    return route, 404, b""
+                return route, 200, server.passwords[name].encode()
+
+            if path == "/passwords":
+                if method == "POST":
+                    server.passwords.update(json.loads(body))
+                    return path, 201, b""
+                names = query.get("instances", [""])[0].split(",")
+                passwords = {
+                    name: server.passwords[name]
+                    for name in names
+                    if name in server.passwords
+                }
+                return path, 200, json.dumps(passwords).encode()
+
+            return path, 404, b""
+
+    return Handler
@@ -0,0 +1,163 @@
+import argparse
+import gc
+import os
+import pathlib
+import sys
+import tempfile
+import tracemalloc
+import typing
+
+ROOT_PATH = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_PATH))
+
+from benchmarks.harness import (  # noqa: E402
+    PASSWORD_SETTER_TOKEN,
+    Scenario,
+    pump_until,
+    write_config,
+)
+from benchmarks.server import ServerSettings, StandInServer  # noqa: E402
+from trsync.cache import workspaces_flights  # noqa: E402
+
+# Count of save and refresh cycles, and workspaces of soaked instance
+DEFAULT_CYCLES = 1000
+DEFAULT_WORKSPACES = 1000
+# Cycles run before taking reference counts, to fill caches
+WARMUP_CYCLES = 50
+# Allowed Python heap growth (in bytes) between reference and end
+HEAP_TOLERANCE = 1024 * 1024
+
+# Widgets count, Tcl commands count and Python heap size
+Measure = typing.Tuple[int, int, int]
+
+
+def count_widgets(widget) -> int:
+    return sum(1 + count_widgets(child) for child in widget.winfo_children())
+
+
+def measure(root) -> Measure:
+    # Tcl commands are widgets and Python callbacks
+    gc.collect()
+    return (
+        count_widgets(root),
+        len(root.tk.splitlist(root.tk.call("info", "commands"))),
+        tracemalloc.get_traced_memory()[0],
+    )
+
+
+def run_soak(
+    cycles: int = DEFAULT_CYCLES, workspaces_count: int = DEFAULT_WORKSPACES
+) -> typing.Tuple[Measure, Measure]:
+    # Measures after warm-up and after all cycles, needs a display
+    import tkinter as tk
+    from tkinter import messagebox
+    from trsync.app import App
+
+    def fail(title: str, message: str) -> None:
+        raise AssertionError(f"{title} : {message}")
+
+    # Confirmation dialog of each save would wait for a click, error ones
+    # must fail the soak
+    original_dialogs = messagebox.showinfo, messagebox.showerror
+    messagebox.showinfo = lambda *args, **kwargs: "ok"
+    messagebox.showerror = fail
+
+    scenario = Scenario(instances_count=1, workspaces_count=workspaces_count)
+    server = StandInServer(
+        ServerSettings(workspaces_count=scenario.workspaces_count)
+    ).start()
+    original_home = os.environ.get("HOME")
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["HOME"] = home
+            write_config(server, scenario, pathlib.Path(home))
+            root = tk.Tk()
+            try:
+                app = App(
+                    root,
+                    password_setter_port=server.port,
+                    password_setter_token=PASSWORD_SETTER_TOKEN,
+                )
+                instance = app._instances[0]
+                app._tabs_control.select(app._tabs_frames[instance.address])
+
+                def idle() -> bool:
+                    return not app._loop_pump._tasks and app._dispatcher._queue.empty()
+
+                pump_until(root, idle)
+                reference: typing.Optional[Measure] = None
+                for cycle in range(cycles + WARMUP_CYCLES):
+                    if cycle == WARMUP_CYCLES:
+                        reference = measure(root)
+                    tab_frame = app._tabs_frames[instance.address]._content
+                    assert tab_frame is not None
+                    # Save, as "Enregistrer" then "Appliquer" buttons do
+                    tab_frame._validate()
+                    pump_until(root, idle)
+                    workspace_lists = tab_frame._workspace_lists
+                    workspace_id = instance.all_workspaces[0].id
+                    if workspace_id in set(workspace_lists.get_right_ids()):
+                        workspace_lists.move_left([workspace_id])
+                    else:
+                        workspace_lists.move_right([workspace_id])
+                    tab_frame._apply_workspaces()
+                    pump_until(root, idle)
+                    # Refresh from server, not from just fetched result
+                    workspaces_flights.clear()
+                    app._load_instance(instance)
+                    pump_until(root, idle)
+                    app._config_writer.flush()
+
+                assert reference is not None
+                final = measure(root)
+                app.destroy()
+            finally:
+                root.destroy()
+    finally:
+        server.stop()
+        tracemalloc.stop()
+        messagebox.showinfo, messagebox.showerror = original_dialogs
+        if original_home is not None:
+            os.environ["HOME"] = original_home
+    return reference, final
+
+
+def growths(reference: Measure, final: Measure) -> typing.List[str]:
+    failures = []
+    if final[0] > reference[0]:
+        failures.append(f"widgets count grew by {final[0] - reference[0]}")
+    if final[1] > reference[1]:
+        failures.append(f"Tcl commands count grew by {final[1] - reference[1]}")
+    if final[2] - reference[2] > HEAP_TOLERANCE:
+        failures.append(f"Python heap grew by {final[2] - reference[2]} bytes")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Save and refresh an instance tab repeatedly, then check "
+        "that widgets, Tcl commands and Python heap did not grow"
+    )
+    parser.add_argument("--cycles", type=int, default=DEFAULT_CYCLES)
+    parser.add_argument(
+        "--workspaces",
+        type=int,
+        default=DEFAULT_WORKSPACES,
+        help="Workspaces of the instance",
+    )
+    args = parser.parse_args()
+
+    reference, final = run_soak(args.cycles, args.workspaces)
+    print(f"{'':<12} {'widgets':>8} {'commands':>9} {'heap':>12}")
+    for name, values in (("reference", reference), ("final", final)):
+        print(f"{name:<12} {values[0]:8d} {values[1]:9d} {values[2]:12d}")
+
+    failures = growths(reference, final)
+    for failure in failures:
+        print(failure)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
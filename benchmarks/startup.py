@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Default budgets, in milliseconds, of median measures
+IMPORT_BUDGET = 150.0
+WINDOW_BUDGET = 600.0
+
+ROOT_PATH = pathlib.Path(__file__).resolve().parent.parent
+
+# Measure done in a fresh interpreter, prints a JSON result on last line
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import trsync.app
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "requests": "requests" in sys.modules}))
+"""
+
+WINDOW_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import tkinter as tk
+from trsync.app import App
+root = tk.Tk()
+root.title("TrSync")
+root.geometry("500x650")
+app = App(root)
+root.update()
+root.wait_visibility()
+elapsed = time.perf_counter() - start
+loaded = "requests" in sys.modules
+root.destroy()
+print(json.dumps({"elapsed": elapsed, "requests": loaded}))
+"""
+
+
+def run_measure(script: str, home: str) -> dict:
+    # Empty home folder so user config does not trigger network calls
+    env = dict(os.environ, HOME=home, USERPROFILE=home)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT_PATH), env.get("PYTHONPATH")])
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT_PATH,
+        env=env,
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(name: str, script: str, runs: int, budget: float) -> bool:
+    with tempfile.TemporaryDirectory() as home:
+        results = [run_measure(script, home) for _ in range(runs)]
+
+    timings = [result["elapsed"] * 1000 for result in results]
+    median = statistics.median(timings)
+    ok = median <= budget
+    print(
+        f"{name}: median {median:.1f}ms, min {min(timings):.1f}ms, "
+        f"max {max(timings):.1f}ms (budget {budget:.1f}ms) "
+        + ("OK" if ok else "OVER BUDGET")
+    )
+    if any(result["requests"] for result in results):
+        print(f"{name}: requests must not be imported before first network call")
+        ok = False
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trsync startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=IMPORT_BUDGET,
+        help="Maximum median import time of trsync.app, in milliseconds",
+    )
+    parser.add_argument(
+        "--window-budget",
+        type=float,
+        default=WINDOW_BUDGET,
+        help="Maximum median time to first window, in milliseconds",
+    )
+    args = parser.parse_args()
+
+    ok = measure("import", IMPORT_SCRIPT, args.runs, args.import_budget)
+    if os.name != "nt" and not os.environ.get("DISPLAY"):
+        print("first window: skipped, no display available")
+    else:
+        ok = measure("first window", WINDOW_SCRIPT, args.runs, args.window_budget) and ok
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
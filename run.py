@@ -1,7 +1,5 @@
-import tkinter as tk
 import argparse
-
-from trsync.app import App
+import pathlib
 
 
 def main():
@@ -16,6 +14,35 @@ def main():
         type=str,
         help="If password setter used, set security access token here",
     )
+    parser.add_argument(
+        "--provision",
+        type=pathlib.Path,
+        metavar="MANIFEST",
+        help="Configure instances from given JSON manifest, without window",
+    )
+    parser.add_argument(
+        "--migrate-config",
+        choices=("ini", "sqlite"),
+        help="Move config into INI file (default) or SQLite database, without window",
+    )
+    parser.add_argument(
+        "--export-config",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Write config as INI file into FILE, without window",
+    )
+    parser.add_argument(
+        "--trace",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Write operations timings into FILE (Chrome trace events JSON)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve requests and saves metrics (Prometheus text) on 127.0.0.1:PORT",
+    )
     args = parser.parse_args()
 
     if args.password_setter_port:
@@ -23,15 +50,64 @@ def main():
             args.password_setter_token is not None
         ), "You must provide --password-setter-token option if --password-setter-port given"
 
-    root = tk.Tk()
-    root.title("TrSync")
-    root.geometry("500x650")
-    app = App(
-        root,
-        password_setter_port=args.password_setter_port,
-        password_setter_token=args.password_setter_token,
-    )
-    app.mainloop()
+    trace_writer = None
+    if args.trace is not None:
+        from trsync.trace import ChromeTraceWriter, tracer
+
+        trace_writer = ChromeTraceWriter()
+        tracer.add_listener(trace_writer.add)
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        from trsync.metrics import MetricsServer, metrics
+        from trsync.trace import tracer
+
+        tracer.add_listener(metrics.add)
+        try:
+            metrics_server = MetricsServer(metrics, args.metrics_port).start()
+        except OSError as exc:
+            print(f"Fail to serve metrics on port {args.metrics_port}: ", exc)
+
+    try:
+        if args.provision is not None:
+            # Imported here to not depend on tkinter
+            from trsync.provision import provision
+
+            raise SystemExit(
+                provision(
+                    args.provision,
+                    password_setter_port=args.password_setter_port,
+                    password_setter_token=args.password_setter_token,
+                )
+            )
+
+        if args.migrate_config is not None or args.export_config is not None:
+            from trsync.config import config_paths
+            from trsync.store import export_store, migrate_store
+
+            config_file_path = config_paths()[0]
+            if args.migrate_config is not None:
+                raise SystemExit(migrate_store(config_file_path, args.migrate_config))
+            raise SystemExit(export_store(config_file_path, args.export_config))
+
+        import tkinter as tk
+        from trsync.app import App
+
+        root = tk.Tk()
+        root.title("TrSync")
+        root.geometry("500x650")
+        app = App(
+            root,
+            password_setter_port=args.password_setter_port,
+            password_setter_token=args.password_setter_token,
+        )
+        app.mainloop()
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        if trace_writer is not None:
+            trace_writer.write(args.trace)
+            print(tracer.summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import typing
+import urllib.parse
+
+import pytest
+
+from trsync.aio import MAX_HEADERS_SIZE, AsyncClient, AsyncHttp, AsyncPasswordSetter
+from trsync.error import CommunicationError, FailToGetPassword, InvalidResponseError
+from trsync.model import Instance
+
+TIMEOUT = (2.0, 2.0)
+
+# Returns raw response to a request, given its method, target and body
+Handler = typing.Callable[[str, str, bytes], bytes]
+
+
+def _response(
+    status: str = "200 OK", body: bytes = b"", headers: str = ""
+) -> bytes:
+    return (
+        f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n{headers}\r\n"
+    ).encode() + body
+
+
+class _Server:
+    # Local HTTP server answering raw responses, to check client parsing
+    def __init__(self, handler: Handler) -> None:
+        self.handler = handler
+        self.requests: typing.List[typing.Tuple[str, str]] = []
+        self.connections = 0
+        self.port = 0
+
+    async def __aenter__(self) -> "_Server":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._server.close()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def _serve(self, reader, writer) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+                method, target, _ = head.split("\r\n")[0].split(" ")
+                length = 0
+                for line in head.split("\r\n")[1:]:
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":")[1])
+                body = await reader.readexactly(length)
+                self.requests.append((method, target))
+                response = self.handler(method, target, body)
+                writer.write(response)
+                await writer.drain()
+                if b"Connection: close" in response:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _run(handler: Handler, client: typing.Callable[[_Server, AsyncHttp], typing.Any]):
+    async def run():
+        http = AsyncHttp()
+        try:
+            async with _Server(handler) as server:
+                return server, await client(server, http)
+        finally:
+            http.close()
+
+    return asyncio.run(run())
+
+
+def test_content_length_responses_reuse_connection():
+    def handler(method, target, body):
+        return _response(body=target.encode())
+
+    async def client(server, http):
+        contents = []
+        for path in ("/a", "/b"):
+            async with await http.request("GET", server.url(path), TIMEOUT) as response:
+                contents.append(await response.read())
+        return contents
+
+    server, contents = _run(handler, client)
+    assert contents == [b"/a", b"/b"]
+    assert server.connections == 1
+
+
+def test_chunked_response():
+    def handler(method, target, body):
+        return (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nTrailer: x\r\n\r\n"
+        )
+
+    async def client(server, http):
+        response = await http.request("GET", server.url("/"), TIMEOUT)
+        return [chunk async for chunk in response.iter_chunks(1024)]
+
+    _, chunks = _run(handler, client)
+    assert chunks == [b"hello", b" world"]
+
+
+def test_redirections_are_followed():
+    def handler(method, target, body):
+        if target == "/old":
+            return _response("301 Moved Permanently", headers="Location: /new\r\n")
+        if target == "/form":
+            return _response("303 See Other", headers="Location: /new\r\n")
+        return _response(body=method.encode())
+
+    async def client(server, http):
+        results = []
+        for method, path in (("GET", "/old"), ("POST", "/form")):
+            response = await http.request(method, server.url(path), TIMEOUT, data=b"x")
+            results.append((response.status_code, await response.read()))
+        return results
+
+    server, results = _run(handler, client)
+    assert results == [(200, b"GET"), (200, b"GET")]
+    assert server.requests == [
+        ("GET", "/old"),
+        ("GET", "/new"),
+        ("POST", "/form"),
+        ("GET", "/new"),
+    ]
+
+
+def test_redirection_loop_fails():
+    def handler(method, target, body):
+        return _response("302 Found", headers="Location: /loop\r\n")
+
+    async def client(server, http):
+        with pytest.raises(CommunicationError):
+            await http.request("GET", server.url("/loop"), TIMEOUT)
+
+    _run(handler, client)
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        b"garbage\r\n\r\n",
+        b"HTTP/1.1 abc OK\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nX-Long: " + b"x" * MAX_HEADERS_SIZE + b"\r\n\r\n",
+    ],
+)
+def test_invalid_response_head_is_an_invalid_response(raw):
+    async def client(server, http):
+        with pytest.raises(InvalidResponseError):
+            await http.request("GET", server.url("/"), TIMEOUT)
+
+    _run(lambda method, target, body: raw, client)
+
+
+def test_connection_closed_before_response_is_a_communication_error():
+    def handler(method, target, body):
+        raise ConnectionResetError()
+
+    async def client(server, http):
+        with pytest.raises(CommunicationError):
+            await http.request("GET", server.url("/"), TIMEOUT)
+
+    _run(handler, client)
+
+
+def test_connection_closed_during_body_is_a_communication_error():
+    def handler(method, target, body):
+        return b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\nConnection: close\r\n\r\nabc"
+
+    async def client(server, http):
+        response = await http.request("GET", server.url("/"), TIMEOUT)
+        with pytest.raises(CommunicationError):
+            await response.read()
+
+    _run(handler, client)
+
+
+def test_workspaces_pages_and_streamed_array():
+    def handler(method, target, body):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(target).query)
+        if "page_token" not in query:
+            page = {
+                "items": [{"workspace_id": 1, "label": "Un"}],
+                "has_next": True,
+                "next_page_token": "next",
+            }
+            return _response(body=json.dumps(page).encode())
+        # Workspace split between chunks
+        chunks = [b'[{"work', b'space_id": 2, "label": "Deux"}]']
+        return (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + b"".join(b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks)
+            + b"0\r\n\r\n"
+        )
+
+    async def client(server, http):
+        instance = Instance(
+            address=f"127.0.0.1:{server.port}",
+            username="user",
+            password="secret",
+            unsecure=True,
+            all_workspaces=[],
+            enabled_workspaces=[],
+        )
+        return [
+            [(workspace.id, workspace.name) for workspace in page]
+            async for page in AsyncClient(
+                instance, http, user_id=1
+            ).iter_workspace_pages()
+        ]
+
+    server, pages = _run(handler, client)
+    assert pages == [[(1, "Un")], [(2, "Deux")]]
+    assert [target for _, target in server.requests] == [
+        "/api/users/1/workspaces",
+        "/api/users/1/workspaces?page_token=next",
+    ]
+
+
+def test_password_setter_falls_back_on_instance_calls():
+    passwords = {"a.example.com": "secret"}
+
+    def handler(method, target, body):
+        if target.startswith("/passwords"):
+            return _response("404 Not Found")
+        instance_name = target.rsplit("/", 1)[1]
+        if method == "POST":
+            passwords[instance_name] = body.decode()
+            return _response("201 Created")
+        if instance_name not in passwords:
+            return _response("404 Not Found")
+        return _response(body=passwords[instance_name].encode())
+
+    async def client(server, http):
+        password_setter = AsyncPasswordSetter(server.port, "token", http)
+        results = await password_setter.get_passwords_async(
+            ["a.example.com", "b.example.com"]
+        )
+        failures = await password_setter.set_passwords_async(
+            {"a.example.com": "secret", "b.example.com": "new"}
+        )
+        return results, failures
+
+    server, (results, failures) = _run(handler, client)
+    assert results["a.example.com"] == "secret"
+    assert isinstance(results["b.example.com"], FailToGetPassword)
+    assert failures == {}
+    assert passwords["b.example.com"] == "new"
+    # Batch endpoint is asked once, known password is not sent again
+    assert [target for _, target in server.requests].count(
+        "/passwords?instances=a.example.com%2Cb.example.com"
+    ) == 1
+    assert ("POST", "/passwords") not in server.requests
+    assert ("POST", "/password/a.example.com") not in server.requests
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from trsync import client as client_module
+from trsync.client import WorkspacesResponseParser
+from trsync.error import InvalidResponseError
+
+
+def _workspaces(count):
+    return [{"workspace_id": index, "label": f"W{index}"} for index in range(count)]
+
+
+def _parse(chunks):
+    parser = WorkspacesResponseParser()
+    batches = [batch for chunk in chunks for batch in parser.feed(chunk)]
+    batches.extend(parser.close())
+    return [[workspace.id for workspace in batch] for batch in batches], parser
+
+
+def test_streamed_array_is_given_by_batches(monkeypatch):
+    monkeypatch.setattr(client_module, "STREAM_BATCH_SIZE", 3)
+    content = json.dumps(_workspaces(7)).encode()
+    batches, parser = _parse(
+        [content[index : index + 5] for index in range(0, len(content), 5)]
+    )
+    assert [id_ for batch in batches for id_ in batch] == list(range(7))
+    assert all(len(batch) >= 3 for batch in batches[:-1])
+    assert parser.next_page_token is None
+
+
+def test_empty_array_gives_one_empty_batch():
+    assert _parse([b"  ", b"[]"])[0] == [[]]
+
+
+def test_page_object_gives_next_page_token():
+    page = {"items": _workspaces(2), "has_next": True, "next_page_token": "abc"}
+    content = json.dumps(page).encode()
+    batches, parser = _parse([content[:10], content[10:]])
+    assert batches == [[0, 1]]
+    assert parser.next_page_token == "abc"
+
+    last_page = {"items": [], "has_next": False, "next_page_token": "abc"}
+    batches, parser = _parse([json.dumps(last_page).encode()])
+    assert batches == [[]]
+    assert parser.next_page_token is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"", b"[{", b'[{"label": "x"}]', b"[1]", b'{"items": 1}', b"{}", b"<html>"],
+)
+def test_invalid_response(content):
+    with pytest.raises(InvalidResponseError):
+        _parse([content])
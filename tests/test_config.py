@@ -0,0 +1,155 @@
+import configparser
+import dataclasses
+import pathlib
+
+from trsync.config import ConfigWriter, merge_instance, merge_server_options
+from trsync.model import Instance
+from trsync.store import IniConfigStore
+
+
+class _FailingStore(IniConfigStore):
+    # Fail given count of writes
+    def __init__(self, path: pathlib.Path, failures: int) -> None:
+        super().__init__(path)
+        self.failures = failures
+
+    def write(self, old_content, content, sections=None):
+        self.sections = sections
+        if self.failures:
+            self.failures -= 1
+            raise OSError("Disk full")
+        super().write(old_content, content, sections)
+
+
+class _Journal:
+    def __init__(self):
+        self.records = []
+
+    def record(self, old_content, new_content, credentials_changed=()):
+        self.records.append((old_content, new_content, set(credentials_changed)))
+
+
+def test_flush_writes_last_submitted_content(tmp_path):
+    store = IniConfigStore(tmp_path / "config")
+    config_writer = ConfigWriter(store, tmp_path / "track", delay=60.0)
+    config_writer.submit("[server]\na = 1\n")
+    config_writer.submit("[server]\na = 2\n")
+    assert config_writer.pending
+    config_writer.flush()
+    assert not config_writer.pending
+    assert store.read() == "[server]\na = 2\n"
+    assert config_writer.written == "[server]\na = 2\n"
+    assert (tmp_path / "track").exists()
+
+
+def test_failed_write_is_kept_and_written_again(tmp_path):
+    store = _FailingStore(tmp_path / "config", failures=1)
+    journal = _Journal()
+    config_writer = ConfigWriter(
+        store, tmp_path / "track", delay=60.0, journal=journal
+    )
+    config_writer.submit("[server]\na = 1\n", credentials_changed=["a.example.com"])
+    config_writer.flush()
+    assert config_writer.pending
+    assert not (tmp_path / "config").exists()
+
+    config_writer.flush()
+    assert not config_writer.pending
+    assert store.read() == "[server]\na = 1\n"
+    assert journal.records == [(None, "[server]\na = 1\n", {"a.example.com"})]
+
+
+def test_content_submitted_after_failure_replaces_failed_one(tmp_path):
+    store = _FailingStore(tmp_path / "config", failures=1)
+    config_writer = ConfigWriter(store, tmp_path / "track", delay=60.0)
+    config_writer.submit("[a]\nx = 1\n", sections={"a": {"x": "1"}})
+    config_writer.flush()
+    config_writer.submit(
+        "[a]\nx = 1\n\n[b]\ny = 2\n", sections={"b": {"y": "2"}}
+    )
+    config_writer.flush()
+    assert store.read() == "[a]\nx = 1\n\n[b]\ny = 2\n"
+    # Changes of failed write are written with next ones
+    assert store.sections == {"a": {"x": "1"}, "b": {"y": "2"}}
+
+
+def test_sections_are_unknown_once_a_content_without_them_is_submitted(tmp_path):
+    store = _FailingStore(tmp_path / "config", failures=0)
+    config_writer = ConfigWriter(store, tmp_path / "track", delay=60.0)
+    config_writer.submit("[a]\nx = 1\n", sections={"a": {"x": "1"}})
+    config_writer.submit("[a]\nx = 2\n")
+    config_writer.flush()
+    assert store.sections is None
+
+
+def test_acknowledge_drops_pending_content(tmp_path):
+    store = IniConfigStore(tmp_path / "config")
+    config_writer = ConfigWriter(store, tmp_path / "track", delay=60.0)
+    config_writer.submit("[server]\na = 1\n")
+    assert config_writer.acknowledge("[server]\na = 2\n")
+    assert not config_writer.pending
+    assert not config_writer.acknowledge("[server]\na = 3\n")
+    config_writer.flush()
+    assert not (tmp_path / "config").exists()
+
+
+def _instance(**values):
+    instance = Instance(
+        address="a.example.com",
+        username="alice",
+        password="",
+        unsecure=False,
+        all_workspaces=[],
+        enabled_workspaces=[1, 2, 3],
+    )
+    return dataclasses.replace(instance, **values)
+
+
+def test_merge_instance_keeps_local_changes_of_other_options():
+    written = _instance()
+    # Locally : workspace 1 disabled, 4 enabled
+    instance = _instance(enabled_workspaces=[2, 3, 4])
+    # By other program : username changed, workspace 3 disabled, 5 enabled
+    reloaded = _instance(username="bob", enabled_workspaces=[1, 2, 5])
+
+    assert merge_instance(instance, written, reloaded)
+    assert instance.username == "bob"
+    assert instance.enabled_workspaces == [2, 4, 5]
+    assert instance.is_enabled(5) and not instance.is_enabled(3)
+
+
+def test_merge_instance_keeps_local_credentials():
+    # Ex. password not in config, as when password setter is used
+    instance = _instance(password="secret", unsecure=True)
+    written = _instance()
+    reloaded = _instance(enabled_workspaces=[1])
+    assert not merge_instance(instance, written, reloaded)
+    assert (instance.password, instance.unsecure) == ("secret", True)
+    assert instance.enabled_workspaces == [1]
+
+
+def test_merge_instance_without_written_section_takes_reloaded_options():
+    instance = _instance(username="local", enabled_workspaces=[9])
+    reloaded = _instance()
+    assert merge_instance(instance, None, reloaded)
+    assert instance.username == "alice"
+    assert instance.enabled_workspaces == [1, 2, 3]
+
+
+def _config(**options):
+    config = configparser.ConfigParser()
+    config.read_dict({"server": options})
+    return config
+
+
+def test_merge_server_options():
+    written = _config(instances="a", local_folder="/a", prevent_delete_sync="1")
+    local = _config(instances="a,b", local_folder="/b", prevent_delete_sync="0")
+    reloaded = _config(instances="c", local_folder="/a", prevent_delete_sync="1")
+    reloaded.set("server", "prevent_delete_sync", "2")
+    merge_server_options(local, written, reloaded)
+    assert dict(reloaded["server"]) == {
+        "instances": "c",
+        "local_folder": "/b",
+        "prevent_delete_sync": "2",
+    }
@@ -0,0 +1,51 @@
+import asyncio
+
+from trsync.aio import LoopPump
+from trsync.dispatch import Dispatcher
+
+
+class _Widget:
+    # Stand-in of a Tk widget, scheduled callbacks are never run
+    def after(self, delay, callback):
+        return "after"
+
+    def after_cancel(self, after_id):
+        pass
+
+
+def test_run_pending_runs_all_callbacks_in_order():
+    dispatcher = Dispatcher(_Widget(), budget=0.0)
+    calls = []
+    for index in range(100):
+        dispatcher.post(calls.append, index)
+    dispatcher.post(lambda: 1 / 0)
+    dispatcher.post(calls.append, "after failure")
+    dispatcher.run_pending()
+    assert calls == [*range(100), "after failure"]
+    dispatcher.close()
+    dispatcher.post(calls.append, "closed")
+    dispatcher.run_pending()
+    assert calls[-1] == "after failure"
+
+
+def test_tasks_waited_before_closing_run_their_callbacks():
+    # As App.destroy does for saves waiting for password setter
+    widget = _Widget()
+    dispatcher = Dispatcher(widget)
+    loop_pump = LoopPump(widget)
+    calls = []
+
+    async def save():
+        await asyncio.sleep(0.05)
+        return "saved"
+
+    task = loop_pump.submit(save())
+    task.add_done_callback(lambda task: dispatcher.post(calls.append, task.result()))
+    other = loop_pump.submit(asyncio.sleep(60))
+
+    loop_pump.wait([task], timeout=5.0)
+    dispatcher.run_pending()
+    loop_pump.close()
+    dispatcher.close()
+    assert calls == ["saved"]
+    assert other.cancelled()
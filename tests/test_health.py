@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from trsync import health as health_module
+from trsync.error import (
+    AuthenticationError,
+    CircuitOpenError,
+    CommunicationError,
+    InvalidResponseError,
+)
+from trsync.health import InstanceHealth, call, call_async
+
+DEFAULT_TIMEOUT = (10.0, 60.0)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(health_module, "retry_delay", lambda attempt: 0.0)
+
+
+class _Request:
+    # Fail with given errors, then return "ok"
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_transient_errors_are_retried():
+    instance_health = InstanceHealth()
+    request = _Request(CommunicationError(), CommunicationError())
+    assert call(instance_health, "whoami", DEFAULT_TIMEOUT, request) == "ok"
+    assert len(request.timeouts) == 3
+    assert not instance_health.open
+
+
+def test_a_call_failing_all_its_attempts_is_one_failure():
+    instance_health = InstanceHealth(failures_threshold=2)
+    request = _Request(*[CommunicationError() for _ in range(3)])
+    with pytest.raises(CommunicationError):
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert len(request.timeouts) == health_module.RETRY_ATTEMPTS
+    assert not instance_health.open
+
+    request = _Request(*[CommunicationError() for _ in range(3)])
+    with pytest.raises(CommunicationError):
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert instance_health.open
+
+
+def test_open_circuit_fails_without_request_then_probes_once():
+    instance_health = InstanceHealth(failures_threshold=1, open_duration=0.0)
+    with pytest.raises(CommunicationError):
+        request = _Request(*[CommunicationError() for _ in range(3)])
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert instance_health.open
+
+    # Failed probe is not retried and opens circuit again
+    request = _Request(CommunicationError(), CommunicationError())
+    with pytest.raises(CommunicationError):
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert len(request.timeouts) == 1
+    assert instance_health.open
+
+    assert call(instance_health, "whoami", DEFAULT_TIMEOUT, _Request()) == "ok"
+    assert not instance_health.open
+
+
+def test_open_circuit_refuses_requests_during_open_duration():
+    instance_health = InstanceHealth(failures_threshold=1, open_duration=60.0)
+    instance_health.record_failure()
+    request = _Request()
+    with pytest.raises(CircuitOpenError):
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert request.timeouts == []
+    assert instance_health.probe_delay() > 0
+
+
+@pytest.mark.parametrize("error", [AuthenticationError(), InvalidResponseError()])
+def test_answered_errors_are_not_retried_nor_failures(error):
+    instance_health = InstanceHealth(failures_threshold=1)
+    request = _Request(error)
+    with pytest.raises(type(error)):
+        call(instance_health, "whoami", DEFAULT_TIMEOUT, request)
+    assert len(request.timeouts) == 1
+    assert not instance_health.open
+
+
+def test_timeouts_are_adapted_by_operation():
+    instance_health = InstanceHealth()
+    assert instance_health.timeout(DEFAULT_TIMEOUT, "whoami") == DEFAULT_TIMEOUT
+    for _ in range(20):
+        instance_health.record_success(0.1, "whoami")
+        instance_health.record_success(20.0, "workspaces")
+    assert instance_health.timeout(DEFAULT_TIMEOUT, "whoami") == (
+        health_module.MIN_CONNECT_TIMEOUT,
+        health_module.MIN_READ_TIMEOUT,
+    )
+    connect_timeout, read_timeout = instance_health.timeout(
+        DEFAULT_TIMEOUT, "workspaces"
+    )
+    assert connect_timeout == DEFAULT_TIMEOUT[0]
+    assert read_timeout == DEFAULT_TIMEOUT[1]
+
+
+def test_call_async_retries_like_call():
+    instance_health = InstanceHealth()
+    request = _Request(CommunicationError())
+
+    async def request_async(timeout):
+        return request(timeout)
+
+    result = asyncio.run(
+        call_async(instance_health, "workspaces", DEFAULT_TIMEOUT, request_async)
+    )
+    assert result == "ok"
+    assert len(request.timeouts) == 2
+
+
+def test_cancelled_probe_is_released():
+    instance_health = InstanceHealth(failures_threshold=1, open_duration=0.0)
+    instance_health.record_failure()
+
+    async def cancelled(timeout):
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(call_async(instance_health, "whoami", DEFAULT_TIMEOUT, cancelled))
+    assert not instance_health.probing
+    assert call(instance_health, "whoami", DEFAULT_TIMEOUT, _Request()) == "ok"
@@ -0,0 +1,134 @@
+import json
+import multiprocessing
+
+from trsync.journal import Journal, config_changes
+
+OLD_CONTENT = """[server]
+instances = a.example.com,b.example.com
+local_folder = /sync
+
+[instance.a.example.com]
+address = a.example.com
+username = alice
+password = secret
+unsecure = False
+workspaces_ids = 1,2
+
+[instance.b.example.com]
+address = b.example.com
+username = bob
+unsecure = False
+workspaces_ids = 3
+"""
+
+
+def _replace(content, *replacements):
+    for old, new in replacements:
+        assert old in content
+        content = content.replace(old, new)
+    return content
+
+
+def test_same_content_has_no_changes():
+    assert config_changes(OLD_CONTENT, OLD_CONTENT) is None
+
+
+def test_workspaces_and_credentials_changes():
+    new_content = _replace(
+        OLD_CONTENT,
+        ("workspaces_ids = 1,2", "workspaces_ids = 2,4"),
+        ("username = bob", "username = bobby"),
+    )
+    assert config_changes(OLD_CONTENT, new_content) == {
+        "added": [],
+        "removed": [],
+        "credentials": ["b.example.com"],
+        "workspaces": {"a.example.com": {"enabled": [4], "disabled": [1]}},
+        "server": [],
+    }
+
+
+def test_credentials_changed_outside_config_are_kept():
+    # Ex. password stored by password setter
+    changes = config_changes(OLD_CONTENT, OLD_CONTENT, ["a.example.com"])
+    assert changes is not None
+    assert changes["credentials"] == ["a.example.com"]
+
+
+def test_added_removed_and_server_changes():
+    new_content = _replace(
+        OLD_CONTENT,
+        ("a.example.com,b.example.com", "b.example.com,c.example.com"),
+        ("local_folder = /sync", "local_folder = /other"),
+        ("[instance.a.example.com]", "[instance.c.example.com]"),
+        ("address = a.example.com", "address = c.example.com"),
+    )
+    changes = config_changes(OLD_CONTENT, new_content, ["c.example.com"])
+    assert changes == {
+        "added": ["c.example.com"],
+        "removed": ["a.example.com"],
+        "credentials": [],
+        "workspaces": {},
+        "server": ["local_folder"],
+    }
+
+
+def test_first_or_unreadable_old_content_adds_everything():
+    for old_content in (None, "not an INI file"):
+        changes = config_changes(old_content, OLD_CONTENT)
+        assert changes is not None
+        assert changes["added"] == ["a.example.com", "b.example.com"]
+
+
+def _entries(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_journal_numbers_entries_and_skips_no_change(tmp_path):
+    journal = Journal(tmp_path / "journal")
+    assert journal.last_sequence() == 0
+    assert journal.record(None, OLD_CONTENT) == 1
+    assert journal.record(OLD_CONTENT, OLD_CONTENT) is None
+    assert journal.record(OLD_CONTENT, OLD_CONTENT, ["b.example.com"]) == 2
+    assert [entry["seq"] for entry in _entries(tmp_path / "journal")] == [1, 2]
+    assert Journal(tmp_path / "journal").last_sequence() == 2
+
+
+def test_journal_compaction_keeps_last_entries_and_sequence(tmp_path):
+    journal = Journal(tmp_path / "journal", max_size=2000)
+    for index in range(100):
+        journal.append({"server": [f"key{index}"]})
+    entries = _entries(tmp_path / "journal")
+    assert (tmp_path / "journal").stat().st_size <= 2000
+    assert [entry["seq"] for entry in entries] == list(
+        range(101 - len(entries), 101)
+    )
+    assert journal.append({"server": ["last"]}) == 101
+
+
+def test_journal_last_sequence_of_entry_bigger_than_tail(tmp_path):
+    journal = Journal(tmp_path / "journal")
+    journal.append({"server": ["x" * 20000]})
+    assert journal.last_sequence() == 1
+
+
+def _append_entries(path, count):
+    journal = Journal(path, max_size=4000)
+    for _ in range(count):
+        journal.append({"server": ["local_folder"]})
+
+
+def test_journal_sequence_is_unique_across_processes(tmp_path):
+    path = tmp_path / "journal"
+    processes = [
+        multiprocessing.Process(target=_append_entries, args=(path, 50))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    sequences = [entry["seq"] for entry in _entries(path)]
+    assert sequences == list(range(201 - len(sequences), 201))
@@ -0,0 +1,29 @@
+import asyncio
+
+from trsync.schedule import Scheduler
+
+
+class _Pump:
+    # Stand-in of trsync.aio.LoopPump, tasks run on running loop
+    def submit(self, coroutine):
+        return asyncio.get_running_loop().create_task(coroutine)
+
+
+def test_cancel_owner_with_running_and_queued_jobs_frees_host_slot():
+    async def run():
+        scheduler = Scheduler(_Pump(), max_host_jobs=1)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        tasks = [scheduler.submit(job(), host="a", owner="tab") for _ in range(3)]
+        await asyncio.sleep(0)
+        scheduler.cancel("tab")
+        release.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        other = scheduler.submit(asyncio.sleep(0, result="done"), host="a")
+        return await asyncio.wait_for(other, 1.0)
+
+    assert asyncio.run(run()) == "done"
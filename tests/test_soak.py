@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from benchmarks.soak import growths, run_soak
+
+# Cycles run by test, fewer than soak benchmark ones to keep test suite fast.
+# SOAK_CYCLES environment variable gives another count (ex. 1000).
+TEST_CYCLES = int(os.environ.get("SOAK_CYCLES", "100"))
+
+
+def _has_display() -> bool:
+    if os.name != "nt" and not os.environ.get("DISPLAY"):
+        return False
+    import tkinter as tk
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(
+    not _has_display(), reason="needs a display, ex. xvfb-run python -m pytest"
+)
+def test_saves_and_refreshes_do_not_grow_widgets_nor_heap():
+    reference, final = run_soak(cycles=TEST_CYCLES)
+    assert growths(reference, final) == []
@@ -0,0 +1,112 @@
+import configparser
+
+from trsync.config import section_changes, section_options, serialize_config
+from trsync.store import IniConfigStore, SqliteConfigStore, database_path, migrate_store
+
+CONTENT = """[server]
+instances = a.example.com,b.example.com
+local_folder = /sync
+
+[instance.a.example.com]
+address = a.example.com
+username = alice
+workspaces_ids = 3,1,2
+
+[instance.b.example.com]
+address = b.example.com
+username = bob
+workspaces_ids = 5
+
+"""
+
+
+def _edit(content, section_name, **options):
+    # Content with given options set, and changed sections
+    config = configparser.ConfigParser()
+    config.read_string(content)
+    old_sections = section_options(config)
+    if not config.has_section(section_name):
+        config.add_section(section_name)
+    for key, value in options.items():
+        config.set(section_name, key, value)
+    return (
+        serialize_config(config),
+        section_changes(old_sections, section_options(config)),
+    )
+
+
+def test_content_is_read_as_written(tmp_path):
+    store = SqliteConfigStore(tmp_path / "config.db", export_path=tmp_path / "config")
+    store.write(None, CONTENT)
+    assert store.read() == CONTENT
+    assert (tmp_path / "config").read_text() == CONTENT
+
+
+def test_given_sections_are_written(tmp_path):
+    store = SqliteConfigStore(tmp_path / "config.db", export_path=tmp_path / "config")
+    store.write(None, CONTENT)
+    content, sections = _edit(
+        CONTENT, "instance.a.example.com", workspaces_ids="2,4,3"
+    )
+    assert list(sections) == ["instance.a.example.com"]
+    store.write(CONTENT, content, sections)
+    assert store.read() == content
+    assert (tmp_path / "config").read_text() == content
+
+    # Without sections, they are found from contents
+    other_content, _ = _edit(content, "server", local_folder="/other")
+    store.write(content, other_content)
+    assert store.read() == other_content
+
+
+def test_removed_section(tmp_path):
+    store = SqliteConfigStore(tmp_path / "config.db")
+    store.write(None, CONTENT)
+    config = configparser.ConfigParser()
+    config.read_string(CONTENT)
+    config.remove_section("instance.b.example.com")
+    content = serialize_config(config)
+    store.write(CONTENT, content, {"instance.b.example.com": None})
+    assert store.read() == content
+
+
+def test_concurrent_writers_keep_each_other_changes(tmp_path):
+    path = tmp_path / "config.db"
+    SqliteConfigStore(path).write(None, CONTENT)
+    first = SqliteConfigStore(path, export_path=tmp_path / "config")
+    second = SqliteConfigStore(path, export_path=tmp_path / "config")
+
+    first_content, first_sections = _edit(
+        CONTENT, "instance.a.example.com", username="alice2"
+    )
+    first.write(CONTENT, first_content, first_sections)
+    # Second writer did not see first one changes
+    second_content, second_sections = _edit(
+        CONTENT, "instance.b.example.com", username="bob2"
+    )
+    second.write(CONTENT, second_content, second_sections)
+
+    expected, _ = _edit(first_content, "instance.b.example.com", username="bob2")
+    assert first.read() == expected
+    # Export is read from database when another writer wrote meanwhile
+    assert (tmp_path / "config").read_text() == expected
+
+    third_content, third_sections = _edit(
+        first_content, "server", local_folder="/other"
+    )
+    first.write(first_content, third_content, third_sections)
+    expected, _ = _edit(expected, "server", local_folder="/other")
+    assert (tmp_path / "config").read_text() == expected
+
+
+def test_migrate_to_sqlite_and_back(tmp_path):
+    config_path = tmp_path / "config"
+    config_path.write_text(CONTENT)
+    assert migrate_store(config_path, "sqlite") == 0
+    assert SqliteConfigStore(database_path(config_path)).read() == CONTENT
+    # INI file is kept for trsync manager
+    assert config_path.read_text() == CONTENT
+
+    assert migrate_store(config_path, "ini") == 0
+    assert not database_path(config_path).exists()
+    assert IniConfigStore(config_path).read() == CONTENT
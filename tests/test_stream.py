@@ -0,0 +1,58 @@
+import pytest
+
+from trsync.stream import JsonArrayParser
+
+
+def _parse(chunks):
+    parser = JsonArrayParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    parser.close()
+    return items
+
+
+def test_items_are_given_as_soon_as_received():
+    parser = JsonArrayParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}]') == [{"b": 2}]
+    parser.close()
+
+
+def test_every_split_position_gives_same_items():
+    content = '[1, 2.5, -3e2, "é,]", {"x": [1, 2]}, true, null, 10]'.encode()
+    expected = [1, 2.5, -300.0, "é,]", {"x": [1, 2]}, True, None, 10]
+    for split in range(len(content) + 1):
+        assert _parse([content[:split], content[split:]]) == expected, split
+
+
+def test_number_split_at_dot_or_exponent_waits_next_chunk():
+    parser = JsonArrayParser()
+    assert parser.feed(b"[2") == []
+    assert parser.feed(b".") == []
+    assert parser.feed(b"5]") == [2.5]
+    parser.close()
+
+    assert _parse([b"[1e", b"3]"]) == [1000.0]
+
+
+def test_byte_by_byte():
+    content = b'[{"label": "\xc3\xa9t\xc3\xa9"}, 42]'
+    assert _parse([bytes([byte]) for byte in content]) == [{"label": "été"}, 42]
+
+
+def test_empty_array():
+    assert _parse([b" [ ", b"] "]) == []
+
+
+def test_not_an_array_is_refused():
+    with pytest.raises(ValueError):
+        JsonArrayParser().feed(b'{"a": 1}')
+
+
+@pytest.mark.parametrize("content", [b"[1, 2", b"[1]x", b"[{", b""])
+def test_incomplete_or_trailing_content_is_refused_at_close(content):
+    parser = JsonArrayParser()
+    parser.feed(content)
+    with pytest.raises(ValueError):
+        parser.close()
@@ -0,0 +1,109 @@
+import random
+
+from trsync.utils import OrderedIndex, PrefixIndex, tokenize
+
+
+def test_ordered_index_follows_a_list_through_random_changes():
+    randomizer = random.Random(0)
+    index = OrderedIndex(range(50))
+    expected = list(range(50))
+    next_key = 50
+    for _ in range(3000):
+        if expected and randomizer.random() < 0.5:
+            key = randomizer.choice(expected)
+            index.remove(key)
+            expected.remove(key)
+        else:
+            index.add(next_key)
+            expected.append(next_key)
+            next_key += 1
+
+        assert len(index) == len(expected)
+        start = randomizer.randrange(len(expected) + 1)
+        count = randomizer.randrange(1, 20)
+        assert index.slice(start, count) == expected[start : start + count]
+    assert list(index) == expected
+
+
+def test_ordered_index_ignores_duplicated_keys():
+    index = OrderedIndex([3, 1, 3])
+    index.add(1)
+    index.extend([2, 3])
+    assert list(index) == [3, 1, 2]
+    assert index.slice(1, 5) == [1, 2]
+    assert index.slice(3, 1) == []
+    assert index.slice(0, 0) == []
+
+
+def test_ordered_index_subset_keeps_index_order():
+    index = OrderedIndex(range(100))
+    for key in range(0, 100, 3):
+        index.remove(key)
+    keys = [key for key in index]
+    for subset_keys in ({keys[5], keys[2]}, set(keys[::2]), set(keys)):
+        subset = index.subset(subset_keys)
+        assert list(subset) == [key for key in keys if key in subset_keys]
+        assert subset.slice(1, 2) == [key for key in keys if key in subset_keys][1:3]
+
+
+def test_ordered_index_clear():
+    index = OrderedIndex(range(10))
+    index.clear()
+    assert len(index) == 0 and index.slice(0, 10) == []
+    index.add("a")
+    assert index.slice(0, 10) == ["a"]
+
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Équipe R&D - Été") == ["equipe", "r", "d", "ete"]
+
+
+def test_prefix_index_lookup_needs_every_prefix():
+    index = PrefixIndex()
+    index.add(1, "Projet Alpha")
+    index.add(2, "Projet Beta")
+    index.add(3, "Alphabet")
+    assert index.lookup(["alp"]) == {1, 3}
+    assert index.lookup(["pro", "alp"]) == {1}
+    assert index.lookup(["proj", "gamma"]) == set()
+    assert index.lookup([]) == {1, 2, 3}
+    assert index.matches(1, ["pro", "alpha"])
+    assert not index.matches(2, ["alpha"])
+
+
+def test_prefix_index_relabel_and_remove():
+    index = PrefixIndex()
+    index.add(1, "Alpha")
+    index.add(2, "Alpha")
+    index.add(1, "Beta")
+    assert index.lookup(["al"]) == {2}
+    assert index.lookup(["be"]) == {1}
+    index.remove(2)
+    index.remove(2)
+    assert index.lookup(["al"]) == set()
+    assert len(index) == 1
+
+
+def test_prefix_index_agrees_with_scan_after_many_changes():
+    randomizer = random.Random(1)
+    words = ["alpha", "alpine", "beta", "bet", "gamma", "gam", "delta", "été"]
+    index = PrefixIndex()
+    labels = {}
+    for _ in range(2000):
+        key = randomizer.randrange(100)
+        if key in labels and randomizer.random() < 0.4:
+            index.remove(key)
+            del labels[key]
+        else:
+            labels[key] = " ".join(randomizer.sample(words, 2))
+            index.add(key, labels[key])
+
+        query = tokenize(" ".join(word[:2] for word in randomizer.sample(words, 2)))
+        assert index.lookup(query) == {
+            key
+            for key, label in labels.items()
+            if all(
+                any(word.startswith(prefix) for word in tokenize(label))
+                for prefix in query
+            )
+        }
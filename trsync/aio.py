@@ -0,0 +1,740 @@
+import asyncio
+import base64
+import dataclasses
+import json
+import os
+import time
+import typing
+import urllib.parse
+
+from trsync.cache import credentials, whoami_flights
+from trsync.client import (
+    STREAM_CHUNK_SIZE,
+    WHOAMI_TIMEOUT,
+    WORKSPACES_TIMEOUT,
+    WorkspacesResponseParser,
+)
+from trsync.error import (
+    AuthenticationError,
+    CommunicationError,
+    FailToGetPassword,
+    FailToSetPassword,
+    InvalidResponseError,
+)
+from trsync.health import TRANSIENT_STATUS_CODES, Timeout, call_async, health
+from trsync.model import Workspace
+from trsync.password import PasswordSetter
+from trsync.session import IDLE_TIMEOUT, MAX_CONNECTIONS
+from trsync.trace import tracer
+
+if typing.TYPE_CHECKING:
+    import ssl
+
+    from trsync.model import Instance
+
+
+# Maximum size of response status line and headers
+MAX_HEADERS_SIZE = 64 * 1024
+# Redirections followed by a request (ex. http to https), as requests does
+REDIRECT_STATUS_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+# Tk milliseconds between two event loop iterations, when some tasks are
+# running or not
+PUMP_BUSY_INTERVAL = 5
+PUMP_IDLE_INTERVAL = 50
+
+ConnectionKey = typing.Tuple[str, str, int]
+
+
+@dataclasses.dataclass
+class _Connection:
+    key: ConnectionKey
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    released_at: float = 0.0
+
+
+class AsyncResponse:
+    def __init__(
+        self,
+        http: "AsyncHttp",
+        connection: _Connection,
+        status_code: int,
+        headers: typing.Dict[str, str],
+        read_timeout: float,
+        has_body: bool,
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self._http = http
+        self._connection: typing.Optional[_Connection] = connection
+        self._read_timeout = read_timeout
+        self._has_body = has_body
+        self._content: typing.Optional[bytes] = None
+
+    @property
+    def content(self) -> bytes:
+        assert self._content is not None, "Response must be read before"
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    async def read(self) -> bytes:
+        if self._content is None:
+            self._content = b"".join(
+                [chunk async for chunk in self.iter_chunks(STREAM_CHUNK_SIZE)]
+            )
+        return self._content
+
+    async def iter_chunks(self, chunk_size: int) -> typing.AsyncIterator[bytes]:
+        if self._connection is None:
+            return
+
+        reader = self._connection.reader
+        keep_alive = self.headers.get("connection", "").lower() != "close"
+        try:
+            if not self._has_body:
+                pass
+            elif self.headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size_line = await self._wait(reader.readline())
+                    size = int(size_line.split(b";")[0].strip(), 16)
+                    if size == 0:
+                        # Trailers, until empty line
+                        while (await self._wait(reader.readline())).strip():
+                            pass
+                        break
+                    yield await self._wait(reader.readexactly(size))
+                    await self._wait(reader.readexactly(2))
+            elif "content-length" in self.headers:
+                remaining = int(self.headers["content-length"])
+                while remaining:
+                    chunk = await self._wait(
+                        reader.read(min(chunk_size, remaining))
+                    )
+                    if not chunk:
+                        raise CommunicationError("Connection closed during response")
+                    remaining -= len(chunk)
+                    yield chunk
+            else:
+                keep_alive = False
+                while chunk := await self._wait(reader.read(chunk_size)):
+                    yield chunk
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            self.close()
+            raise CommunicationError(str(exc))
+        except BaseException:
+            self.close()
+            raise
+
+        connection, self._connection = self._connection, None
+        self._http.release(connection, reuse=keep_alive)
+
+    def close(self) -> None:
+        # Connection can't be reused when response was not entirely read
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._http.release(connection, reuse=False)
+
+    async def _wait(self, awaitable: typing.Awaitable[typing.Any]) -> typing.Any:
+        try:
+            return await asyncio.wait_for(awaitable, self._read_timeout)
+        except asyncio.TimeoutError:
+            raise CommunicationError("Read timeout")
+
+    async def __aenter__(self) -> "AsyncResponse":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+
+# Minimal HTTP/1.1 client keeping alive connections by host. Like requests,
+# it follows redirections, uses proxies given by environment (HTTP_PROXY,
+# HTTPS_PROXY, NO_PROXY) and certifi CA bundle (or REQUESTS_CA_BUNDLE).
+class AsyncHttp:
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ) -> None:
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        self._idle: typing.Dict[ConnectionKey, typing.List[_Connection]] = {}
+        self._ssl_context: typing.Optional["ssl.SSLContext"] = None
+        self._proxies: typing.Optional[typing.Dict[str, str]] = None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Timeout,
+        params: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+        auth: typing.Optional[typing.Tuple[str, str]] = None,
+        data: typing.Optional[bytes] = None,
+    ) -> AsyncResponse:
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(
+                method, url, timeout, params, headers, auth, data
+            )
+            location = response.headers.get("location")
+            if response.status_code not in REDIRECT_STATUS_CODES or not location:
+                return response
+
+            # Redirection body is read to reuse its connection
+            await response.read()
+            redirected_url = urllib.parse.urljoin(url, location)
+            if response.status_code == 303 or (
+                response.status_code in (301, 302) and method == "POST"
+            ):
+                method, data = "GET", None
+            if not _same_origin(url, redirected_url):
+                # Credentials are not given to another server
+                auth = None
+            url, params = redirected_url, None
+        raise CommunicationError(f"Too many redirections (last to {url})")
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        timeout: Timeout,
+        params: typing.Optional[typing.Dict[str, typing.Any]],
+        headers: typing.Optional[typing.Dict[str, str]],
+        auth: typing.Optional[typing.Tuple[str, str]],
+        data: typing.Optional[bytes],
+    ) -> AsyncResponse:
+        parsed = urllib.parse.urlsplit(url)
+        key = (
+            parsed.scheme,
+            parsed.hostname or "",
+            parsed.port or (443 if parsed.scheme == "https" else 80),
+        )
+        proxy = self._get_proxy(parsed.scheme, key[1])
+        target = parsed.path or "/"
+        query = "&".join(
+            filter(None, [parsed.query, urllib.parse.urlencode(params or {})])
+        )
+        if query:
+            target = f"{target}?{query}"
+
+        request_headers = {
+            "Host": parsed.netloc,
+            "Connection": "keep-alive",
+            "Accept-Encoding": "identity",
+            "Content-Length": str(len(data or b"")),
+        }
+        if auth is not None:
+            request_headers["Authorization"] = _basic_authorization(*auth)
+        if proxy is not None and parsed.scheme == "http":
+            # Plain requests are given to proxy with absolute URL, secure ones
+            # are sent through a tunnel (see _acquire)
+            target = f"{parsed.scheme}://{parsed.netloc}{target}"
+            if proxy.username is not None:
+                request_headers["Proxy-Authorization"] = _proxy_authorization(proxy)
+        request_headers.update(headers or {})
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n"
+            for name, value in request_headers.items()
+            if value is not None
+        )
+        payload = head.encode("latin-1") + b"\r\n" + (data or b"")
+
+        connect_timeout, read_timeout = timeout
+        # An idle connection may have been closed by server meanwhile, so
+        # request is retried once with a new connection
+        while True:
+            connection, reused = await self._acquire(key, connect_timeout, proxy)
+            try:
+                connection.writer.write(payload)
+                await asyncio.wait_for(connection.writer.drain(), read_timeout)
+                status_code, response_headers = await asyncio.wait_for(
+                    self._read_head(connection.reader), read_timeout
+                )
+            except asyncio.TimeoutError:
+                self.release(connection, reuse=False)
+                raise CommunicationError("Read timeout")
+            except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+                self.release(connection, reuse=False)
+                if reused:
+                    continue
+                raise CommunicationError(str(exc))
+            except BaseException:
+                self.release(connection, reuse=False)
+                raise
+
+            return AsyncResponse(
+                self,
+                connection,
+                status_code,
+                response_headers,
+                read_timeout,
+                has_body=method != "HEAD" and status_code not in (204, 304),
+            )
+
+    def release(self, connection: _Connection, reuse: bool) -> None:
+        idle = self._idle.setdefault(connection.key, [])
+        if not reuse or len(idle) >= self._max_connections:
+            connection.writer.close()
+            return
+
+        connection.released_at = time.monotonic()
+        idle.append(connection)
+
+    def close(self) -> None:
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.writer.close()
+        self._idle.clear()
+
+    async def _acquire(
+        self,
+        key: ConnectionKey,
+        connect_timeout: float,
+        proxy: typing.Optional[urllib.parse.SplitResult] = None,
+    ) -> typing.Tuple[_Connection, bool]:
+        idle = self._idle.get(key, [])
+        now = time.monotonic()
+        while idle:
+            connection = idle.pop()
+            if (
+                now - connection.released_at < self._idle_timeout
+                and not connection.reader.at_eof()
+            ):
+                return connection, True
+            connection.writer.close()
+
+        scheme, host, port = key
+        secure = scheme == "https"
+        if proxy is not None:
+            connect_host = proxy.hostname or ""
+            connect_port = proxy.port or (443 if proxy.scheme == "https" else 80)
+            connect_ssl = self._get_ssl_context() if proxy.scheme == "https" else None
+        else:
+            connect_host, connect_port = host, port
+            connect_ssl = self._get_ssl_context() if secure else None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    connect_host,
+                    connect_port,
+                    ssl=connect_ssl,
+                    limit=MAX_HEADERS_SIZE,
+                ),
+                connect_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise CommunicationError("Connect timeout")
+        except OSError as exc:
+            raise CommunicationError(str(exc))
+
+        if proxy is not None and secure:
+            try:
+                await asyncio.wait_for(
+                    self._open_tunnel(reader, writer, proxy, host, port),
+                    connect_timeout,
+                )
+            except asyncio.TimeoutError:
+                writer.close()
+                raise CommunicationError("Proxy connect timeout")
+            except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+                writer.close()
+                raise CommunicationError(f"Proxy tunnel failed : {exc}")
+            except BaseException:
+                writer.close()
+                raise
+
+        return _Connection(key=key, reader=reader, writer=writer), False
+
+    async def _open_tunnel(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        proxy: urllib.parse.SplitResult,
+        host: str,
+        port: int,
+    ) -> None:
+        head = f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        if proxy.username is not None:
+            head += f"Proxy-Authorization: {_proxy_authorization(proxy)}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n")
+        await writer.drain()
+        status_code, _ = await self._read_head(reader)
+        if status_code != 200:
+            raise CommunicationError(
+                f"Proxy refused tunnel, status code was : {status_code}"
+            )
+        if not hasattr(writer, "start_tls"):
+            raise CommunicationError("Secure requests through a proxy need Python 3.11")
+        await writer.start_tls(self._get_ssl_context(), server_hostname=host)
+
+    def _get_proxy(
+        self, scheme: str, host: str
+    ) -> typing.Optional[urllib.parse.SplitResult]:
+        # Imported at first request to speed up startup
+        import urllib.request
+
+        if self._proxies is None:
+            self._proxies = urllib.request.getproxies()
+        if not (proxy := self._proxies.get(scheme)) or urllib.request.proxy_bypass(
+            host
+        ):
+            return None
+        if "://" not in proxy:
+            proxy = f"http://{proxy}"
+        return urllib.parse.urlsplit(proxy)
+
+    def _get_ssl_context(self) -> "ssl.SSLContext":
+        if self._ssl_context is None:
+            # Imported at first secure connection to speed up startup
+            import ssl
+
+            self._ssl_context = ssl.create_default_context(cafile=_ca_bundle())
+        return self._ssl_context
+
+    @staticmethod
+    async def _read_head(
+        reader: asyncio.StreamReader,
+    ) -> typing.Tuple[int, typing.Dict[str, str]]:
+        try:
+            raw = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise InvalidResponseError("Response headers too long")
+        lines = raw.decode("latin-1").split("\r\n")
+        status_line = lines[0].split(" ", 2)
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            raise InvalidResponseError(f"Invalid response status line : {lines[0]}")
+        status_code = int(status_line[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return status_code, headers
+
+
+def _same_origin(url: str, other_url: str) -> bool:
+    # As requests, an upgrade from http to https of same host is same origin
+    parsed, other = urllib.parse.urlsplit(url), urllib.parse.urlsplit(other_url)
+    if parsed.hostname != other.hostname:
+        return False
+    if (parsed.scheme, parsed.port, other.scheme, other.port) in (
+        ("http", None, "https", None),
+        ("http", 80, "https", 443),
+    ):
+        return True
+    return (parsed.scheme, parsed.port) == (other.scheme, other.port)
+
+
+def _basic_authorization(username: str, password: str) -> str:
+    token = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return f"Basic {token}"
+
+
+def _proxy_authorization(proxy: urllib.parse.SplitResult) -> str:
+    return _basic_authorization(
+        urllib.parse.unquote(proxy.username or ""),
+        urllib.parse.unquote(proxy.password or ""),
+    )
+
+
+def _ca_bundle() -> typing.Optional[str]:
+    # Same certificates as requests, system ones if certifi is not installed
+    if bundle := os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get(
+        "CURL_CA_BUNDLE"
+    ):
+        return bundle
+    try:
+        import certifi
+    except ImportError:
+        return None
+    return certifi.where()
+
+
+# Asyncio equivalent of trsync.client.Client
+class AsyncClient:
+    def __init__(
+        self,
+        instance: "Instance",
+        http: AsyncHttp,
+        user_id: typing.Optional[int] = None,
+    ) -> None:
+        self._instance = instance
+        self._http = http
+        self._user_id = user_id
+
+    async def get_user_id(self) -> int:
+        if self._user_id is None:
+            self._user_id = await self.check_credentials(self._instance, self._http)
+        return self._user_id
+
+    @classmethod
+    async def check_credentials(cls, instance: "Instance", http: AsyncHttp) -> int:
+        if (user_id := credentials.get(instance)) is not None:
+            return user_id
+
+        # Same credentials can be checked by several callers at same time
+        user_id, _ = await whoami_flights.run(
+            credentials.key(instance),
+            lambda: cls._request_user_id(instance, http),
+        )
+        return user_id
+
+    @staticmethod
+    async def _request_user_id(instance: "Instance", http: AsyncHttp) -> int:
+        async def request(timeout: Timeout) -> typing.Tuple[int, bytes]:
+            async with await http.request(
+                "GET",
+                f"{instance.url()}/api/auth/whoami",
+                auth=(instance.username, instance.password),
+                timeout=timeout,
+            ) as response:
+                content = await response.read()
+            if response.status_code in TRANSIENT_STATUS_CODES:
+                raise CommunicationError(
+                    f"Server response status code was : {response.status_code}"
+                )
+            return response.status_code, content
+
+        with tracer.span("client.whoami", instance.address) as span:
+            status_code, content = await call_async(
+                health.get(instance.url()), "whoami", WHOAMI_TIMEOUT, request
+            )
+            span.set(status_code=status_code, size=len(content))
+            if status_code == 200:
+                data = json.loads(content)
+                credentials.set(instance, data["user_id"])
+                return data["user_id"]
+
+            # Raised in span, refused credentials are counted as whoami errors
+            credentials.invalidate(instance)
+            raise AuthenticationError()
+
+    async def get_workspaces(self) -> typing.List[Workspace]:
+        return [
+            workspace
+            async for workspaces in self.iter_workspace_pages()
+            for workspace in workspaces
+        ]
+
+    async def iter_workspace_pages(
+        self, page_size: typing.Optional[int] = None
+    ) -> typing.AsyncIterator[typing.List[Workspace]]:
+        # See WorkspacesResponseParser
+        params: typing.Dict[str, typing.Any] = {}
+        if page_size is not None:
+            params["count"] = page_size
+
+        while True:
+            parser = WorkspacesResponseParser()
+            with tracer.span("client.workspaces", self._instance.address) as span:
+                async with await self._get_workspaces_response(params) as response:
+                    span.set(status_code=response.status_code)
+                    async for chunk in span.count_async(
+                        response.iter_chunks(STREAM_CHUNK_SIZE)
+                    ):
+                        for batch in parser.feed(chunk):
+                            yield batch
+                    last_batches = parser.close()
+
+            for batch in last_batches:
+                yield batch
+            if parser.next_page_token is None:
+                return
+            params["page_token"] = parser.next_page_token
+
+    async def _get_workspaces_response(
+        self, params: typing.Dict[str, typing.Any]
+    ) -> AsyncResponse:
+        user_id = await self.get_user_id()
+
+        async def request(timeout: Timeout) -> AsyncResponse:
+            response = await self._http.request(
+                "GET",
+                f"{self._instance.url()}/api/users/{user_id}/workspaces",
+                params=params,
+                auth=(self._instance.username, self._instance.password),
+                timeout=timeout,
+            )
+            if response.status_code == 200:
+                return response
+
+            response.close()
+            if response.status_code in (401, 403):
+                credentials.invalidate(self._instance)
+                raise AuthenticationError()
+
+            error_class = (
+                CommunicationError
+                if response.status_code in TRANSIENT_STATUS_CODES
+                else InvalidResponseError
+            )
+            raise error_class(
+                f"Server response status code was : {response.status_code}"
+            )
+
+        return await call_async(
+            health.get(self._instance.url()), "workspaces", WORKSPACES_TIMEOUT, request
+        )
+
+
+# PasswordSetter with asyncio equivalents of batch methods, sharing known
+# passwords, batch support and responses reading with synchronous ones
+class AsyncPasswordSetter(PasswordSetter):
+    def __init__(self, port: int, token: typing.Optional[str], http: AsyncHttp):
+        super().__init__(port, token)
+        self._http = http
+
+    async def get_passwords_async(
+        self, instance_names: typing.List[str]
+    ) -> typing.Dict[str, typing.Union[str, FailToGetPassword]]:
+        if not instance_names:
+            return {}
+
+        if self._supports_batch is not False:
+            try:
+                status_code, content = await self._request(
+                    "GET", "/passwords", params={"instances": ",".join(instance_names)}
+                )
+            except CommunicationError as exc:
+                error = FailToGetPassword(str(exc))
+                return {instance_name: error for instance_name in instance_names}
+
+            batch_results = self._read_passwords(instance_names, status_code, content)
+            if batch_results is not None:
+                return batch_results
+
+        results = await asyncio.gather(
+            *(self._get_password_async(name) for name in instance_names),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(
+                result, FailToGetPassword
+            ):
+                raise result
+        return dict(zip(instance_names, results))
+
+    async def set_passwords_async(
+        self, passwords: typing.Dict[str, str]
+    ) -> typing.Dict[str, FailToSetPassword]:
+        changed = self._changed(passwords)
+        if not changed:
+            return {}
+
+        if self._supports_batch is not False:
+            try:
+                status_code, _ = await self._request(
+                    "POST", "/passwords", data=json.dumps(changed).encode()
+                )
+            except CommunicationError as exc:
+                error = FailToSetPassword(str(exc))
+                return {instance_name: error for instance_name in changed}
+
+            batch_failures = self._read_set_passwords(changed, status_code)
+            if batch_failures is not None:
+                return batch_failures
+
+        failures: typing.Dict[str, FailToSetPassword] = {}
+        for instance_name, password in changed.items():
+            try:
+                status_code, _ = await self._request(
+                    "POST", f"/password/{instance_name}", data=password.encode()
+                )
+                self._read_set_password(instance_name, password, status_code)
+            except CommunicationError as exc:
+                failures[instance_name] = FailToSetPassword(str(exc))
+            except FailToSetPassword as exc:
+                failures[instance_name] = exc
+        return failures
+
+    async def _get_password_async(self, instance_name: str) -> str:
+        try:
+            status_code, content = await self._request(
+                "GET", f"/password/{instance_name}"
+            )
+        except CommunicationError as exc:
+            raise FailToGetPassword(str(exc))
+        return self._read_password(instance_name, status_code, content)
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: typing.Optional[typing.Dict[str, str]] = None,
+        data: typing.Optional[bytes] = None,
+    ) -> typing.Tuple[int, bytes]:
+        # Span name is given by endpoint, ex. "password_setter.post_passwords"
+        endpoint, _, instance_name = path.strip("/").partition("/")
+        with tracer.span(
+            f"password_setter.{method.lower()}_{endpoint}", instance_name or None
+        ) as span:
+            async with await self._http.request(
+                method,
+                f"{self.url()}{path}",
+                params=params,
+                data=data,
+                headers={"X-Auth-Token": self._token},
+                timeout=WORKSPACES_TIMEOUT,
+            ) as response:
+                content = await response.read()
+            span.set(
+                status_code=response.status_code, size=len(content) + len(data or b"")
+            )
+            return response.status_code, content
+
+
+# Run an asyncio event loop by small iterations from Tk mainloop, so
+# coroutines callbacks are executed in Tk thread
+class LoopPump:
+    def __init__(self, widget) -> None:
+        self._widget = widget
+        self._loop = asyncio.new_event_loop()
+        self._after_id: typing.Optional[str] = None
+        self._tasks: typing.Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._tick()
+
+    def submit(self, coroutine: typing.Coroutine) -> asyncio.Task:
+        task = self._loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def wait(self, tasks: typing.List[asyncio.Task], timeout: float) -> None:
+        # Run loop until given tasks are done, at most timeout seconds (ex.
+        # before closing, which cancels tasks)
+        if tasks and not self._loop.is_running():
+            self._loop.run_until_complete(asyncio.wait(tasks, timeout=timeout))
+
+    def close(self) -> None:
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            self._loop.run_until_complete(
+                asyncio.gather(*self._tasks, return_exceptions=True)
+            )
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+
+    def _tick(self) -> None:
+        # Tk may call this while loop is running (ex. a dialog opened by a
+        # coroutine runs its own Tk event loop)
+        if not self._loop.is_running():
+            self._loop.call_soon(self._loop.stop)
+            self._loop.run_forever()
+        self._after_id = self._widget.after(
+            PUMP_BUSY_INTERVAL if self._tasks else PUMP_IDLE_INTERVAL, self._tick
+        )
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            print("Background task failed: ", repr(exc))
@@ -1,19 +1,60 @@
-import os
+import asyncio
+import concurrent.futures
 import configparser
-import pathlib
-import threading
+import functools
 import tkinter as tk
 from tkinter import ttk
 import typing
+import urllib.parse
 
-import requests
-from trsync.client import Client
-from tkinter import messagebox
-from trsync.error import AuthenticationError, FailToGetPassword, FailToSetPassword
+from trsync.aio import AsyncClient, AsyncHttp, AsyncPasswordSetter, LoopPump
+from trsync.cache import credentials, whoami_flights, workspaces_flights
+from trsync.config import (
+    ConfigWriter,
+    changed_sections,
+    config_paths,
+    merge_instance,
+    merge_server_options,
+    read_instance,
+    read_instance_names,
+    section_changes,
+    section_options,
+    serialize_config,
+    update_config,
+)
+from trsync.dispatch import Dispatcher
+from trsync.health import health
+from trsync.journal import Journal
+from trsync.metrics import metrics
+from trsync.error import (
+    AuthenticationError,
+    CommunicationError,
+    FailToGetPassword,
+    FailToSetPassword,
+)
 
 
 from trsync.model import Instance, Workspace
-from trsync.tab import ConfigFrame, TabFrame
+from trsync.session import sessions
+from trsync.schedule import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_SHOWN_TAB,
+    PRIORITY_TAB,
+    Scheduler,
+)
+from trsync.snapshot import (
+    SnapshotEntry,
+    load_snapshot,
+    save_snapshot,
+    snapshot_entries,
+)
+from trsync.store import open_store
+from trsync.tab import ConfigFrame, LazyTabFrame, TabFrame
+from trsync.trace import Span, tracer
+from trsync.watch import ConfigWatcher
+
+# Seconds waited, when window is closed, for saves waiting for password setter
+CLOSE_SAVE_TIMEOUT = 10.0
 
 
 class App(tk.Frame):
@@ -24,34 +65,180 @@ class App(tk.Frame):
         password_setter_token: typing.Optional[str] = None,
     ):
         super().__init__(master)
-        self._password_setter_port = password_setter_port
-        self._password_setter_token = password_setter_token
         self.pack(expand=True, fill=tk.BOTH)
 
+        # UI updates from background work are run by Tk thread through it
+        self._dispatcher = Dispatcher(self)
+
+        # network stuffs
+        self._http = AsyncHttp()
+        self._loop_pump = LoopPump(self)
+        self._scheduler = Scheduler(self._loop_pump)
+        self._password_setter: typing.Optional[AsyncPasswordSetter] = (
+            AsyncPasswordSetter(password_setter_port, password_setter_token, self._http)
+            if password_setter_port is not None
+            else None
+        )
+
         # trsync stuffs
-        if os.name == "nt":
-            self._config_file_path = (
-                pathlib.Path.home() / "AppData" / "Local" / "trsync.conf"
-            )
-            self._config_track_file_path = (
-                pathlib.Path.home() / "AppData" / "Local" / "trsync.conf.track"
-            )
-        else:
-            self._config_file_path = pathlib.Path.home() / ".trsync.conf"
-            self._config_track_file_path = pathlib.Path.home() / ".trsync.conf.track"
-        self._config = configparser.ConfigParser()
-        self._config.read(self._config_file_path)
+        (
+            self._config_file_path,
+            self._config_track_file_path,
+            self._snapshot_file_path,
+            journal_file_path,
+        ) = config_paths()
+        self._config_store = open_store(self._config_file_path)
+        with tracer.span("config.read"):
+            self._config = self._config_store.load()
+        self._config_writer = ConfigWriter(
+            self._config_store,
+            self._config_track_file_path,
+            journal=Journal(journal_file_path),
+        )
+        # Config sections as last submitted to writer, to give it only
+        # changed ones
+        self._submitted_sections = section_options(self._config)
+        # Instances which credentials changed since last config save
+        self._credentials_changed: typing.Set[str] = set()
+        # Config changes made by another program are applied when seen
+        self._config_watcher = ConfigWatcher(
+            self._config_store.path,
+            lambda: self._dispatcher.post(self._reload_config),
+        )
         self._instances: typing.List[Instance] = []
+        # Addresses of unreachable instances waiting to be requested again
+        self._probes: typing.Set[str] = set()
+        # Addresses of instances which workspaces are being fetched
+        self._refreshing: typing.Set[str] = set()
+        # Ids of instances which password is being fetched from password setter
+        self._password_pending: typing.Set[int] = set()
+        # Saves waiting for password setter, finished when window is closed
+        self._save_tasks: typing.Set[asyncio.Task] = set()
 
         # window stuffs
         self._tabs_control = ttk.Notebook(self)
         self._tabs_frames: typing.Dict[typing.Optional[str], ttk.Frame] = {}
+        # Instance tabs are built and loaded when selected
+        self._shown_tab: typing.Optional[LazyTabFrame] = None
+        self._tabs_control.bind("<<NotebookTabChanged>>", self._on_tab_changed)
         self._set_wait_message()
 
         self._build_config_frame()
         self._build_tab_frame(None)
 
-        threading.Thread(target=self._load_from_config).start()
+        # Tabs are displayed from last known informations, then refreshed
+        self._load_from_config()
+        self._dispatcher.start()
+        self._loop_pump.start()
+        self._config_watcher.start()
+        metrics.set_gauge(
+            "trsync_workspaces", "Workspaces of instances", self._workspaces_counts
+        )
+        metrics.set_gauge(
+            "trsync_enabled_workspaces",
+            "Synchronized workspaces of instances",
+            self._enabled_workspaces_counts,
+        )
+        self.run_async(
+            self._refresh_instances(list(self._instances)),
+            on_done=lambda task: self._destroy_wait_message(),
+        )
+
+    def destroy(self) -> None:
+        metrics.remove_gauge("trsync_workspaces")
+        metrics.remove_gauge("trsync_enabled_workspaces")
+        self._config_watcher.stop()
+        self._finish_saves()
+        self._config_writer.flush()
+        self._http.close()
+        self._loop_pump.close()
+        self._dispatcher.close()
+        sessions.close()
+        print(whoami_flights.summary(), f"({credentials.hits} from cache)")
+        print(workspaces_flights.summary())
+        super().destroy()
+
+    def _finish_saves(self) -> None:
+        # Saves must not be cancelled by loop closing, and their config
+        # writes (posted to dispatcher) must be run before last flush
+        if self._save_tasks:
+            self._loop_pump.wait(list(self._save_tasks), CLOSE_SAVE_TIMEOUT)
+        self._dispatcher.run_pending()
+
+    def _workspaces_counts(self) -> typing.Dict[str, float]:
+        # Called from metrics server thread, instances list is copied
+        return {
+            instance.address: len(instance.all_workspaces)
+            for instance in list(self._instances)
+        }
+
+    def _enabled_workspaces_counts(self) -> typing.Dict[str, float]:
+        return {
+            instance.address: len(instance.enabled_workspaces)
+            for instance in list(self._instances)
+        }
+
+    def run_async(
+        self,
+        coroutine: typing.Coroutine,
+        on_done: typing.Optional[typing.Callable[[asyncio.Task], None]] = None,
+    ) -> asyncio.Task:
+        task = self._loop_pump.submit(coroutine)
+        if on_done is not None:
+            task.add_done_callback(lambda task: self._dispatcher.post(on_done, task))
+        return task
+
+    def schedule(
+        self,
+        coroutine: typing.Coroutine,
+        on_done: typing.Optional[typing.Callable[[asyncio.Task], None]] = None,
+        instance: typing.Optional[Instance] = None,
+        priority: int = PRIORITY_BACKGROUND,
+        owner: typing.Optional[typing.Hashable] = None,
+    ) -> asyncio.Task:
+        # Network job, run according to its priority and to hosts concurrency
+        # limits. Jobs of an instance are cancelled when it is removed.
+        host = None
+        if instance is not None:
+            host = urllib.parse.urlsplit(instance.url()).netloc
+            owner = owner if owner is not None else id(instance)
+        task = self._scheduler.submit(
+            coroutine,
+            host=host,
+            priority=self._job_priority(instance, priority),
+            owner=owner,
+        )
+        if on_done is not None:
+            task.add_done_callback(lambda task: self._dispatcher.post(on_done, task))
+        return task
+
+    def cancel_jobs(self, owner: typing.Hashable) -> None:
+        self._scheduler.cancel(owner)
+
+    def _job_priority(
+        self, instance: typing.Optional[Instance], priority: int
+    ) -> typing.Callable[[], int]:
+        # Jobs of shown tab instance go first, even if tab was shown after
+        # job was submitted
+        def current() -> int:
+            if (
+                instance is not None
+                and self._shown_tab is not None
+                and self._shown_tab is self._tabs_frames.get(instance.address)
+            ):
+                return PRIORITY_SHOWN_TAB
+            return priority
+
+        return current
+
+    def run_in_worker(
+        self,
+        job: typing.Callable[[], typing.Any],
+        on_done: typing.Optional[
+            typing.Callable[[concurrent.futures.Future], None]
+        ] = None,
+    ) -> concurrent.futures.Future:
+        return self._dispatcher.submit(job, on_done)
 
     def _set_wait_message(self) -> None:
         self._wait_message = tk.Label(self, text="Récupération des informations ...")
@@ -61,30 +248,135 @@ class App(tk.Frame):
         self._wait_message.destroy()
 
     def _load_from_config(self) -> None:
-        print(f"Load config from {self._config_file_path}")
-        # FIXME : message label en cas d'erreur
-        for instance_name in [
-            instance_name.strip()
-            for instance_name in self._config.get(
-                "server", "instances", fallback=""
-            ).split(",")
-            if instance_name
-        ]:
+        print(f"Load config from {self._config_store.path}")
+        snapshot = load_snapshot(self._snapshot_file_path)
+        for instance_name in read_instance_names(self._config):
             print(f"Read instance {instance_name}")
-            instance = self._read_config_instance(instance_name)
+            instance = self._read_config_instance(instance_name, snapshot)
             self._instances.append(instance)
+            self._build_tab_frame(instance)
 
-            # TODO : think about on instance by thread (to avoid blocking)
+        self._tabs_control.pack(expand=1, fill="both")
+
+    async def _refresh_instances(self, instances: typing.List[Instance]) -> None:
+        # FIXME : message label en cas d'erreur
+        if instances and self._password_setter is not None:
+            self._password_pending.update(id(instance) for instance in instances)
             try:
-                tab_frame = self._tabs_frames[instance.address]
-            except KeyError:
-                tab_frame = self._build_tab_frame(instance)
+                passwords = await self.schedule(
+                    self._password_setter.get_passwords_async(
+                        [instance.address for instance in instances]
+                    )
+                )
+                for instance in instances:
+                    password = passwords[instance.address]
+                    if isinstance(password, FailToGetPassword):
+                        print(
+                            f"Fail to get password for instance '{instance.address}': ",
+                            password,
+                        )
+                    else:
+                        instance.password = password
+                        instance.password_loaded = True
+            finally:
+                # Tabs waiting for passwords are built, even without them
+                self._password_pending.difference_update(
+                    id(instance) for instance in instances
+                )
+                self._dispatcher.post(self._on_passwords_received, instances)
 
-        self._destroy_wait_message()
-        self._tabs_control.pack(expand=1, fill="both")
+        # Workspaces of other instances are fetched when their tab is shown.
+        # Without its password, an instance would be refused.
+        shown = [
+            instance
+            for instance in instances
+            if instance.password_loaded
+            and self._shown_tab is not None
+            and self._shown_tab is self._tabs_frames.get(instance.address)
+        ]
+        # Deleted instances jobs are cancelled meanwhile
+        tasks = [task for instance in shown if (task := self._load_instance(instance))]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if instances:
+            self._save_snapshot()
+
+    def password_pending(self, instance: Instance) -> bool:
+        return id(instance) in self._password_pending
+
+    def _on_passwords_received(self, instances: typing.List[Instance]) -> None:
+        for instance in instances:
+            if (tab_frame := self._tabs_frames.get(instance.address)) is not None:
+                tab_frame.password_received()
+
+    def _load_instance(self, instance: Instance) -> typing.Optional[asyncio.Task]:
+        if instance.address in self._refreshing:
+            return None
+        return self.schedule(self._refresh_instance(instance), instance=instance)
+
+    async def _refresh_instance(self, instance: Instance) -> None:
+        # Dialogs are imported when shown to speed up startup
+        from tkinter import messagebox
+
+        # Instance may have been deleted or be already refreshed meanwhile
+        if instance not in self._instances or instance.address in self._refreshing:
+            return
+        address = instance.address
+        self._refreshing.add(address)
+        try:
+            print(f"Refresh instance {instance.address}")
+            try:
+                await self._get_workspaces(
+                    instance,
+                    on_page=self._tabs_frames[instance.address].receive_workspaces,
+                )
+                instance.stale = False
+            except AuthenticationError as exc:
+                self._dispatcher.post(
+                    messagebox.showerror,
+                    "Erreur de configuration",
+                    f"Une erreur est survenue lors de l'authentification auprès de {instance.address}",
+                )
+            except CommunicationError as exc:
+                print(f"Fail to get workspaces of instance '{instance.address}': ", exc)
+                if (delay := health.get(instance.url()).probe_delay()) > 0:
+                    self._dispatcher.post(self._schedule_probe, instance, delay)
+            except Exception as exc:
+                # Tab must not stay waiting for workspaces
+                print(f"Fail to refresh instance '{instance.address}': ", repr(exc))
+        finally:
+            self._refreshing.discard(address)
+
+        self._dispatcher.post(self._refresh_tab_frame, instance)
+
+    def _schedule_probe(self, instance: Instance, delay: float) -> None:
+        # Unreachable instance is refreshed again once its server can be
+        # requested, without blocking other instances meanwhile
+        if instance.address in self._probes:
+            return
+        self._probes.add(instance.address)
+
+        def probe() -> None:
+            self._probes.discard(instance.address)
+            if instance in self._instances:
+                self._load_instance(instance)
+
+        self.after(int(delay * 1000) + 1, probe)
+
+    def _save_snapshot(self) -> None:
+        # Written by a worker, from a copy of instances state
+        self.run_in_worker(
+            functools.partial(
+                save_snapshot,
+                self._snapshot_file_path,
+                snapshot_entries(self._instances),
+            )
+        )
 
     def _save_to_config(self) -> None:
-        print(f"Save config into {self._config_file_path}")
+        from tkinter import messagebox
+
+        print("Save config")
         local_folder = self._config.get("server", "local_folder")
         if not local_folder:
             messagebox.showerror(
@@ -92,118 +384,220 @@ class App(tk.Frame):
                 "Veuillez choisir un dossier local dans la configuration",
             )
             return
-        self._config.set(
-            "server",
-            "instances",
-            ",".join(instance.address for instance in self._instances),
+        if self._password_setter is None:
+            with tracer.span("config.save"):
+                self._write_config(local_folder, {})
+            return
+
+        # Config is written once password setter answered. Unknown passwords
+        # (not received yet or failed to be) are not overwritten.
+        span = tracer.start("config.save")
+        task = self.schedule(
+            self._password_setter.set_passwords_async(
+                {
+                    instance.address: instance.password
+                    for instance in self._instances
+                    if instance.password_loaded
+                }
+            ),
+            on_done=functools.partial(self._on_passwords_set, local_folder, span),
+            priority=PRIORITY_TAB,
         )
-        self._config.set("server", "local_folder", local_folder)
-        for instance in self._instances:
-            section_name = f"instance.{instance.address}"
-            if not self._config.has_section(section_name):
-                self._config.add_section(section_name)
-            self._config.set(section_name, "address", instance.address)
-            self._config.set(section_name, "username", instance.username)
-            if self._password_setter_port is not None:
-                try:
-                    self._set_password(instance.address, instance.password)
-                except FailToSetPassword as exc:
-                    messagebox.showerror(
-                        "Erreur d'enregistrement",
-                        (
-                            "Impossible d'enregistrer le mot de "
-                            f"passe pour l'instance '{instance.address}' : "
-                            f"'{exc}'"
-                        ),
-                    )
-                    continue
-            else:
-                self._config.set(section_name, "password", instance.password)
-            self._config.set(section_name, "unsecure", str(instance.unsecure))
-            print("Workspaces ids : ", instance.enabled_workspaces)
-            self._config.set(
-                section_name,
-                "workspaces_ids",
-                ",".join(
-                    str(workspace_id) for workspace_id in instance.enabled_workspaces
-                ),
-            )
-        with self._config_file_path.open("w") as config_file:
-            self._config.write(config_file)
+        self._save_tasks.add(task)
+        task.add_done_callback(self._save_tasks.discard)
 
-        with self._config_track_file_path.open("w") as config_track_file:
-            config_track_file.write("")
+    def _on_passwords_set(
+        self, local_folder: str, span: Span, task: asyncio.Task
+    ) -> None:
+        from tkinter import messagebox
 
-    def _read_config_instance(self, instance_name: str) -> None:
-        section_name = f"instance.{instance_name}"
-        address = self._config[section_name]["address"]
-        username = self._config[section_name]["username"]
-        try:
-            password = self._get_password(instance_name)
-        except FailToGetPassword as exc:
-            print(f"Fail to get password for instance '{exc}': ", exc)
-            password = ""
-        unsecure = self._config.getboolean(section_name, "unsecure")
-        workspaces_ids = [
-            int(workspace_id.strip())
-            for workspace_id in self._config[section_name]["workspaces_ids"].split(",")
-            if workspace_id.strip()
-        ]
-        instance = Instance(
-            address=address,
-            username=username,
-            password=password,
-            unsecure=unsecure,
-            enabled_workspaces=workspaces_ids,
-            all_workspaces=[],
-        )
+        if task.cancelled() or task.exception() is not None:
+            span.error = (
+                "CancelledError"
+                if task.cancelled()
+                else type(task.exception()).__name__
+            )
+            tracer.finish(span)
+            return
+
+        password_failures: typing.Dict[str, FailToSetPassword] = task.result()
+        # Config is written before errors are shown, save duration does not
+        # include time spent by user to read them
         try:
-            all_workspaces = self._get_workspaces(instance)
-            instance.all_workspaces = all_workspaces
-        except AuthenticationError as exc:
-            instance.all_workspaces = []
+            self._write_config(local_folder, password_failures)
+        except BaseException as error:
+            span.error = type(error).__name__
+            raise
+        finally:
+            tracer.finish(span)
+        for instance_address, exc in password_failures.items():
             messagebox.showerror(
-                "Erreur de configuration",
-                f"Une erreur est survenue lors de l'authentification auprès de {address}",
+                "Erreur d'enregistrement",
+                (
+                    "Impossible d'enregistrer le mot de "
+                    f"passe pour l'instance '{instance_address}' : "
+                    f"'{exc}'"
+                ),
             )
 
+    def _write_config(
+        self,
+        local_folder: str,
+        password_failures: typing.Dict[str, FailToSetPassword],
+    ) -> None:
+        with tracer.span("config.update"):
+            update_config(
+                self._config,
+                self._instances,
+                local_folder,
+                raw_passwords=self._password_setter is None,
+                skipped=password_failures,
+            )
+            content = serialize_config(self._config)
+            sections = section_options(self._config)
+        # Written (and manager signaled) later, only if content changed
+        self._config_writer.submit(
+            content,
+            self._credentials_changed,
+            section_changes(self._submitted_sections, sections),
+        )
+        self._submitted_sections = sections
+        self._credentials_changed = set()
+
+    def _read_config_instance(
+        self, instance_name: str, snapshot: typing.Dict[str, SnapshotEntry]
+    ) -> Instance:
+        # When password setter is used, password is retrieved with instance refresh
+        instance = read_instance(self._config, instance_name)
+        instance.stale = True
+        instance.password_loaded = self._password_setter is None
+        snapshot_entry = snapshot.get(instance.address)
+        # Entry of another user (ex. username changed by provisioning) is
+        # ignored, its user id would request another user workspaces
+        if snapshot_entry is not None and snapshot_entry.username == instance.username:
+            instance.user_id = snapshot_entry.user_id
+            instance.set_all_workspaces(snapshot_entry.workspaces)
+
         return instance
 
-    def _get_workspaces(self, instance: Instance) -> typing.List[Workspace]:
-        user_id = Client.check_credentials(instance)
-        return Client(instance, user_id=user_id).get_workspaces()
+    async def _get_workspaces(
+        self,
+        instance: Instance,
+        on_page: typing.Optional[
+            typing.Callable[[typing.List[Workspace], bool], None]
+        ] = None,
+    ) -> typing.List[Workspace]:
+        # Refresh of App and TabFrame of same instance are merged, and a just
+        # fetched result is reused
+        workspaces, shared = await workspaces_flights.run(
+            credentials.key(instance),
+            lambda: self._fetch_workspaces(instance, on_page),
+        )
+        if shared:
+            if instance.all_workspaces != workspaces:
+                instance.set_all_workspaces(list(workspaces))
+            instance.user_id = credentials.get(instance) or instance.user_id
+            if on_page is not None:
+                self._dispatcher.post(on_page, workspaces, True)
+        return instance.all_workspaces
+
+    async def _fetch_workspaces(
+        self,
+        instance: Instance,
+        on_page: typing.Optional[
+            typing.Callable[[typing.List[Workspace], bool], None]
+        ] = None,
+    ) -> typing.List[Workspace]:
+        client = AsyncClient(instance, self._http, user_id=instance.user_id)
+        # Instance workspaces are replaced once all pages are received, a
+        # failed fetch keeps previous ones (and their enabled state)
+        workspaces: typing.List[Workspace] = []
+        try:
+            async for page in client.iter_workspace_pages():
+                if on_page is not None:
+                    self._dispatcher.post(on_page, page, not workspaces)
+                workspaces.extend(page)
+        except AuthenticationError:
+            if instance.user_id is None:
+                raise
+            # Known user id may be outdated, it is asked again with whoami
+            print(f"Refused user id of instance '{instance.address}', ask it again")
+            instance.user_id = None
+            return await self._fetch_workspaces(instance, on_page)
+        instance.user_id = await client.get_user_id()
+        instance.set_all_workspaces(workspaces)
+        return list(workspaces)
 
     def _build_config_frame(self) -> None:
-        config_frame = ConfigFrame(self._tabs_control, self)
-        self._tabs_control.add(config_frame, text="Configuration")
+        self._config_frame = ConfigFrame(self._tabs_control, self)
+        self._tabs_control.add(self._config_frame, text="Configuration")
 
     def _build_tab_frame(self, instance: typing.Optional[Instance]) -> ttk.Frame:
-        tab_frame = TabFrame(self._tabs_control, self, instance)
+        tab_frame: ttk.Frame
+        if instance is not None:
+            tab_frame = LazyTabFrame(self._tabs_control, self, instance)
+        else:
+            with tracer.span("tab.build"):
+                tab_frame = TabFrame(self._tabs_control, self, instance)
         self._tabs_frames[
             instance.address if instance is not None else None
         ] = tab_frame
         self._tabs_control.add(
-            tab_frame, text=instance.address if instance is not None else "Ajouter"
+            tab_frame,
+            text=self._tab_text(instance) if instance is not None else "Ajouter",
         )
         return tab_frame
 
+    def _on_tab_changed(self, event: tk.Event) -> None:
+        selected = self._tabs_control.select()
+        tab_frame = self.nametowidget(selected) if selected else None
+        if tab_frame is self._shown_tab:
+            return
+        if self._shown_tab is not None:
+            self._shown_tab.hide()
+        self._shown_tab = tab_frame if isinstance(tab_frame, LazyTabFrame) else None
+        if self._shown_tab is not None:
+            self._shown_tab.show()
+
+    def _refresh_tab_frame(self, instance: Instance) -> None:
+        if instance in self._instances:
+            self._tabs_frames[instance.address].refresh()
+
+    def _tab_text(self, instance: Instance) -> str:
+        return instance.address if not instance.stale else f"{instance.address} *"
+
+    def _update_tab_text(self, instance: Instance) -> None:
+        if (tab_frame := self._tabs_frames.get(instance.address)) is not None:
+            self._tabs_control.tab(tab_frame, text=self._tab_text(instance))
+
     def _add_instance(
-        self, address: str, username: str, password: str, unsecure: bool
+        self, instance: Instance, on_added: typing.Callable[[bool], None]
     ) -> None:
-        instance = Instance(
-            address=address,
-            username=username,
-            password=password,
-            unsecure=unsecure,
-            all_workspaces=[],
-            enabled_workspaces=[],
+        self._set_wait_message()
+        self.schedule(
+            self._get_workspaces(instance),
+            on_done=functools.partial(self._on_instance_fetched, instance, on_added),
+            instance=instance,
+            priority=PRIORITY_SHOWN_TAB,
         )
+
+    def _on_instance_fetched(
+        self,
+        instance: Instance,
+        on_added: typing.Callable[[bool], None],
+        task: asyncio.Task,
+    ) -> None:
+        self._destroy_wait_message()
         # TODO : errors can happens
-        all_workspaces = self._get_workspaces(instance)
-        instance.all_workspaces = all_workspaces
+        if task.cancelled() or task.exception() is not None:
+            on_added(False)
+            return
+
         self._instances.append(instance)
         self._build_tab_frame(instance)
         self._save_to_config()
+        self._save_snapshot()
+        on_added(True)
 
     def _update_instance(
         self,
@@ -213,42 +607,126 @@ class App(tk.Frame):
         password: str,
         unsecure: bool,
     ) -> None:
+        if (address, username, password, unsecure) != (
+            instance.address,
+            instance.username,
+            instance.password,
+            instance.unsecure,
+        ):
+            # Previous credentials must not be considered as valid anymore
+            credentials.discard(instance)
+            instance.user_id = None
+            self._credentials_changed.add(address)
+        if address != instance.address:
+            self._tabs_frames[address] = self._tabs_frames.pop(instance.address)
         instance.address = address
         instance.username = username
         instance.password = password
+        instance.password_loaded = True
         instance.unsecure = unsecure
         self._save_to_config()
 
     def _delete_instance(self, instance: Instance) -> None:
-        self._instances.remove(instance)
-        self._tabs_frames[instance.address].destroy()
+        self._forget_instance(instance)
         self._save_to_config()
 
-    def _set_password(self, instance_name: str, password: str) -> None:
-        assert self._password_setter_port is not None
+    def _forget_instance(self, instance: Instance) -> None:
+        self._instances.remove(instance)
+        self._scheduler.cancel(id(instance))
+        tab_frame = self._tabs_frames.pop(instance.address)
+        if tab_frame is self._shown_tab:
+            self._shown_tab = None
+        tab_frame.destroy()
+
+    def _reload_config(self) -> None:
         try:
-            response = requests.post(
-                f"http://127.0.0.1:{self._password_setter_port}/password/{instance_name}",
-                data=password,
-                headers={"X-Auth-Token": self._password_setter_token},
-            )
-            if response.status_code != 201:
-                raise FailToSetPassword(
-                    f"Unexpected response status code '{response.status_code}'"
-                )
-        except Exception as exc:
-            raise FailToSetPassword(str(exc))
+            content = self._config_store.read()
+        except OSError as exc:
+            print(f"Fail to read config {self._config_store.path}: ", exc)
+            return
+        # Ignore own writes
+        if content == self._config_writer.written:
+            return
 
-    def _get_password(self, instance_name: str) -> str:
+        config = configparser.ConfigParser()
         try:
-            response = requests.get(
-                f"http://127.0.0.1:{self._password_setter_port}/password/{instance_name}",
-                headers={"X-Auth-Token": self._password_setter_token},
-            )
-            if response.status_code != 200:
-                raise FailToSetPassword(
-                    f"Unexpected response status code '{response.status_code}'"
-                )
-            return response.text
-        except Exception as exc:
-            raise FailToGetPassword(str(exc))
+            config.read_string(content)
+        except configparser.Error as exc:
+            print(f"Ignore invalid config {self._config_store.path}: ", exc)
+            return
+
+        print(f"Config {self._config_store.path} changed, reload it")
+        # Compared to last written config, self._config may have local
+        # changes not written yet
+        written = configparser.ConfigParser()
+        try:
+            written.read_string(self._config_writer.written or "")
+        except configparser.Error:
+            pass
+        changed = changed_sections(written, config)
+        # Next changes are given to writer from reloaded content
+        self._submitted_sections = section_options(config)
+        merge_server_options(self._config, written, config)
+        self._config = config
+        pending = self._config_writer.acknowledge(content)
+        if "server" in changed:
+            self._config_frame.refresh()
+
+        # Instances added or removed locally and not written yet are kept so
+        written_names = read_instance_names(written)
+        instance_names = read_instance_names(config)
+        for instance in list(self._instances):
+            if (
+                instance.address in written_names
+                and instance.address not in instance_names
+            ):
+                self._forget_instance(instance)
+
+        instances = {instance.address: instance for instance in self._instances}
+        to_refresh: typing.List[Instance] = []
+        for instance_name in instance_names:
+            instance = instances.get(instance_name)
+            if instance is None:
+                if instance_name in written_names:
+                    continue
+                instance = read_instance(config, instance_name)
+                instance.stale = True
+                # Password is unknown until password setter gives it, it is not
+                # saved meanwhile
+                instance.password_loaded = self._password_setter is None
+                self._instances.append(instance)
+                self._build_tab_frame(instance)
+                to_refresh.append(instance)
+            elif f"instance.{instance_name}" in changed:
+                if self._reload_instance(instance, written, config):
+                    to_refresh.append(instance)
+                self._tabs_frames[instance.address].reload()
+
+        if to_refresh:
+            self.run_async(self._refresh_instances(to_refresh))
+        # Local changes not written yet are applied over reloaded config
+        if pending:
+            self._save_to_config()
+
+    def _reload_instance(
+        self,
+        instance: Instance,
+        written: configparser.ConfigParser,
+        config: configparser.ConfigParser,
+    ) -> bool:
+        # Return True if workspaces must be fetched again with new credentials
+        section_name = f"instance.{instance.address}"
+        credentials_changed = merge_instance(
+            instance,
+            (
+                read_instance(written, instance.address)
+                if written.has_section(section_name)
+                else None
+            ),
+            read_instance(config, instance.address),
+        )
+        if credentials_changed:
+            credentials.discard(instance)
+            instance.user_id = None
+            instance.stale = True
+        return credentials_changed
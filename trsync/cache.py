@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from trsync.model import Instance, Workspace
+
+
+# Count of seconds during which a successful whoami result is reused
+CREDENTIALS_TTL = 300.0
+# Count of seconds during which fetched workspaces are reused
+WORKSPACES_TTL = 10.0
+
+CredentialsKey = typing.Tuple[str, str, str, bool]
+K = typing.TypeVar("K")
+T = typing.TypeVar("T")
+
+
+class CredentialsCache:
+    def __init__(self, ttl: float = CREDENTIALS_TTL) -> None:
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._user_ids: typing.Dict[CredentialsKey, typing.Tuple[int, float]] = {}
+        self.hits = 0
+
+    @staticmethod
+    def key(instance: "Instance") -> CredentialsKey:
+        return (
+            instance.address,
+            instance.username,
+            hashlib.sha256(instance.password.encode()).hexdigest(),
+            instance.unsecure,
+        )
+
+    def get(self, instance: "Instance") -> typing.Optional[int]:
+        key = self.key(instance)
+        with self._lock:
+            try:
+                user_id, expire_at = self._user_ids[key]
+            except KeyError:
+                return None
+
+            if expire_at <= time.monotonic():
+                del self._user_ids[key]
+                return None
+
+            self.hits += 1
+            return user_id
+
+    def set(self, instance: "Instance", user_id: int) -> None:
+        with self._lock:
+            self._user_ids[self.key(instance)] = (
+                user_id,
+                time.monotonic() + self._ttl,
+            )
+
+    def discard(self, instance: "Instance") -> None:
+        with self._lock:
+            self._user_ids.pop(self.key(instance), None)
+
+    def invalidate(self, instance: "Instance") -> None:
+        # Drop entries of this account whatever the password, as it may be
+        # invalidated because password changed
+        with self._lock:
+            for key in [
+                key
+                for key in self._user_ids
+                if key[0] == instance.address and key[1] == instance.username
+            ]:
+                del self._user_ids[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._user_ids.clear()
+
+
+class _Flight(typing.Generic[T]):
+    def __init__(self, task: "asyncio.Future[T]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(typing.Generic[K, T]):
+    # Identical requests running at same time are sent once, their result is
+    # given to all callers and reused during ttl seconds if successful. Must
+    # be used from one event loop.
+    def __init__(self, name: str, ttl: float = 0.0) -> None:
+        self._name = name
+        self._ttl = ttl
+        self._flights: typing.Dict[K, _Flight[T]] = {}
+        self._results: typing.Dict[K, typing.Tuple[T, float]] = {}
+        self.sent = 0
+        self.joined = 0
+        self.reused = 0
+
+    async def run(
+        self, key: K, fetch: typing.Callable[[], typing.Awaitable[T]]
+    ) -> typing.Tuple[T, bool]:
+        # Return result and True if it was obtained by another caller
+        if (entry := self._results.get(key)) is not None:
+            result, expire_at = entry
+            if expire_at > time.monotonic():
+                self.reused += 1
+                return result, True
+            del self._results[key]
+
+        if (flight := self._flights.get(key)) is not None:
+            self.joined += 1
+            shared = True
+        else:
+            flight = self._start(key, fetch)
+            self.sent += 1
+            shared = False
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            # Request is cancelled when nobody waits for it anymore
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def forget(self, key: K) -> None:
+        self._results.pop(key, None)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def summary(self) -> str:
+        return (
+            f"{self._name}: {self.sent} sent, {self.joined} joined in flight, "
+            f"{self.reused} reused"
+        )
+
+    def _start(
+        self, key: K, fetch: typing.Callable[[], typing.Awaitable[T]]
+    ) -> _Flight[T]:
+        async def run() -> T:
+            result = await fetch()
+            if self._ttl:
+                self._results[key] = (result, time.monotonic() + self._ttl)
+            return result
+
+        flight = self._flights[key] = _Flight(asyncio.ensure_future(run()))
+
+        def done(task: "asyncio.Future[T]") -> None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight.task.add_done_callback(done)
+        return flight
+
+
+# Credentials checked by all clients of the process
+credentials = CredentialsCache()
+# Requests shared by asyncio clients of the process
+whoami_flights: SingleFlight[CredentialsKey, int] = SingleFlight("whoami")
+workspaces_flights: SingleFlight[
+    CredentialsKey, typing.List["Workspace"]
+] = SingleFlight("workspaces", ttl=WORKSPACES_TTL)
@@ -1,59 +1,243 @@
 import json
 from time import time
 import typing
-import requests
 
-from trsync.error import AuthenticationError, CommunicationError
+from trsync.cache import credentials
+from trsync.error import (
+    AuthenticationError,
+    CommunicationError,
+    InvalidResponseError,
+)
+from trsync.health import TRANSIENT_STATUS_CODES, Timeout, call, health
 from trsync.model import Workspace
+from trsync.session import SessionPool, sessions
+from trsync.stream import JsonArrayParser
+from trsync.trace import tracer
 
 
 if typing.TYPE_CHECKING:
+    import requests
+
     from trsync.model import Instance
 
+# Connect and read timeouts (in seconds) of requests, lowered for servers
+# known to answer fast
+WHOAMI_TIMEOUT = (10.0, 60.0)
+WORKSPACES_TIMEOUT = (10.0, 120.0)
+# Size of read network chunks when workspaces response is streamed
+STREAM_CHUNK_SIZE = 64 * 1024
+# Count of streamed workspaces given at once
+STREAM_BATCH_SIZE = 500
+
+
+def build_workspace(raw: typing.Dict[str, typing.Any]) -> Workspace:
+    return Workspace(
+        name=raw["label"],
+        id=raw["workspace_id"],
+    )
+
+
+# Parse a workspaces response fed chunk by chunk, for synchronous and
+# asyncio clients. Server can answer with a plain JSON array (streamed and
+# given by batches) or with a page object when pagination is supported.
+class WorkspacesResponseParser:
+    def __init__(self) -> None:
+        self._head = b""
+        self._array: typing.Optional[JsonArrayParser] = None
+        self._page_chunks: typing.Optional[typing.List[bytes]] = None
+        self._batch: typing.List[Workspace] = []
+        self._given = False
+        # Token of next page, known once response is closed
+        self.next_page_token: typing.Optional[str] = None
+
+    def feed(self, chunk: bytes) -> typing.List[typing.List[Workspace]]:
+        # Batches of workspaces entirely received
+        if self._array is None and self._page_chunks is None:
+            self._head += chunk
+            if not self._head.strip():
+                return []
+            chunk, self._head = self._head, b""
+            if chunk.lstrip()[:1] == b"{":
+                self._page_chunks = []
+            else:
+                self._array = JsonArrayParser()
+
+        if self._page_chunks is not None:
+            self._page_chunks.append(chunk)
+            return []
+
+        assert self._array is not None
+        try:
+            self._batch.extend(build_workspace(raw) for raw in self._array.feed(chunk))
+        except (ValueError, KeyError, TypeError) as exc:
+            raise InvalidResponseError(f"Invalid server response : {exc}")
+        if len(self._batch) < STREAM_BATCH_SIZE:
+            return []
+        batch, self._batch = self._batch, []
+        self._given = True
+        return [batch]
+
+    def close(self) -> typing.List[typing.List[Workspace]]:
+        # Last batches, response must be entirely received
+        try:
+            if self._page_chunks is not None:
+                data = json.loads(b"".join(self._page_chunks))
+                if data.get("has_next"):
+                    self.next_page_token = data.get("next_page_token") or None
+                return [[build_workspace(raw) for raw in data["items"]]]
+
+            (self._array or JsonArrayParser()).close()
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            raise InvalidResponseError(f"Invalid server response : {exc}")
+        if self._batch or not self._given:
+            return [self._batch]
+        return []
+
 
 # FIXME BS NOW : log errors
 class Client:
-    def __init__(self, instance: "Instance", user_id: int) -> None:
+    def __init__(
+        self,
+        instance: "Instance",
+        user_id: typing.Optional[int] = None,
+        session_pool: typing.Optional[SessionPool] = None,
+    ) -> None:
         self._instance = instance
         self._user_id = user_id
+        self._session_pool = session_pool or sessions
+
+    @property
+    def user_id(self) -> int:
+        # Resolved on first need, from credentials cache when possible
+        if self._user_id is None:
+            self._user_id = self.check_credentials(self._instance, self._session_pool)
+        return self._user_id
 
     @classmethod
-    def check_credentials(cls, instance: "Instance") -> int:
-        try:
-            response = requests.get(
-                f"{instance.url()}/api/auth/whoami",
-                auth=(instance.username, instance.password),
-                timeout=(10.0, 60.0),
-            )
-        except requests.exceptions.ConnectionError:
-            raise CommunicationError()
+    def check_credentials(
+        cls, instance: "Instance", session_pool: typing.Optional[SessionPool] = None
+    ) -> int:
+        if (user_id := credentials.get(instance)) is not None:
+            return user_id
 
-        if response.status_code == 200:
-            data = json.loads(response.content)
-            return data["user_id"]
+        # Imported at first network call to speed up startup
+        import requests
 
-        raise AuthenticationError()
+        session = (session_pool or sessions).get(instance.url())
 
-    def get_workspaces(self) -> typing.List[Workspace]:
-        try:
-            response = requests.get(
-                f"{self._instance.url()}/api/users/{self._user_id}/workspaces",
-                auth=(self._instance.username, self._instance.password),
-                timeout=(10.0, 120.0),
+        def request(timeout: Timeout) -> "requests.Response":
+            try:
+                response = session.get(
+                    f"{instance.url()}/api/auth/whoami",
+                    auth=(instance.username, instance.password),
+                    timeout=timeout,
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as exc:
+                raise CommunicationError(str(exc))
+            if response.status_code in TRANSIENT_STATUS_CODES:
+                raise CommunicationError(
+                    f"Server response status code was : {response.status_code}"
+                )
+            return response
+
+        with tracer.span("client.whoami", instance.address) as span:
+            response = call(
+                health.get(instance.url()), "whoami", WHOAMI_TIMEOUT, request
             )
-        except requests.exceptions.CommunicationError:
-            raise CommunicationError()
-
-        if response.status_code == 200:
-            data = json.loads(response.content)
-            return [
-                Workspace(
-                    name=raw["label"],
-                    id=raw["workspace_id"],
+            span.set(status_code=response.status_code, size=len(response.content))
+            if response.status_code == 200:
+                data = json.loads(response.content)
+                credentials.set(instance, data["user_id"])
+                return data["user_id"]
+
+            # Raised in span, refused credentials are counted as whoami errors
+            credentials.invalidate(instance)
+            raise AuthenticationError()
+
+    def get_workspaces(self) -> typing.List[Workspace]:
+        return [
+            workspace
+            for workspaces in self.iter_workspace_pages()
+            for workspace in workspaces
+        ]
+
+    def iter_workspace_pages(
+        self, page_size: typing.Optional[int] = None
+    ) -> typing.Iterator[typing.List[Workspace]]:
+        # See WorkspacesResponseParser
+        import requests
+
+        params: typing.Dict[str, typing.Any] = {}
+        if page_size is not None:
+            params["count"] = page_size
+
+        while True:
+            parser = WorkspacesResponseParser()
+            with tracer.span(
+                "client.workspaces", self._instance.address
+            ) as span, self._get_workspaces_response(params) as response:
+                span.set(status_code=response.status_code)
+                try:
+                    for chunk in span.count(
+                        response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+                    ):
+                        yield from parser.feed(chunk)
+                except (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                ) as exc:
+                    raise CommunicationError(str(exc))
+                last_batches = parser.close()
+
+            yield from last_batches
+            if parser.next_page_token is None:
+                return
+            params["page_token"] = parser.next_page_token
+
+    def _get_workspaces_response(
+        self, params: typing.Dict[str, typing.Any]
+    ) -> "requests.Response":
+        import requests
+
+        session = self._session_pool.get(self._instance.url())
+        # Resolved before, it is a request by itself
+        user_id = self.user_id
+
+        def request(timeout: Timeout) -> "requests.Response":
+            try:
+                response = session.get(
+                    f"{self._instance.url()}/api/users/{user_id}/workspaces",
+                    params=params,
+                    auth=(self._instance.username, self._instance.password),
+                    timeout=timeout,
+                    stream=True,
                 )
-                for raw in data
-            ]
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as exc:
+                raise CommunicationError(str(exc))
+
+            if response.status_code == 200:
+                return response
+
+            response.close()
+            if response.status_code in (401, 403):
+                credentials.invalidate(self._instance)
+                raise AuthenticationError()
+
+            error_class = (
+                CommunicationError
+                if response.status_code in TRANSIENT_STATUS_CODES
+                else InvalidResponseError
+            )
+            raise error_class(
+                f"Server response status code was : {response.status_code}"
+            )
 
-        raise CommunicationError(
-            f"Server response status code was : {response.status_code}"
+        return call(
+            health.get(self._instance.url()), "workspaces", WORKSPACES_TIMEOUT, request
         )
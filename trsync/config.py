@@ -0,0 +1,420 @@
+import configparser
+import contextlib
+import io
+import os
+import pathlib
+import stat
+import tempfile
+import threading
+import typing
+
+from trsync.model import Instance
+from trsync.trace import tracer
+
+if typing.TYPE_CHECKING:
+    from trsync.journal import Journal
+    from trsync.store import ConfigStore
+
+
+# Options by section name of changed sections, None for removed ones
+Sections = typing.Dict[str, typing.Optional[typing.Dict[str, str]]]
+
+# Count of seconds during which config changes are coalesced before writing
+WRITE_DELAY = 0.5
+# Count of seconds before writing again config which failed to be written
+WRITE_RETRY_DELAY = 5.0
+# Suffix added to the name of a file to name its lock file
+LOCK_SUFFIX = ".lock"
+
+
+def config_paths() -> typing.Tuple[
+    pathlib.Path, pathlib.Path, pathlib.Path, pathlib.Path
+]:
+    # Config, config track, snapshot and journal files paths
+    if os.name == "nt":
+        folder = pathlib.Path.home() / "AppData" / "Local"
+        return (
+            folder / "trsync.conf",
+            folder / "trsync.conf.track",
+            folder / "trsync.conf.snapshot",
+            folder / "trsync.conf.journal",
+        )
+
+    folder = pathlib.Path.home()
+    return (
+        folder / ".trsync.conf",
+        folder / ".trsync.conf.track",
+        folder / ".trsync.conf.snapshot",
+        folder / ".trsync.conf.journal",
+    )
+
+
+def read_instance_names(config: configparser.ConfigParser) -> typing.List[str]:
+    return [
+        instance_name.strip()
+        for instance_name in config.get("server", "instances", fallback="").split(",")
+        if instance_name
+    ]
+
+
+def read_instance(config: configparser.ConfigParser, instance_name: str) -> Instance:
+    section_name = f"instance.{instance_name}"
+    address = config[section_name]["address"]
+    username = config[section_name]["username"]
+    # When password setter is used, password must be retrieved from it
+    password = config.get(section_name, "password", fallback="")
+    unsecure = config.getboolean(section_name, "unsecure")
+    workspaces_ids = [
+        int(workspace_id.strip())
+        for workspace_id in config[section_name]["workspaces_ids"].split(",")
+        if workspace_id.strip()
+    ]
+    return Instance(
+        address=address,
+        username=username,
+        password=password,
+        unsecure=unsecure,
+        enabled_workspaces=workspaces_ids,
+        all_workspaces=[],
+    )
+
+
+def update_config(
+    config: configparser.ConfigParser,
+    instances: typing.List[Instance],
+    local_folder: str,
+    raw_passwords: bool,
+    skipped: typing.Container[str] = (),
+) -> None:
+    # Instances in skipped (ex. because password setter failed) are listed but
+    # their section is not updated
+    if not config.has_section("server"):
+        config.add_section("server")
+    config.set(
+        "server",
+        "instances",
+        ",".join(instance.address for instance in instances),
+    )
+    config.set("server", "local_folder", local_folder)
+    for instance in instances:
+        section_name = f"instance.{instance.address}"
+        if not config.has_section(section_name):
+            config.add_section(section_name)
+        config.set(section_name, "address", instance.address)
+        config.set(section_name, "username", instance.username)
+        if instance.address in skipped:
+            continue
+        if raw_passwords:
+            config.set(section_name, "password", instance.password)
+        config.set(section_name, "unsecure", str(instance.unsecure))
+        print("Workspaces ids : ", instance.enabled_workspaces)
+        config.set(
+            section_name,
+            "workspaces_ids",
+            ",".join(
+                str(workspace_id) for workspace_id in instance.enabled_workspaces
+            ),
+        )
+
+
+def changed_sections(
+    old: configparser.ConfigParser, new: configparser.ConfigParser
+) -> typing.Set[str]:
+    # Names of sections added, removed or modified
+    return {
+        section_name
+        for section_name in set(old.sections()) | set(new.sections())
+        if (dict(old[section_name]) if old.has_section(section_name) else None)
+        != (dict(new[section_name]) if new.has_section(section_name) else None)
+    }
+
+
+def merge_instance(
+    instance: Instance, written: typing.Optional[Instance], reloaded: Instance
+) -> bool:
+    # Apply options changed by another program (from written to reloaded
+    # config), local changes of other options are kept. Return True if
+    # credentials changed.
+    def merged(name: str) -> typing.Any:
+        value = getattr(reloaded, name)
+        if written is not None and getattr(written, name) == value:
+            return getattr(instance, name)
+        return value
+
+    credentials = (merged("username"), merged("password"), merged("unsecure"))
+    credentials_changed = credentials != (
+        instance.username,
+        instance.password,
+        instance.unsecure,
+    )
+    instance.username, instance.password, instance.unsecure = credentials
+
+    if written is None:
+        enabled = list(reloaded.enabled_workspaces)
+    else:
+        # Workspaces enabled or disabled by other program, others as locally
+        written_ids = set(written.enabled_workspaces)
+        reloaded_ids = set(reloaded.enabled_workspaces)
+        enabled = [
+            workspace_id
+            for workspace_id in instance.enabled_workspaces
+            if workspace_id in reloaded_ids or workspace_id not in written_ids
+        ] + [
+            workspace_id
+            for workspace_id in reloaded.enabled_workspaces
+            if workspace_id not in written_ids and not instance.is_enabled(workspace_id)
+        ]
+    instance.set_enabled_workspaces(enabled)
+    return credentials_changed
+
+
+def merge_server_options(
+    local: configparser.ConfigParser,
+    written: configparser.ConfigParser,
+    reloaded: configparser.ConfigParser,
+) -> None:
+    # Set into reloaded config server options changed locally (since written
+    # config) and not by another program. Instances list is not merged, it is
+    # written from instances.
+    def options(config: configparser.ConfigParser) -> typing.Dict[str, str]:
+        return dict(config["server"]) if config.has_section("server") else {}
+
+    written_options = options(written)
+    reloaded_options = options(reloaded)
+    for key, value in options(local).items():
+        if (
+            key != "instances"
+            and value != written_options.get(key)
+            and reloaded_options.get(key) == written_options.get(key)
+        ):
+            if not reloaded.has_section("server"):
+                reloaded.add_section("server")
+            reloaded.set("server", key, value)
+
+
+def section_options(
+    config: configparser.ConfigParser,
+) -> typing.Dict[str, typing.Dict[str, str]]:
+    return {name: dict(config.items(name, raw=True)) for name in config.sections()}
+
+
+def section_changes(
+    old: typing.Dict[str, typing.Dict[str, str]],
+    new: typing.Dict[str, typing.Dict[str, str]],
+) -> Sections:
+    # Sections (see section_options) added, removed or modified
+    changes: Sections = {
+        name: options for name, options in new.items() if old.get(name) != options
+    }
+    changes.update((name, None) for name in old if name not in new)
+    return changes
+
+
+def serialize_config(config: configparser.ConfigParser) -> str:
+    content = io.StringIO()
+    config.write(content)
+    return content.getvalue()
+
+
+@contextlib.contextmanager
+def file_lock(path: pathlib.Path) -> typing.Iterator[None]:
+    # Exclusive lock shared by processes (ex. window and provisioning) on a
+    # file read then written, held on a separate lock file because locked
+    # file may be replaced
+    with open(path.with_name(path.name + LOCK_SUFFIX), "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    # Blocks at most 10 seconds
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomic(path: pathlib.Path, content: str, sync: bool = True) -> None:
+    # Content is written in a temporary file then renamed, so readers can
+    # never see a partially written file
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "w") as temporary_file:
+            temporary_file.write(content)
+            if sync:
+                temporary_file.flush()
+                os.fsync(temporary_file.fileno())
+        try:
+            os.chmod(temporary_path, stat.S_IMODE(path.stat().st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.unlink(temporary_path)
+        except OSError:
+            pass
+        raise
+
+    if sync and os.name != "nt":
+        directory_descriptor = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+
+
+class ConfigWriter:
+    # Writes are done by flush without holding the lock taken by submit, so
+    # Tk thread is not blocked by a slow store meanwhile
+    def __init__(
+        self,
+        store: "ConfigStore",
+        config_track_file_path: pathlib.Path,
+        delay: float = WRITE_DELAY,
+        journal: typing.Optional["Journal"] = None,
+    ) -> None:
+        self._store = store
+        self._config_track_file_path = config_track_file_path
+        self._delay = delay
+        self._journal = journal
+        self._lock = threading.Lock()
+        # Held while writing, by one flush at a time
+        self._write_lock = threading.Lock()
+        self._pending: typing.Optional[str] = None
+        # Sections changed since written content, None when unknown
+        self._pending_sections: typing.Optional[Sections] = None
+        # Instances which password changed, it can't be seen in config when
+        # password setter is used
+        self._credentials_changed: typing.Set[str] = set()
+        self._timer: typing.Optional[threading.Timer] = None
+        try:
+            self._written: typing.Optional[str] = store.read()
+        except OSError:
+            self._written = None
+
+    @property
+    def written(self) -> typing.Optional[str]:
+        # Config file content, as last written or known. Waits for a write in
+        # progress.
+        with self._write_lock, self._lock:
+            return self._written
+
+    @property
+    def pending(self) -> bool:
+        with self._lock:
+            return self._pending is not None
+
+    def acknowledge(self, content: str) -> bool:
+        # Config file content written by another program. Pending content,
+        # made from previous one, is dropped (then True is returned) and must
+        # be submitted again from this one.
+        with self._write_lock, self._lock:
+            self._written = content
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending is not None, None
+            self._pending_sections = None
+            return pending
+
+    def submit(
+        self,
+        content: str,
+        credentials_changed: typing.Iterable[str] = (),
+        sections: typing.Optional[Sections] = None,
+    ) -> None:
+        # Sections changed since previously submitted content, if known
+        with self._lock:
+            self._pending_sections = _merge_sections(
+                self._pending_sections if self._pending is not None else {},
+                sections,
+            )
+            self._pending = content
+            self._credentials_changed.update(credentials_changed)
+            self._schedule(self._delay)
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                content, self._pending = self._pending, None
+                sections, self._pending_sections = self._pending_sections, None
+                credentials_changed, self._credentials_changed = (
+                    self._credentials_changed,
+                    set(),
+                )
+                written = self._written
+            if content is None:
+                return
+
+            if content == written:
+                print(f"Config {self._store.path} unchanged, skip write")
+                return
+
+            print(f"Write config into {self._store.path}")
+            try:
+                with tracer.span("config.write") as span:
+                    span.set(size=len(content))
+                    self._store.write(written, content, sections)
+            except OSError as exc:
+                print(f"Fail to write config into {self._store.path}: ", exc)
+                with self._lock:
+                    # Kept to be written again, unless newer content was
+                    # submitted meanwhile (it includes this one changes)
+                    if self._pending is None:
+                        self._pending = content
+                        self._pending_sections = sections
+                        self._schedule(WRITE_RETRY_DELAY)
+                    else:
+                        self._pending_sections = _merge_sections(
+                            sections, self._pending_sections
+                        )
+                    self._credentials_changed.update(credentials_changed)
+                return
+            with self._lock:
+                self._written = content
+
+            if self._journal is not None:
+                try:
+                    self._journal.record(written, content, credentials_changed)
+                except OSError as exc:
+                    print("Fail to write config changes journal: ", exc)
+
+            # Kept for managers not reading journal
+            with self._config_track_file_path.open("w") as config_track_file:
+                config_track_file.write("")
+
+    def _schedule(self, delay: float) -> None:
+        # Must be called with lock held
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def _merge_sections(
+    older: typing.Optional[Sections], newer: typing.Optional[Sections]
+) -> typing.Optional[Sections]:
+    # Changes of two successive contents, unknown if one of them is
+    if older is None or newer is None:
+        return None
+    return {**older, **newer}
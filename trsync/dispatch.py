@@ -0,0 +1,92 @@
+import concurrent.futures
+import queue
+import time
+import typing
+
+# Maximum count of milliseconds spent running UI callbacks by Tk frame
+DRAIN_BUDGET = 8.0
+# Milliseconds between two queue drains, when callbacks are still waiting or not
+DRAIN_BUSY_INTERVAL = 1
+DRAIN_IDLE_INTERVAL = 20
+# Count of threads running blocking jobs (disk writes, ...)
+WORKERS_COUNT = 2
+
+
+class Dispatcher:
+    def __init__(self, widget, budget: float = DRAIN_BUDGET) -> None:
+        self._widget = widget
+        self._budget = budget / 1000
+        # Filled from any thread, only drained by Tk thread
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._after_id: typing.Optional[str] = None
+        self._closed = False
+
+    def start(self) -> None:
+        self._drain()
+
+    def post(self, callback: typing.Callable, *args: typing.Any) -> None:
+        # Can be called from any thread, callback will be run by Tk thread
+        if not self._closed:
+            self._queue.put((callback, args))
+
+    def submit(
+        self,
+        job: typing.Callable[[], typing.Any],
+        on_done: typing.Optional[
+            typing.Callable[[concurrent.futures.Future], None]
+        ] = None,
+    ) -> concurrent.futures.Future:
+        # Job is run by a worker thread, on_done by Tk thread
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=WORKERS_COUNT, thread_name_prefix="trsync-worker"
+            )
+        future = self._executor.submit(job)
+        if on_done is not None:
+            future.add_done_callback(lambda future: self.post(on_done, future))
+        else:
+            future.add_done_callback(_print_job_failure)
+        return future
+
+    def run_pending(self) -> None:
+        # Run all waiting callbacks now, without budget (ex. before closing)
+        while self._run_next():
+            pass
+
+    def close(self) -> None:
+        self._closed = True
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        # Pending jobs (ex. snapshot writes) are finished, their UI callbacks
+        # are dropped because window is closing
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _drain(self) -> None:
+        deadline = time.perf_counter() + self._budget
+        while time.perf_counter() < deadline and self._run_next():
+            pass
+
+        self._after_id = self._widget.after(
+            DRAIN_IDLE_INTERVAL if self._queue.empty() else DRAIN_BUSY_INTERVAL,
+            self._drain,
+        )
+
+    def _run_next(self) -> bool:
+        # Run next waiting callback, False if there is none
+        try:
+            callback, args = self._queue.get_nowait()
+        except queue.Empty:
+            return False
+        try:
+            callback(*args)
+        except Exception as exc:
+            print("UI callback failed: ", repr(exc))
+        return True
+
+
+def _print_job_failure(future: concurrent.futures.Future) -> None:
+    if not future.cancelled() and (exc := future.exception()) is not None:
+        print("Background job failed: ", repr(exc))
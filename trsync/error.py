@@ -6,6 +6,16 @@ class CommunicationError(Exception):
     pass
 
 
+# Server answered something unexpected, retrying will not help
+class InvalidResponseError(CommunicationError):
+    pass
+
+
+# Server failed too many times, request has not been sent
+class CircuitOpenError(CommunicationError):
+    pass
+
+
 class NotFoundError(Exception):
     pass
 
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import threading
+import time
+import typing
+
+from trsync.error import (
+    AuthenticationError,
+    CircuitOpenError,
+    CommunicationError,
+    InvalidResponseError,
+)
+
+T = typing.TypeVar("T")
+Timeout = typing.Tuple[float, float]
+
+# Lower bounds (in seconds) of adapted connect and read timeouts, upper bounds
+# are timeouts given by callers
+MIN_CONNECT_TIMEOUT = 3.0
+MIN_READ_TIMEOUT = 15.0
+# Read timeout is this count of times the expected answer time
+READ_TIMEOUT_FACTOR = 4.0
+# Weights of latest answer time in smoothed answer time and its variation
+# (same estimator as TCP retransmission timeout, RFC 6298)
+LATENCY_WEIGHT = 0.125
+DEVIATION_WEIGHT = 0.25
+# Server response status codes considered as transient errors
+TRANSIENT_STATUS_CODES = (502, 503, 504)
+# Consecutive failures after which requests fail without being sent
+FAILURES_THRESHOLD = 3
+# Seconds during which an instance is not requested once circuit opened
+OPEN_DURATION = 30.0
+# Attempts of a request failing with a transient error, and bounds (in
+# seconds) of the random delay between attempts
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 5.0
+
+
+class InstanceHealth:
+    def __init__(
+        self,
+        failures_threshold: int = FAILURES_THRESHOLD,
+        open_duration: float = OPEN_DURATION,
+    ) -> None:
+        self._failures_threshold = failures_threshold
+        self._open_duration = open_duration
+        self._lock = threading.Lock()
+        # Smoothed answer time and its variation, by operation (ex. whoami
+        # answers faster than workspaces listing of an admin account)
+        self._latencies: typing.Dict[str, typing.Tuple[float, float]] = {}
+        self._failures = 0
+        self._opened_at: typing.Optional[float] = None
+        self._probing = False
+
+    @property
+    def open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def probe_delay(self) -> float:
+        # Seconds before a request can be sent again (0 if circuit is closed)
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self._open_duration - time.monotonic())
+
+    @property
+    def probing(self) -> bool:
+        with self._lock:
+            return self._probing
+
+    def timeout(self, default: Timeout, operation: str) -> Timeout:
+        with self._lock:
+            if (estimate := self._latencies.get(operation)) is None:
+                return default
+            latency, deviation = estimate
+            expected = latency + 4 * deviation
+        connect_timeout, read_timeout = default
+        return (
+            min(connect_timeout, max(MIN_CONNECT_TIMEOUT, expected)),
+            min(read_timeout, max(MIN_READ_TIMEOUT, READ_TIMEOUT_FACTOR * expected)),
+        )
+
+    def before_request(self) -> None:
+        # When circuit is open, only one request (the probe) is sent once
+        # open duration is elapsed
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (
+                self._probing
+                or time.monotonic() < self._opened_at + self._open_duration
+            ):
+                raise CircuitOpenError("Server unreachable, retry later")
+            self._probing = True
+
+    def record_success(self, latency: float, operation: str) -> None:
+        with self._lock:
+            if (estimate := self._latencies.get(operation)) is None:
+                self._latencies[operation] = (latency, latency / 2)
+            else:
+                smoothed, deviation = estimate
+                deviation += DEVIATION_WEIGHT * (abs(smoothed - latency) - deviation)
+                smoothed += LATENCY_WEIGHT * (latency - smoothed)
+                self._latencies[operation] = (smoothed, deviation)
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._failures_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class HealthRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._healths: typing.Dict[str, InstanceHealth] = {}
+
+    def get(self, key: str) -> InstanceHealth:
+        with self._lock:
+            if (instance_health := self._healths.get(key)) is None:
+                instance_health = self._healths[key] = InstanceHealth()
+            return instance_health
+
+    def clear(self) -> None:
+        with self._lock:
+            self._healths.clear()
+
+
+def retry_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+def is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, CommunicationError) and not isinstance(
+        exc, InvalidResponseError
+    )
+
+
+def call(
+    instance_health: InstanceHealth,
+    operation: str,
+    default_timeout: Timeout,
+    request: typing.Callable[[Timeout], T],
+) -> T:
+    # Run request with timeouts adapted to server answer time for this
+    # operation, failing fast while circuit is open and retrying transient
+    # errors
+    attempt = 0
+    while True:
+        instance_health.before_request()
+        start = time.monotonic()
+        try:
+            result = request(instance_health.timeout(default_timeout, operation))
+        except BaseException as exc:
+            if not _record(instance_health, operation, exc, start, attempt):
+                raise
+            time.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+        instance_health.record_success(time.monotonic() - start, operation)
+        return result
+
+
+async def call_async(
+    instance_health: InstanceHealth,
+    operation: str,
+    default_timeout: Timeout,
+    request: typing.Callable[[Timeout], typing.Awaitable[T]],
+) -> T:
+    # See call
+    attempt = 0
+    while True:
+        instance_health.before_request()
+        start = time.monotonic()
+        try:
+            result = await request(instance_health.timeout(default_timeout, operation))
+        except BaseException as exc:
+            if not _record(instance_health, operation, exc, start, attempt):
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+            continue
+        instance_health.record_success(time.monotonic() - start, operation)
+        return result
+
+
+def _record(
+    instance_health: InstanceHealth,
+    operation: str,
+    exc: BaseException,
+    start: float,
+    attempt: int,
+) -> bool:
+    # Record request failure, return True if request must be retried
+    if isinstance(exc, (AuthenticationError, InvalidResponseError)):
+        # Server answered, so it is reachable
+        instance_health.record_success(time.monotonic() - start, operation)
+        return False
+    if not is_transient(exc):
+        # Ex. cancelled request, which tell nothing about server
+        instance_health.release_probe()
+        return False
+
+    # A call failing all its attempts is one failure, a failed probe is not
+    # retried
+    if attempt + 1 < RETRY_ATTEMPTS and not instance_health.probing:
+        return True
+    instance_health.record_failure()
+    return False
+
+
+# Health of instances servers, by instance url
+health = HealthRegistry()
@@ -0,0 +1,173 @@
+import configparser
+import json
+import os
+import pathlib
+import time
+import typing
+
+from trsync.config import file_lock, read_instance_names, write_atomic
+
+# Journal is compacted to half this size (in bytes) once bigger
+MAX_JOURNAL_SIZE = 256 * 1024
+# Instance config keys which need instance synchronization restart
+CREDENTIALS_KEYS = ("address", "username", "password", "unsecure")
+# Bytes first read from journal end to find last sequence number
+TAIL_SIZE = 4096
+
+# Journal is a JSON lines file, each line describe one config write, ex. :
+#
+# {"seq": 3, "time": 1700000000.0, "added": ["a.example.com"], "removed": [],
+#  "credentials": [], "workspaces": {"b.example.com": {"enabled": [4],
+#  "disabled": [2]}}, "server": ["local_folder"]}
+#
+# A reader keeps last applied sequence number, then applies next entries. If
+# sequence numbers are not following (ex. journal compacted meanwhile), whole
+# config must be reloaded.
+
+
+def config_changes(
+    old_content: typing.Optional[str],
+    new_content: str,
+    credentials_changed: typing.Iterable[str] = (),
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    # Changes between two config contents, None if nothing changed
+    old = configparser.ConfigParser()
+    new = configparser.ConfigParser()
+    try:
+        old.read_string(old_content or "")
+    except configparser.Error:
+        # Unreadable previous content, everything is considered added
+        old = configparser.ConfigParser()
+    new.read_string(new_content)
+
+    old_names = read_instance_names(old)
+    new_names = read_instance_names(new)
+    added = [name for name in new_names if name not in old_names]
+    removed = [name for name in old_names if name not in new_names]
+
+    credentials = set(credentials_changed)
+    workspaces: typing.Dict[str, typing.Dict[str, typing.List[int]]] = {}
+    for name in new_names:
+        if name not in old_names:
+            continue
+        old_section = _section(old, name)
+        new_section = _section(new, name)
+        # Most sections are unchanged, ids are only parsed for changed ones
+        if old_section == new_section:
+            continue
+        if any(
+            old_section.get(key) != new_section.get(key) for key in CREDENTIALS_KEYS
+        ):
+            credentials.add(name)
+        old_ids = _workspaces_ids(old_section)
+        new_ids = _workspaces_ids(new_section)
+        if old_ids != new_ids:
+            workspaces[name] = {
+                "enabled": sorted(new_ids - old_ids),
+                "disabled": sorted(old_ids - new_ids),
+            }
+
+    old_server = _section(old, None)
+    new_server = _section(new, None)
+    server = sorted(
+        key
+        for key in set(old_server) | set(new_server)
+        if key != "instances" and old_server.get(key) != new_server.get(key)
+    )
+
+    changes = {
+        "added": added,
+        "removed": removed,
+        "credentials": [
+            name for name in new_names if name in credentials and name not in added
+        ],
+        "workspaces": workspaces,
+        "server": server,
+    }
+    if not any(changes.values()):
+        return None
+    return changes
+
+
+class Journal:
+    def __init__(self, path: pathlib.Path, max_size: int = MAX_JOURNAL_SIZE) -> None:
+        self._path = path
+        self._max_size = max_size
+
+    def record(
+        self,
+        old_content: typing.Optional[str],
+        new_content: str,
+        credentials_changed: typing.Iterable[str] = (),
+    ) -> typing.Optional[int]:
+        changes = config_changes(old_content, new_content, credentials_changed)
+        if changes is None:
+            return None
+        return self.append(changes)
+
+    def append(self, changes: typing.Dict[str, typing.Any]) -> int:
+        # Sequence number is read from file, it can be written by other
+        # processes (ex. provisioning). They are excluded until entry is
+        # written (and journal compacted), so sequence numbers are unique and
+        # compaction drops no entry.
+        with file_lock(self._path):
+            sequence = self.last_sequence() + 1
+            entry = {"seq": sequence, "time": time.time(), **changes}
+            line = json.dumps(entry, separators=(",", ":")) + "\n"
+            with self._path.open("a") as journal_file:
+                journal_file.write(line)
+                size = journal_file.tell()
+
+            if size > self._max_size:
+                self._compact()
+        return sequence
+
+    def last_sequence(self) -> int:
+        try:
+            with self._path.open("rb") as journal_file:
+                file_size = journal_file.seek(0, os.SEEK_END)
+                tail_size = TAIL_SIZE
+                while True:
+                    journal_file.seek(max(0, file_size - tail_size))
+                    tail = journal_file.read()
+                    for line in reversed(tail.splitlines()):
+                        try:
+                            return int(json.loads(line)["seq"])
+                        except (ValueError, KeyError, TypeError):
+                            # First line may be truncated
+                            continue
+                    if tail_size >= file_size:
+                        return 0
+                    # Last entry is bigger than read tail
+                    tail_size *= 4
+        except FileNotFoundError:
+            return 0
+
+    def _compact(self) -> None:
+        # Last entries are kept, up to half of maximum size
+        kept: typing.List[str] = []
+        size = 0
+        for line in reversed(self._path.read_text().splitlines(keepends=True)):
+            size += len(line)
+            # Last entry is always kept to keep sequence numbers
+            if size > self._max_size // 2 and kept:
+                break
+            kept.append(line)
+        write_atomic(self._path, "".join(reversed(kept)))
+
+
+def _section(
+    config: configparser.ConfigParser, instance_name: typing.Optional[str]
+) -> typing.Dict[str, str]:
+    section_name = f"instance.{instance_name}" if instance_name else "server"
+    if not config.has_section(section_name):
+        return {}
+    return dict(config.items(section_name, raw=True))
+
+
+def _workspaces_ids(section: typing.Dict[str, str]) -> typing.Set[int]:
+    return {
+        int(workspace_id)
+        for workspace_id in section.get("workspaces_ids", "").split(",")
+        if workspace_id.strip()
+    }
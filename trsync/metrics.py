@@ -0,0 +1,204 @@
+import bisect
+import threading
+import typing
+
+from trsync.trace import Span
+
+# Address metrics are served on, only reachable from this machine
+METRICS_HOST = "127.0.0.1"
+# Upper bounds (in seconds) of durations histograms buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Requests measured by instance, by span name
+REQUEST_SPANS = {"client.whoami": "whoami", "client.workspaces": "workspaces"}
+SAVE_SPAN = "config.save"
+# Errors of interrupted operations (ex. closed tab), not failures
+IGNORED_ERRORS = {"CancelledError", "GeneratorExit", "KeyboardInterrupt", "SystemExit"}
+
+Labels = typing.Tuple[typing.Tuple[str, str], ...]
+# Returns gauge value by instance address
+GaugeCollect = typing.Callable[[], typing.Dict[str, float]]
+
+
+class Histogram:
+    def __init__(self, buckets: typing.Sequence[float] = DURATION_BUCKETS) -> None:
+        self._buckets = buckets
+        # Count by bucket, last one is for values above all bounds
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    def lines(self, name: str, labels: Labels) -> typing.Iterator[str]:
+        count = 0
+        for bound, bucket_count in zip(
+            [*map(repr, self._buckets), "+Inf"], self._counts
+        ):
+            count += bucket_count
+            yield f"{name}_bucket{_labels((*labels, ('le', bound)))} {count}"
+        yield f"{name}_sum{_labels(labels)} {self._sum!r}"
+        yield f"{name}_count{_labels(labels)} {count}"
+
+
+class Metrics:
+    # Collect spans (as a tracer listener) into Prometheus metrics. Recording a
+    # span is a dict lookup and a few increments, text is built when scraped.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._request_durations: typing.Dict[typing.Tuple[str, str], Histogram] = {}
+        self._request_errors: typing.Dict[typing.Tuple[str, str, str], int] = {}
+        self._save_durations = Histogram()
+        self._save_errors: typing.Dict[str, int] = {}
+        self._gauges: typing.Dict[str, typing.Tuple[str, GaugeCollect]] = {}
+
+    def add(self, span: Span) -> None:
+        if (request := REQUEST_SPANS.get(span.name)) is not None:
+            key = (request, span.instance or "")
+            with self._lock:
+                if (histogram := self._request_durations.get(key)) is None:
+                    histogram = self._request_durations[key] = Histogram()
+                histogram.observe(span.duration)
+                if span.error is not None and span.error not in IGNORED_ERRORS:
+                    error_key = (*key, span.error)
+                    self._request_errors[error_key] = (
+                        self._request_errors.get(error_key, 0) + 1
+                    )
+        elif span.name == SAVE_SPAN:
+            with self._lock:
+                self._save_durations.observe(span.duration)
+                if span.error is not None:
+                    self._save_errors[span.error] = (
+                        self._save_errors.get(span.error, 0) + 1
+                    )
+
+    def set_gauge(self, name: str, help_text: str, collect: GaugeCollect) -> None:
+        # Gauge values are collected when scraped, from server thread
+        with self._lock:
+            self._gauges[name] = (help_text, collect)
+
+    def remove_gauge(self, name: str) -> None:
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP trsync_request_duration_seconds Duration of requests "
+                "to Tracim instances",
+                "# TYPE trsync_request_duration_seconds histogram",
+            ]
+            for (request, instance), histogram in sorted(
+                self._request_durations.items()
+            ):
+                lines.extend(
+                    histogram.lines(
+                        "trsync_request_duration_seconds",
+                        (("instance", instance), ("request", request)),
+                    )
+                )
+            lines.extend(
+                [
+                    "# HELP trsync_request_errors_total Failed requests to Tracim "
+                    "instances, by error",
+                    "# TYPE trsync_request_errors_total counter",
+                ]
+            )
+            for (request, instance, error), count in sorted(
+                self._request_errors.items()
+            ):
+                labels = (
+                    ("error", error),
+                    ("instance", instance),
+                    ("request", request),
+                )
+                lines.append(f"trsync_request_errors_total{_labels(labels)} {count}")
+            lines.extend(
+                [
+                    "# HELP trsync_config_save_duration_seconds Duration (and count) "
+                    "of config saves, passwords included",
+                    "# TYPE trsync_config_save_duration_seconds histogram",
+                    *self._save_durations.lines(
+                        "trsync_config_save_duration_seconds", ()
+                    ),
+                    "# HELP trsync_config_save_errors_total Failed config saves, "
+                    "by error",
+                    "# TYPE trsync_config_save_errors_total counter",
+                ]
+            )
+            for error, count in sorted(self._save_errors.items()):
+                lines.append(
+                    f"trsync_config_save_errors_total{_labels((('error', error),))} "
+                    f"{count}"
+                )
+            gauges = sorted(self._gauges.items())
+
+        for name, (help_text, collect) in gauges:
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+            for instance, value in sorted(collect().items()):
+                lines.append(f"{name}{_labels((('instance', instance),))} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    # Serve metrics as Prometheus text, from a daemon thread
+    def __init__(
+        self, metrics: Metrics, port: int, host: str = METRICS_HOST
+    ) -> None:
+        # Imported here to not slow down window startup
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                content = metrics.render().encode()
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(
+                name,
+                value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+            )
+            for name, value in labels
+        )
+        + "}"
+    )
+
+
+# Metrics of all the process, collected once a metrics port is given
+metrics = Metrics()
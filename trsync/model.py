@@ -1,11 +1,35 @@
 import dataclasses
 import typing
+import unicodedata
+
+
+def normalize_workspace_name(name: str) -> str:
+    return name.encode("ascii", "ignore").decode()
+
+
+def fold_workspace_name(name: str) -> str:
+    # Case and accents insensitive form of name, for comparisons
+    decomposed = unicodedata.normalize("NFKD", name)
+    return " ".join(
+        "".join(
+            character
+            for character in decomposed
+            if not unicodedata.combining(character)
+        )
+        .casefold()
+        .split()
+    )
 
 
 @dataclasses.dataclass
 class Workspace:
-    id: str
+    id: int
     name: str
+    # Computed once, used for display
+    normalized_name: str = dataclasses.field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.normalized_name = normalize_workspace_name(self.name)
 
 
 @dataclasses.dataclass
@@ -16,7 +40,45 @@ class Instance:
     unsecure: bool
     all_workspaces: typing.List[Workspace]
     enabled_workspaces: typing.List[int]
+    user_id: typing.Optional[int] = None
+    # True while all_workspaces come from snapshot and not from server
+    stale: bool = False
+    # False while password is not known (password setter did not give it
+    # yet, or failed to), password must not be used nor saved meanwhile
+    password_loaded: bool = dataclasses.field(default=True, compare=False)
+    # Indexes of all_workspaces and enabled_workspaces, must be updated with
+    # set_all_workspaces, add_workspaces and set_enabled_workspaces
+    workspaces_by_id: typing.Dict[int, Workspace] = dataclasses.field(
+        init=False, repr=False, compare=False
+    )
+    enabled_workspaces_ids: typing.Set[int] = dataclasses.field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self.set_all_workspaces(self.all_workspaces)
+        self.set_enabled_workspaces(self.enabled_workspaces)
 
     def url(self) -> str:
         scheme = "https" if not self.unsecure else "http"
         return f"{scheme}://{self.address}"
+
+    def set_all_workspaces(self, workspaces: typing.List[Workspace]) -> None:
+        self.all_workspaces = workspaces
+        self.workspaces_by_id = {workspace.id: workspace for workspace in workspaces}
+
+    def add_workspaces(self, workspaces: typing.List[Workspace]) -> None:
+        self.all_workspaces.extend(workspaces)
+        self.workspaces_by_id.update(
+            (workspace.id, workspace) for workspace in workspaces
+        )
+
+    def set_enabled_workspaces(self, workspaces_ids: typing.List[int]) -> None:
+        self.enabled_workspaces = workspaces_ids
+        self.enabled_workspaces_ids = set(workspaces_ids)
+
+    def is_enabled(self, workspace_id: int) -> bool:
+        return workspace_id in self.enabled_workspaces_ids
+
+    def workspace(self, workspace_id: int) -> typing.Optional[Workspace]:
+        return self.workspaces_by_id.get(workspace_id)
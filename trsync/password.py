@@ -0,0 +1,209 @@
+import json
+import threading
+import typing
+
+from trsync.error import FailToGetPassword, FailToSetPassword
+from trsync.session import SessionPool, sessions
+from trsync.trace import tracer
+
+if typing.TYPE_CHECKING:
+    import requests
+
+# Password setter response status codes meaning batch endpoints are unknown
+BATCH_UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+
+class PasswordSetter:
+    def __init__(
+        self,
+        port: int,
+        token: typing.Optional[str],
+        session_pool: typing.Optional[SessionPool] = None,
+    ) -> None:
+        self._port = port
+        self._token = token
+        self._session_pool = session_pool or sessions
+        # None until first batch request told if batch endpoints exist
+        self._supports_batch: typing.Optional[bool] = None
+        # Passwords known to be stored by password setter
+        self._known: typing.Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._port}"
+
+    def get_password(self, instance_name: str) -> str:
+        try:
+            with tracer.span("password_setter.get_password", instance_name) as span:
+                response = self._session().get(
+                    f"{self.url()}/password/{instance_name}",
+                    headers={"X-Auth-Token": self._token},
+                )
+                span.set(status_code=response.status_code, size=len(response.content))
+        except Exception as exc:
+            raise FailToGetPassword(str(exc))
+        return self._read_password(
+            instance_name, response.status_code, response.content
+        )
+
+    def set_password(self, instance_name: str, password: str) -> None:
+        try:
+            with tracer.span("password_setter.post_password", instance_name) as span:
+                response = self._session().post(
+                    f"{self.url()}/password/{instance_name}",
+                    data=password,
+                    headers={"X-Auth-Token": self._token},
+                )
+                span.set(status_code=response.status_code, size=len(response.content))
+        except Exception as exc:
+            raise FailToSetPassword(str(exc))
+        self._read_set_password(instance_name, password, response.status_code)
+
+    def get_passwords(
+        self, instance_names: typing.List[str]
+    ) -> typing.Dict[str, typing.Union[str, FailToGetPassword]]:
+        if not instance_names:
+            return {}
+
+        if self._supports_batch is not False:
+            try:
+                with tracer.span("password_setter.get_passwords") as span:
+                    response = self._session().get(
+                        f"{self.url()}/passwords",
+                        params={"instances": ",".join(instance_names)},
+                        headers={"X-Auth-Token": self._token},
+                    )
+                    span.set(status_code=response.status_code, size=len(response.content))
+            except Exception as exc:
+                error = FailToGetPassword(str(exc))
+                return {instance_name: error for instance_name in instance_names}
+
+            batch_results = self._read_passwords(
+                instance_names, response.status_code, response.content
+            )
+            if batch_results is not None:
+                return batch_results
+
+        results: typing.Dict[str, typing.Union[str, FailToGetPassword]] = {}
+        for instance_name in instance_names:
+            try:
+                results[instance_name] = self.get_password(instance_name)
+            except FailToGetPassword as exc:
+                results[instance_name] = exc
+        return results
+
+    def set_passwords(
+        self, passwords: typing.Dict[str, str]
+    ) -> typing.Dict[str, FailToSetPassword]:
+        # Only new or changed passwords are sent, failures are returned
+        changed = self._changed(passwords)
+        if not changed:
+            return {}
+
+        if self._supports_batch is not False:
+            try:
+                with tracer.span("password_setter.post_passwords") as span:
+                    response = self._session().post(
+                        f"{self.url()}/passwords",
+                        json=changed,
+                        headers={"X-Auth-Token": self._token},
+                    )
+                    span.set(status_code=response.status_code, size=len(response.content))
+            except Exception as exc:
+                error = FailToSetPassword(str(exc))
+                return {instance_name: error for instance_name in changed}
+
+            batch_failures = self._read_set_passwords(changed, response.status_code)
+            if batch_failures is not None:
+                return batch_failures
+
+        failures: typing.Dict[str, FailToSetPassword] = {}
+        for instance_name, password in changed.items():
+            try:
+                self.set_password(instance_name, password)
+            except FailToSetPassword as exc:
+                failures[instance_name] = exc
+        return failures
+
+    def _read_password(
+        self, instance_name: str, status_code: int, content: bytes
+    ) -> str:
+        # Responses are read by _read_* methods, shared with asyncio password
+        # setter which only sends requests
+        if status_code != 200:
+            raise FailToGetPassword(f"Unexpected response status code '{status_code}'")
+        password = content.decode()
+        self._remember({instance_name: password})
+        return password
+
+    def _read_set_password(
+        self, instance_name: str, password: str, status_code: int
+    ) -> None:
+        if status_code != 201:
+            raise FailToSetPassword(f"Unexpected response status code '{status_code}'")
+        self._remember({instance_name: password})
+
+    def _read_passwords(
+        self, instance_names: typing.List[str], status_code: int, content: bytes
+    ) -> typing.Optional[typing.Dict[str, typing.Union[str, FailToGetPassword]]]:
+        # None when batch endpoints are unknown, instance calls must be used
+        if status_code == 200:
+            self._supports_batch = True
+            try:
+                passwords = json.loads(content)
+            except ValueError as exc:
+                error = FailToGetPassword(f"Invalid response : {exc}")
+                return {instance_name: error for instance_name in instance_names}
+
+            self._remember(passwords)
+            return {
+                instance_name: passwords.get(
+                    instance_name,
+                    FailToGetPassword("Password unknown by password setter"),
+                )
+                for instance_name in instance_names
+            }
+
+        if status_code not in BATCH_UNSUPPORTED_STATUS_CODES:
+            error = FailToGetPassword(
+                f"Unexpected response status code '{status_code}'"
+            )
+            return {instance_name: error for instance_name in instance_names}
+        self._fallback()
+        return None
+
+    def _read_set_passwords(
+        self, changed: typing.Dict[str, str], status_code: int
+    ) -> typing.Optional[typing.Dict[str, FailToSetPassword]]:
+        if status_code == 201:
+            self._supports_batch = True
+            self._remember(changed)
+            return {}
+
+        if status_code not in BATCH_UNSUPPORTED_STATUS_CODES:
+            error = FailToSetPassword(
+                f"Unexpected response status code '{status_code}'"
+            )
+            return {instance_name: error for instance_name in changed}
+        self._fallback()
+        return None
+
+    def _fallback(self) -> None:
+        print("Password setter does not support batch, fallback on instance calls")
+        self._supports_batch = False
+
+    def _changed(self, passwords: typing.Dict[str, str]) -> typing.Dict[str, str]:
+        with self._lock:
+            return {
+                instance_name: password
+                for instance_name, password in passwords.items()
+                if self._known.get(instance_name) != password
+            }
+
+    def _remember(self, passwords: typing.Dict[str, str]) -> None:
+        with self._lock:
+            self._known.update(passwords)
+
+    def _session(self) -> "requests.Session":
+        return self._session_pool.get(self.url())
+
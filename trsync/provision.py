@@ -0,0 +1,253 @@
+import asyncio
+import dataclasses
+import json
+import pathlib
+import typing
+
+from trsync.aio import AsyncClient, AsyncHttp, AsyncPasswordSetter
+from trsync.config import (
+    ConfigWriter,
+    config_paths,
+    read_instance,
+    read_instance_names,
+    serialize_config,
+    update_config,
+)
+from trsync.error import AuthenticationError, CommunicationError
+from trsync.journal import Journal
+from trsync.model import Instance, Workspace, fold_workspace_name
+from trsync.store import open_store
+from trsync.trace import tracer
+
+# Maximum count of instances validated at the same time
+PROVISION_CONCURRENCY = 32
+
+# Manifest example :
+#
+# {
+#     "local_folder": "/home/user/Tracim",
+#     "prevent_delete_sync": true,
+#     "instances": [
+#         {
+#             "address": "tracim.example.com",
+#             "username": "user",
+#             "password": "secret",
+#             "unsecure": false,
+#             "workspaces": ["My space", 42]
+#         }
+#     ]
+# }
+#
+# Workspaces are given by name or id, "*" enable all user workspaces.
+
+
+class ProvisionError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class ManifestInstance:
+    instance: Instance
+    workspaces: typing.List[typing.Union[str, int]]
+
+
+def read_manifest(
+    manifest_path: pathlib.Path,
+) -> typing.Tuple[typing.Dict[str, typing.Any], typing.List[ManifestInstance]]:
+    try:
+        with manifest_path.open("rb") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError) as exc:
+        raise ProvisionError(f"Unable to read manifest {manifest_path} : {exc}")
+
+    try:
+        instances = [
+            ManifestInstance(
+                instance=Instance(
+                    address=raw["address"],
+                    username=raw["username"],
+                    password=raw["password"],
+                    unsecure=bool(raw.get("unsecure", False)),
+                    all_workspaces=[],
+                    enabled_workspaces=[],
+                ),
+                workspaces=raw.get("workspaces", []),
+            )
+            for raw in manifest.get("instances", [])
+        ]
+    except (KeyError, TypeError, AttributeError) as exc:
+        raise ProvisionError(f"Invalid manifest instance : {exc!r}")
+
+    return manifest, instances
+
+
+def resolve_workspaces(
+    workspaces: typing.List[Workspace],
+    wanted: typing.List[typing.Union[str, int]],
+) -> typing.List[int]:
+    if wanted == "*" or wanted == ["*"]:
+        return [workspace.id for workspace in workspaces]
+
+    by_id = {workspace.id: workspace for workspace in workspaces}
+    by_name: typing.Dict[str, typing.List[Workspace]] = {}
+    by_folded_name: typing.Dict[str, typing.List[Workspace]] = {}
+    for workspace in workspaces:
+        by_name.setdefault(workspace.name, []).append(workspace)
+        by_folded_name.setdefault(fold_workspace_name(workspace.name), []).append(workspace)
+
+    workspaces_ids = []
+    for value in wanted:
+        if isinstance(value, int):
+            if value not in by_id:
+                raise ProvisionError(f"Unknown workspace id {value}")
+            workspaces_ids.append(value)
+            continue
+
+        # Exact name first, then case and accents insensitive name
+        matches = by_name.get(value) or by_folded_name.get(fold_workspace_name(value), [])
+        if not matches:
+            raise ProvisionError(f"Unknown workspace '{value}'")
+        if len(matches) > 1:
+            raise ProvisionError(
+                f"Ambiguous workspace '{value}', use one of ids "
+                + ", ".join(str(workspace.id) for workspace in matches)
+            )
+        workspaces_ids.append(matches[0].id)
+
+    return workspaces_ids
+
+
+async def _validate_instance(
+    http: AsyncHttp,
+    semaphore: asyncio.Semaphore,
+    manifest_instance: ManifestInstance,
+) -> None:
+    instance = manifest_instance.instance
+    async with semaphore:
+        try:
+            workspaces = await AsyncClient(instance, http).get_workspaces()
+        except AuthenticationError:
+            raise ProvisionError(f"{instance.address} : authentication failed")
+        except CommunicationError as exc:
+            raise ProvisionError(f"{instance.address} : communication error ({exc})")
+
+    instance.set_all_workspaces(workspaces)
+    try:
+        instance.set_enabled_workspaces(
+            resolve_workspaces(workspaces, manifest_instance.workspaces)
+        )
+    except ProvisionError as exc:
+        raise ProvisionError(f"{instance.address} : {exc}")
+
+
+async def _provision(
+    manifest_instances: typing.List[ManifestInstance],
+    password_setter_port: typing.Optional[int],
+    password_setter_token: typing.Optional[str],
+) -> typing.List[str]:
+    http = AsyncHttp()
+    try:
+        semaphore = asyncio.Semaphore(PROVISION_CONCURRENCY)
+        results = await asyncio.gather(
+            *(
+                _validate_instance(http, semaphore, manifest_instance)
+                for manifest_instance in manifest_instances
+            ),
+            return_exceptions=True,
+        )
+        errors = []
+        for result in results:
+            if isinstance(result, ProvisionError):
+                errors.append(str(result))
+            elif isinstance(result, BaseException):
+                raise result
+        if errors or password_setter_port is None:
+            return errors
+
+        password_setter = AsyncPasswordSetter(
+            password_setter_port, password_setter_token, http
+        )
+        failures = await password_setter.set_passwords_async(
+            {
+                manifest_instance.instance.address: manifest_instance.instance.password
+                for manifest_instance in manifest_instances
+            }
+        )
+        return [
+            f"{address} : unable to store password ({exc})"
+            for address, exc in failures.items()
+        ]
+    finally:
+        http.close()
+
+
+def provision(
+    manifest_path: pathlib.Path,
+    password_setter_port: typing.Optional[int] = None,
+    password_setter_token: typing.Optional[str] = None,
+) -> int:
+    config_file_path, config_track_file_path, _, journal_file_path = config_paths()
+    try:
+        manifest, manifest_instances = read_manifest(manifest_path)
+    except ProvisionError as exc:
+        print(exc)
+        return 1
+
+    config_store = open_store(config_file_path)
+    with tracer.span("config.read"):
+        config = config_store.load()
+    local_folder = manifest.get("local_folder") or config.get(
+        "server", "local_folder", fallback=""
+    )
+    if not local_folder:
+        print("Manifest must give a local_folder")
+        return 1
+
+    print(f"Validate {len(manifest_instances)} instance(s)")
+    errors = asyncio.run(
+        _provision(manifest_instances, password_setter_port, password_setter_token)
+    )
+    if errors:
+        for error in errors:
+            print(error)
+        print("Config not written")
+        return 1
+
+    # Instances already configured and not in manifest are kept
+    instances = {
+        instance_name: read_instance(config, instance_name)
+        for instance_name in read_instance_names(config)
+    }
+    for manifest_instance in manifest_instances:
+        instances[manifest_instance.instance.address] = manifest_instance.instance
+
+    update_config(
+        config,
+        list(instances.values()),
+        local_folder,
+        raw_passwords=password_setter_port is None,
+    )
+    if "prevent_delete_sync" in manifest:
+        config.set(
+            "server",
+            "prevent_delete_sync",
+            str(int(bool(manifest["prevent_delete_sync"]))),
+        )
+
+    config_writer = ConfigWriter(
+        config_store, config_track_file_path, journal=Journal(journal_file_path)
+    )
+    # Passwords given by manifest may have changed
+    config_writer.submit(
+        serialize_config(config),
+        credentials_changed=[
+            manifest_instance.instance.address
+            for manifest_instance in manifest_instances
+        ],
+    )
+    config_writer.flush()
+    if config_writer.pending:
+        print("Config not written")
+        return 1
+    print(f"{len(manifest_instances)} instance(s) provisioned")
+    return 0
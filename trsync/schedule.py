@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import typing
+
+if typing.TYPE_CHECKING:
+    from trsync.aio import LoopPump
+
+Owner = typing.Hashable
+Priority = typing.Union[int, typing.Callable[[], int]]
+
+# Jobs priorities, lowest first : jobs of shown tab, of other tabs, then
+# background refreshes
+PRIORITY_SHOWN_TAB = 0
+PRIORITY_TAB = 1
+PRIORITY_BACKGROUND = 2
+# Maximum count of jobs running at same time, in total and by host
+MAX_JOBS = 32
+MAX_HOST_JOBS = 6
+
+
+class _Waiter:
+    def __init__(
+        self, host: typing.Optional[str], priority: Priority, order: int
+    ) -> None:
+        self.host = host
+        self.priority = priority
+        self.order = order
+        self.granted = asyncio.get_running_loop().create_future()
+
+    def sort_key(self) -> typing.Tuple[int, int]:
+        # Priority is given by a callable when it can change while waiting
+        # (ex. user shows another tab)
+        priority = self.priority() if callable(self.priority) else self.priority
+        return priority, self.order
+
+
+class Scheduler:
+    # Run network jobs as asyncio tasks, started by priority order when they
+    # can run without exceeding concurrency limits. Jobs of an owner (ex. an
+    # instance or a tab) can be cancelled together.
+    def __init__(
+        self,
+        loop_pump: "LoopPump",
+        max_jobs: int = MAX_JOBS,
+        max_host_jobs: int = MAX_HOST_JOBS,
+    ) -> None:
+        self._loop_pump = loop_pump
+        self._max_jobs = max_jobs
+        self._max_host_jobs = max_host_jobs
+        self._order = itertools.count()
+        self._waiters: typing.List[_Waiter] = []
+        self._running = 0
+        self._running_by_host: typing.Dict[str, int] = {}
+        self._tasks_by_owner: typing.Dict[Owner, typing.Set[asyncio.Task]] = {}
+
+    def submit(
+        self,
+        coroutine: typing.Coroutine,
+        host: typing.Optional[str] = None,
+        priority: Priority = PRIORITY_BACKGROUND,
+        owner: typing.Optional[Owner] = None,
+    ) -> asyncio.Task:
+        task = self._loop_pump.submit(self._run(coroutine, host, priority))
+        # Coroutine is never started if task is cancelled while waiting
+        task.add_done_callback(lambda task: coroutine.close())
+        if owner is not None:
+            self._tasks_by_owner.setdefault(owner, set()).add(task)
+            task.add_done_callback(
+                lambda task: self._forget_task(owner, task)  # type: ignore
+            )
+        return task
+
+    def cancel(self, owner: Owner) -> None:
+        for task in self._tasks_by_owner.pop(owner, ()):
+            task.cancel()
+
+    async def _run(
+        self,
+        coroutine: typing.Coroutine,
+        host: typing.Optional[str],
+        priority: Priority,
+    ) -> typing.Any:
+        waiter = _Waiter(host, priority, next(self._order))
+        self._waiters.append(waiter)
+        self._grant()
+        try:
+            await waiter.granted
+        except asyncio.CancelledError:
+            if waiter.granted.done() and not waiter.granted.cancelled():
+                # Granted then cancelled before running
+                self._release(host)
+            elif waiter in self._waiters:
+                # Else dropped by _grant meanwhile
+                self._waiters.remove(waiter)
+            raise
+
+        try:
+            return await coroutine
+        finally:
+            self._release(host)
+
+    def _grant(self) -> None:
+        if self._running >= self._max_jobs or not self._waiters:
+            return
+        for waiter in sorted(self._waiters, key=_Waiter.sort_key):
+            if waiter.granted.done():
+                # Cancelled waiter, its task did not run its cleanup yet
+                self._waiters.remove(waiter)
+                continue
+            if self._running >= self._max_jobs:
+                break
+            if (
+                waiter.host is not None
+                and self._running_by_host.get(waiter.host, 0) >= self._max_host_jobs
+            ):
+                continue
+            self._waiters.remove(waiter)
+            self._running += 1
+            if waiter.host is not None:
+                self._running_by_host[waiter.host] = (
+                    self._running_by_host.get(waiter.host, 0) + 1
+                )
+            waiter.granted.set_result(None)
+
+    def _release(self, host: typing.Optional[str]) -> None:
+        self._running -= 1
+        if host is not None:
+            if (count := self._running_by_host[host] - 1) > 0:
+                self._running_by_host[host] = count
+            else:
+                del self._running_by_host[host]
+        self._grant()
+
+    def _forget_task(self, owner: Owner, task: asyncio.Task) -> None:
+        if (tasks := self._tasks_by_owner.get(owner)) is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks_by_owner[owner]
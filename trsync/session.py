@@ -0,0 +1,81 @@
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    import requests
+
+
+# Maximum count of kept sessions (one by instance host)
+MAX_SESSIONS = 64
+# Maximum count of kept-alive connections by session
+MAX_CONNECTIONS = 4
+# Sessions unused since this count of seconds are closed
+IDLE_TIMEOUT = 120.0
+
+
+class SessionPool:
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        max_connections: int = MAX_CONNECTIONS,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ) -> None:
+        self._max_sessions = max_sessions
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Ordered from least to most recently used
+        self._sessions: typing.Dict[str, typing.Tuple["requests.Session", float]] = {}
+        self._closed = False
+
+    def get(self, key: str) -> "requests.Session":
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+
+            try:
+                session, _ = self._sessions.pop(key)
+            except KeyError:
+                session = self._build_session()
+                if len(self._sessions) >= self._max_sessions:
+                    oldest_key = next(iter(self._sessions))
+                    self._sessions.pop(oldest_key)[0].close()
+
+            if not self._closed:
+                self._sessions[key] = (session, now)
+            return session
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _build_session(self) -> "requests.Session":
+        # Imported at first network call to speed up startup
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self._max_connections,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _evict(self, now: float) -> None:
+        for key, (session, last_used) in list(self._sessions.items()):
+            if now - last_used < self._idle_timeout:
+                # Next ones have been used more recently
+                break
+            print(f"Close idle session '{key}'")
+            session.close()
+            del self._sessions[key]
+
+
+# Sessions shared by all clients of the process
+sessions = SessionPool()
@@ -0,0 +1,100 @@
+import dataclasses
+import json
+import pathlib
+import time
+import typing
+
+from trsync.config import write_atomic
+from trsync.model import Workspace
+from trsync.trace import tracer
+
+if typing.TYPE_CHECKING:
+    from trsync.model import Instance
+
+
+# Version 2 added username, user_id is only valid for it
+SNAPSHOT_VERSION = 2
+
+
+@dataclasses.dataclass
+class SnapshotEntry:
+    username: str
+    user_id: typing.Optional[int]
+    saved_at: float
+    workspaces: typing.List[Workspace]
+
+
+def load_snapshot(path: pathlib.Path) -> typing.Dict[str, SnapshotEntry]:
+    try:
+        with tracer.span("snapshot.load") as span, path.open("rb") as snapshot_file:
+            content = snapshot_file.read()
+            span.set(size=len(content))
+            data = json.loads(content)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        print(f"Ignore unreadable snapshot {path}: ", exc)
+        return {}
+
+    if data.get("version") != SNAPSHOT_VERSION:
+        print(f"Ignore snapshot {path} with unknown version")
+        return {}
+
+    # Workspaces are stored as columns (ids and names) to keep the file small
+    # and fast to parse with thousands of workspaces
+    return {
+        address: SnapshotEntry(
+            username=raw["username"],
+            user_id=raw["user_id"],
+            saved_at=raw["saved_at"],
+            workspaces=[
+                Workspace(id=workspace_id, name=workspace_name)
+                for workspace_id, workspace_name in zip(raw["ids"], raw["names"])
+            ],
+        )
+        for address, raw in data.get("instances", {}).items()
+    }
+
+
+def snapshot_entries(
+    instances: typing.Iterable["Instance"],
+) -> typing.Dict[str, SnapshotEntry]:
+    # Copied state, so it can be written by another thread while instances
+    # keep changing
+    now = time.time()
+    return {
+        instance.address: SnapshotEntry(
+            username=instance.username,
+            user_id=instance.user_id,
+            saved_at=now,
+            workspaces=list(instance.all_workspaces),
+        )
+        for instance in instances
+    }
+
+
+def save_snapshot(
+    path: pathlib.Path,
+    entries: typing.Dict[str, SnapshotEntry],
+) -> None:
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "instances": {
+            address: {
+                "username": entry.username,
+                "user_id": entry.user_id,
+                "saved_at": entry.saved_at,
+                "ids": [workspace.id for workspace in entry.workspaces],
+                "names": [workspace.name for workspace in entry.workspaces],
+            }
+            for address, entry in entries.items()
+        },
+    }
+
+    try:
+        with tracer.span("snapshot.save") as span:
+            content = json.dumps(data, separators=(",", ":"))
+            span.set(size=len(content))
+            write_atomic(path, content, sync=False)
+    except OSError as exc:
+        print(f"Fail to save snapshot into {path}: ", exc)
@@ -0,0 +1,349 @@
+import abc
+import configparser
+import contextlib
+import itertools
+import operator
+import os
+import pathlib
+import sqlite3
+import typing
+
+from trsync.config import (
+    Sections,
+    changed_sections,
+    file_lock,
+    section_options,
+    serialize_config,
+    write_atomic,
+)
+
+# Seconds waited for other writers before failing to write database
+BUSY_TIMEOUT = 10.0
+# Suffix of database file name, added to config file name
+DATABASE_SUFFIX = ".db"
+# Suffix added to the file name of a store replaced by migration
+MIGRATED_SUFFIX = ".migrated"
+WORKSPACES_IDS_KEY = "workspaces_ids"
+
+# Config is kept as INI sections. In database, options of a section are rows,
+# except workspaces ids which are rows of their own table, so enabling one
+# workspace is one row insert. Options and workspaces keep their order to be
+# exported as they were written.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS section (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS option (
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    -- NULL for workspaces ids, which are in workspace table
+    value TEXT,
+    PRIMARY KEY (section, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workspace (
+    section TEXT NOT NULL,
+    workspace_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (section, workspace_id)
+) WITHOUT ROWID;
+"""
+
+
+class ConfigStore(abc.ABC):
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+
+    @abc.abstractmethod
+    def read(self) -> str:
+        # Config as INI content, raise OSError if it can't be read
+        pass
+
+    @abc.abstractmethod
+    def write(
+        self,
+        old_content: typing.Optional[str],
+        content: str,
+        sections: typing.Optional[Sections] = None,
+    ) -> None:
+        # Store content, old_content being the one it was made from. Sections
+        # changed since old content are given when known by caller.
+        pass
+
+    def load(self) -> configparser.ConfigParser:
+        config = configparser.ConfigParser()
+        try:
+            config.read_string(self.read())
+        except FileNotFoundError:
+            pass
+        return config
+
+
+class IniConfigStore(ConfigStore):
+    def read(self) -> str:
+        return self.path.read_text()
+
+    def write(
+        self,
+        old_content: typing.Optional[str],
+        content: str,
+        sections: typing.Optional[Sections] = None,
+    ) -> None:
+        write_atomic(self.path, content)
+
+
+class SqliteConfigStore(ConfigStore):
+    # Only sections changed since old content are written, in one transaction,
+    # so concurrent writers changing other instances do not overwrite each
+    # other. Trsync manager reads INI file, so whole config is also exported
+    # into export_path after each write.
+    def __init__(
+        self, path: pathlib.Path, export_path: typing.Optional[pathlib.Path] = None
+    ) -> None:
+        super().__init__(path)
+        self.export_path = export_path
+        # Database revision (counted by user_version) made by last write, if
+        # it is still current then database content is last written one
+        self._revision: typing.Optional[int] = None
+
+    def read(self) -> str:
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+        return serialize_config(self.load())
+
+    def load(self) -> configparser.ConfigParser:
+        if not self.path.exists():
+            return configparser.ConfigParser()
+        with self._connect() as connection:
+            return self._load(connection)
+
+    def write(
+        self,
+        old_content: typing.Optional[str],
+        content: str,
+        sections: typing.Optional[Sections] = None,
+    ) -> None:
+        if old_content is None or sections is None:
+            new = configparser.ConfigParser()
+            new.read_string(content)
+            old = configparser.ConfigParser()
+            old.read_string(old_content or "")
+            changed = changed_sections(old, new)
+            new_sections = section_options(new)
+            # New sections are added in config order
+            sections = {
+                name: new_sections.get(name)
+                for name in [name for name in new_sections if name in changed]
+                + sorted(changed - set(new_sections))
+            }
+
+        with self._connect() as connection:
+            # Take write lock now, to read and write same database state
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                revision = self._get_revision(connection)
+                if old_content is None:
+                    connection.execute("DELETE FROM section")
+                    connection.execute("DELETE FROM option")
+                    connection.execute("DELETE FROM workspace")
+                for section_name, options in sections.items():
+                    self._write_section(connection, section_name, options)
+                connection.execute(f"PRAGMA user_version = {revision + 1}")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        # Without other writer since last write, database content is the
+        # written one, so it is exported without being read again
+        own = old_content is None or revision == self._revision
+        self._revision = revision + 1
+        if self.export_path is not None:
+            self._export(content if own else None, revision + 1)
+
+    def _export(self, content: typing.Optional[str], revision: int) -> None:
+        # Done after commit, not to hold database write lock meanwhile. Export
+        # of a writer followed by another one is skipped, last one exports.
+        assert self.export_path is not None
+        with file_lock(self.export_path):
+            with self._connect() as connection:
+                if self._get_revision(connection) != revision:
+                    return
+                if content is None:
+                    content = serialize_config(self._load(connection))
+            write_atomic(self.export_path, content)
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.Iterator[sqlite3.Connection]:
+        # Transactions are explicitly started and ended. Database errors are
+        # raised as OSError, like INI file ones.
+        try:
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            try:
+                connection.executescript(SCHEMA)
+                yield connection
+            finally:
+                connection.close()
+        except sqlite3.Error as exc:
+            raise OSError(f"Database {self.path} error: {exc}") from exc
+
+    @staticmethod
+    def _get_revision(connection: sqlite3.Connection) -> int:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+    @staticmethod
+    def _load(connection: sqlite3.Connection) -> configparser.ConfigParser:
+        section_names = [
+            name
+            for (name,) in connection.execute(
+                "SELECT name FROM section ORDER BY position"
+            )
+        ]
+        options = connection.execute(
+            "SELECT section, key, value FROM option ORDER BY section, position"
+        ).fetchall()
+        workspaces = {
+            section_name: ",".join(str(workspace_id) for _, workspace_id in rows)
+            for section_name, rows in itertools.groupby(
+                connection.execute(
+                    "SELECT section, workspace_id FROM workspace "
+                    "ORDER BY section, position"
+                ),
+                key=operator.itemgetter(0),
+            )
+        }
+
+        config = configparser.ConfigParser()
+        config.read_dict({name: {} for name in section_names})
+        for section_name, key, value in options:
+            if value is None:
+                value = workspaces.get(section_name, "")
+            config.set(section_name, key, value)
+        return config
+
+    @staticmethod
+    def _write_section(
+        connection: sqlite3.Connection,
+        section_name: str,
+        options: typing.Optional[typing.Dict[str, str]],
+    ) -> None:
+        if options is None:
+            for table in ("section", "option", "workspace"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE "
+                    f"{'name' if table == 'section' else 'section'} = ?",
+                    (section_name,),
+                )
+            return
+
+        connection.execute(
+            "INSERT OR IGNORE INTO section (name, position) "
+            "SELECT ?, COALESCE(MAX(position) + 1, 0) FROM section",
+            (section_name,),
+        )
+        connection.execute(
+            f"DELETE FROM option WHERE section = ? AND key NOT IN "
+            f"({','.join('?' * len(options))})",
+            (section_name, *options.keys()),
+        )
+        connection.executemany(
+            "INSERT INTO option (section, key, position, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (section, key) DO UPDATE SET "
+            "position = excluded.position, value = excluded.value",
+            [
+                (
+                    section_name,
+                    key,
+                    position,
+                    value if key != WORKSPACES_IDS_KEY else None,
+                )
+                for position, (key, value) in enumerate(options.items())
+            ],
+        )
+
+        workspaces_ids = list(
+            dict.fromkeys(
+                int(workspace_id)
+                for workspace_id in options.get(WORKSPACES_IDS_KEY, "").split(",")
+                if workspace_id.strip()
+            )
+        )
+        known_ids = dict(
+            connection.execute(
+                "SELECT workspace_id, position FROM workspace WHERE section = ?",
+                (section_name,),
+            ).fetchall()
+        )
+        # Only changed workspaces rows are written
+        connection.executemany(
+            "DELETE FROM workspace WHERE section = ? AND workspace_id = ?",
+            [
+                (section_name, workspace_id)
+                for workspace_id in set(known_ids) - set(workspaces_ids)
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO workspace (section, workspace_id, position) VALUES (?, ?, ?) "
+            "ON CONFLICT (section, workspace_id) DO UPDATE SET "
+            "position = excluded.position",
+            [
+                (section_name, workspace_id, position)
+                for position, workspace_id in enumerate(workspaces_ids)
+                if known_ids.get(workspace_id) != position
+            ],
+        )
+
+
+def database_path(config_file_path: pathlib.Path) -> pathlib.Path:
+    return config_file_path.with_name(config_file_path.name + DATABASE_SUFFIX)
+
+
+def open_store(config_file_path: pathlib.Path) -> ConfigStore:
+    # Database is used once config has been migrated into it
+    if (path := database_path(config_file_path)).exists():
+        return SqliteConfigStore(path, export_path=config_file_path)
+    return IniConfigStore(config_file_path)
+
+
+def migrate_store(config_file_path: pathlib.Path, backend: str) -> int:
+    # Copy config into given backend ("ini" or "sqlite"). A replaced database
+    # is renamed to not be used anymore, INI file is kept as database export.
+    source = open_store(config_file_path)
+    if backend == "sqlite":
+        destination: ConfigStore = SqliteConfigStore(
+            database_path(config_file_path), export_path=config_file_path
+        )
+    else:
+        destination = IniConfigStore(config_file_path)
+    if type(source) is type(destination):
+        print(f"Config is already stored in {source.path}")
+        return 0
+
+    try:
+        content = source.read()
+    except FileNotFoundError:
+        content = ""
+    destination.write(None, content)
+    migrated_path = source.path.with_name(source.path.name + MIGRATED_SUFFIX)
+    if isinstance(source, SqliteConfigStore) and source.path.exists():
+        os.replace(source.path, migrated_path)
+        print(f"Previous config moved to {migrated_path}")
+    print(f"Config migrated into {destination.path}")
+    if isinstance(destination, SqliteConfigStore):
+        print(f"Config is also written into {config_file_path} for trsync manager")
+    return 0
+
+
+def export_store(config_file_path: pathlib.Path, path: pathlib.Path) -> int:
+    # Write config as INI file (ex. for a manager reading INI config)
+    try:
+        content = open_store(config_file_path).read()
+    except OSError as exc:
+        print("Fail to read config: ", exc)
+        return 1
+    write_atomic(path, content)
+    print(f"Config exported into {path}")
+    return 0
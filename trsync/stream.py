@@ -0,0 +1,74 @@
+import codecs
+import json
+import typing
+
+# Characters which can follow a number in an array
+NUMBER_DELIMITERS = ",] \t\n\r"
+
+# Incrementally parse a JSON array, giving its items as soon as they are
+# entirely received
+class JsonArrayParser:
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, chunk: bytes) -> typing.List[typing.Any]:
+        self._buffer += self._text_decoder.decode(chunk)
+        items = []
+        position = 0
+        buffer = self._buffer
+
+        while not self._finished:
+            position = self._skip_whitespaces(buffer, position)
+            if position >= len(buffer):
+                break
+
+            if not self._started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Expected JSON array, got '{buffer[position]}'")
+                self._started = True
+                position += 1
+                continue
+
+            if buffer[position] == ",":
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                self._finished = True
+                position += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Item is not entirely received yet
+                break
+            # A number is entirely received only once followed by a delimiter,
+            # ex. "2" may be followed by ".5" in next chunk
+            if (
+                isinstance(item, (int, float))
+                and not isinstance(item, bool)
+                and (end >= len(buffer) or buffer[end] not in NUMBER_DELIMITERS)
+            ):
+                break
+            items.append(item)
+            position = end
+
+        self._buffer = buffer[position:]
+        return items
+
+    def close(self) -> None:
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        if not self._finished or self._buffer.strip():
+            raise ValueError("Incomplete or invalid JSON array")
+
+    @staticmethod
+    def _skip_whitespaces(buffer: str, position: int) -> int:
+        while position < len(buffer) and buffer[position] in " \t\n\r":
+            position += 1
+        return position
+
@@ -1,13 +1,18 @@
+import asyncio
+import functools
 import tkinter as tk
 from tkinter import ttk
-from tkinter import messagebox
-from tkinter.filedialog import askdirectory
 import typing
-from trsync.client import Client
+from trsync.aio import AsyncClient
 from trsync.error import AuthenticationError, CommunicationError
 
-from trsync.model import Instance
-from trsync.utils import DoubleLists, normalize_workspace_name
+from trsync.model import Instance, Workspace
+from trsync.schedule import PRIORITY_SHOWN_TAB, PRIORITY_TAB
+from trsync.trace import tracer
+from trsync.utils import DoubleLists
+
+# Milliseconds after which widgets of a tab not shown anymore are freed
+TAB_FREE_DELAY = 2 * 60 * 1000
 
 if typing.TYPE_CHECKING:
     from trsync.app import App
@@ -28,12 +33,6 @@ class ConfigFrame(ttk.Frame):
         self._label.grid(row=0, column=0)
 
         self.choose_folder_label_var = tk.StringVar()
-        if local_folder_path_str := self._app._config.get(
-            "server", "local_folder", fallback=None
-        ):
-            self.choose_folder_label_var.set(f"Dossier local : {local_folder_path_str}")
-        else:
-            self.choose_folder_label_var.set("Veuillez choisir un dossier")
         self._local_folder_label = tk.Label(
             self,
             textvariable=self.choose_folder_label_var,
@@ -56,9 +55,6 @@ class ConfigFrame(ttk.Frame):
         )
         self._label2.grid(row=3, column=0)
         self._prevent_delete_sync_var = tk.IntVar()
-        self._prevent_delete_sync_var.set(
-            int(self._app._config.get("server", "prevent_delete_sync", fallback="1"))
-        )
         self._prevent_delete_sync_cb = tk.Checkbutton(
             self,
             text="",
@@ -68,8 +64,23 @@ class ConfigFrame(ttk.Frame):
             command=self._change_prevent_delete_sync,
         )
         self._prevent_delete_sync_cb.grid(row=4, column=0)
+        self.refresh()
+
+    def refresh(self) -> None:
+        if local_folder_path_str := self._app._config.get(
+            "server", "local_folder", fallback=None
+        ):
+            self.choose_folder_label_var.set(f"Dossier local : {local_folder_path_str}")
+        else:
+            self.choose_folder_label_var.set("Veuillez choisir un dossier")
+        self._prevent_delete_sync_var.set(
+            int(self._app._config.get("server", "prevent_delete_sync", fallback="1"))
+        )
 
     def _choose(self) -> None:
+        # Dialogs are imported when shown to speed up startup
+        from tkinter.filedialog import askdirectory
+
         local_folder_path = askdirectory()
         if local_folder_path:
             self._app._config.set("server", "local_folder", local_folder_path)
@@ -165,9 +176,59 @@ class TabFrame(ttk.Frame):
                 right_label="Espaces synchronisés",
             )
             self._workspace_lists.grid(row=7, column=0, columnspan=2)
-            self._initialize_workspaces()
+            self._apply_workspaces_button = ttk.Button(
+                self,
+                text="Appliquer",
+                command=self._apply_workspaces,
+            )
+            self._apply_workspaces_button.grid(row=8, column=0)
+            self._stale_label = tk.Label(self, text=self._stale_text())
+            self._stale_label.grid(row=9, column=0, columnspan=2)
+            self._display_workspaces()
+
+    def refresh(self) -> None:
+        assert self._instance is not None
+        self._password_val.set(self._instance.password)
+        self._update_stale_marks()
+        self._display_workspaces()
+
+    def reload(self) -> None:
+        # Instance has been modified by another program
+        assert self._instance is not None
+        self._address_val.set(self._instance.address)
+        self._username_val.set(self._instance.username)
+        self._secure_var.set(0 if self._instance.unsecure else 1)
+        self.refresh()
+
+    def destroy(self) -> None:
+        # Results of pending jobs can't be displayed anymore
+        self._app.cancel_jobs(self)
+        super().destroy()
+
+    def receive_workspaces(
+        self, workspaces: typing.List[Workspace], first: bool
+    ) -> None:
+        assert self._instance is not None
+        # Tab may have been deleted while workspaces were downloaded
+        if not self.winfo_exists():
+            return
+        # Lists are updated in place, workspaces not received anymore (or
+        # received before a failure) are removed once fetch ended (see
+        # _display_workspaces)
+        self._add_workspaces(workspaces)
+
+    def _update_stale_marks(self) -> None:
+        assert self._instance is not None
+        self._stale_label.config(text=self._stale_text())
+        self._app._update_tab_text(self._instance)
+
+    def _stale_text(self) -> str:
+        assert self._instance is not None
+        return "* Liste des espaces non à jour" if self._instance.stale else ""
 
     def _validate(self):
+        from tkinter import messagebox
+
         address = self._address_entry.get()
         username = self._username_entry.get()
         password = self._password_entry.get()
@@ -178,42 +239,68 @@ class TabFrame(ttk.Frame):
                 "Informations incomplètes", "Veuillez saisir toute les informations"
             )
 
-        try:
-            Client.check_credentials(
-                Instance(
-                    address=address,
-                    username=username,
-                    password=password,
-                    unsecure=unsecure,
-                    all_workspaces=[],
-                    enabled_workspaces=[],
-                )
-            )
-        except CommunicationError:
-            messagebox.showerror(
-                "Erreur de connection",
-                "Erreur dans l'adresse ou pas de connexion",
-            )
+        instance = Instance(
+            address=address,
+            username=username,
+            password=password,
+            unsecure=unsecure,
+            all_workspaces=[],
+            enabled_workspaces=[],
+        )
+        # Network work is done in background, button is disabled meanwhile
+        self._validate_button.state(["disabled"])
+        self._app.schedule(
+            AsyncClient.check_credentials(instance, self._app._http),
+            on_done=functools.partial(self._on_validated, instance),
+            instance=instance,
+            priority=PRIORITY_TAB if self._instance is not None else PRIORITY_SHOWN_TAB,
+            owner=self,
+        )
+
+    def _on_validated(self, instance: Instance, task: asyncio.Task) -> None:
+        from tkinter import messagebox
+
+        if task.cancelled() or not self.winfo_exists():
             return
-        except AuthenticationError:
-            messagebox.showerror(
-                "Erreur d'authentification",
-                "Erreur dans l'username ou le mot de passe",
-            )
+
+        if (exc := task.exception()) is not None:
+            self._validate_button.state(["!disabled"])
+            if isinstance(exc, CommunicationError):
+                messagebox.showerror(
+                    "Erreur de connection",
+                    "Erreur dans l'adresse ou pas de connexion",
+                )
+            elif isinstance(exc, AuthenticationError):
+                messagebox.showerror(
+                    "Erreur d'authentification",
+                    "Erreur dans l'username ou le mot de passe",
+                )
             return
 
         if self._instance is not None:
             self._app._update_instance(
-                self._instance, address, username, password, unsecure
+                self._instance,
+                instance.address,
+                instance.username,
+                instance.password,
+                instance.unsecure,
             )
             self._initialize_workspaces()
         else:
-            self._app._set_wait_message()
-            self._app._add_instance(address, username, password, unsecure)
+            self._app._add_instance(instance, on_added=self._on_instance_added)
+
+    def _on_instance_added(self, added: bool) -> None:
+        if not self.winfo_exists():
+            return
+        self._validate_button.state(["!disabled"])
+        if added:
             self._address_entry.delete(0, "end")
             self._username_entry.delete(0, "end")
             self._password_entry.delete(0, "end")
-            self._app._destroy_wait_message()
+            self._show_configured()
+
+    def _show_configured(self) -> None:
+        from tkinter import messagebox
 
         messagebox.showinfo(
             "Instance correctement configurée",
@@ -221,6 +308,8 @@ class TabFrame(ttk.Frame):
         )
 
     def _delete(self) -> None:
+        from tkinter import messagebox
+
         if messagebox.askyesno(
             "Suppression", "Voulez-vous vraiment supprimer cet espace ?"
         ):
@@ -228,44 +317,129 @@ class TabFrame(ttk.Frame):
 
     def _apply_workspaces(self):
         assert self._instance is not None
-        synchronize_workspace_names = self._workspace_lists.get_right_values()
-        print(f"Right values are : ", synchronize_workspace_names)
-        print(f"All workspaces are : ", self._instance.all_workspaces)
-
-        synchronize_workspace_ids = []
-        for workspace in self._instance.all_workspaces:
-            print(
-                f"Test '{workspace.name}' ('{normalize_workspace_name(workspace.name)}') "
-            )
-            if normalize_workspace_name(workspace.name) in synchronize_workspace_names:
-                print("append")
-                synchronize_workspace_ids.append(workspace.id)
-
+        synchronize_workspace_ids = list(self._workspace_lists.get_right_ids())
         print(f"Right values ids are : ", synchronize_workspace_ids)
-        self._instance.enabled_workspaces = synchronize_workspace_ids
+        self._instance.set_enabled_workspaces(synchronize_workspace_ids)
         self._app._save_to_config()
 
     def _initialize_workspaces(self) -> None:
         assert self._instance is not None
-        self._workspace_lists.reset()
-        try:
-            user_id = Client.check_credentials(self._instance)
-            workspaces = Client(self._instance, user_id=user_id).get_workspaces()
-            for workspace in workspaces:
-                # FIXME : bug utf8 ? https://bugs.python.org/issue42225
-                workspace_name = normalize_workspace_name(workspace.name)
-                if workspace.id in self._instance.enabled_workspaces:
-                    self._workspace_lists.add_right(workspace_name)
-                else:
-                    self._workspace_lists.add_left(workspace_name)
-
-        except (CommunicationError, AuthenticationError) as exc:
-            # FIXME : display error
-            pass
-
-        self._apply_workspaces_button = ttk.Button(
-            self,
-            text="Appliquer",
-            command=self._apply_workspaces,
+        self._app.schedule(
+            self._app._get_workspaces(self._instance, on_page=self.receive_workspaces),
+            on_done=self._on_workspaces_initialized,
+            instance=self._instance,
+            priority=PRIORITY_TAB,
+            owner=self,
+        )
+
+    def _on_workspaces_initialized(self, task: asyncio.Task) -> None:
+        assert self._instance is not None
+        if task.cancelled() or not self.winfo_exists():
+            return
+
+        self._validate_button.state(["!disabled"])
+        # FIXME : display error
+        if task.exception() is None:
+            self._instance.stale = False
+            self._app._save_snapshot()
+        # Pages received before a failure are dropped, instance kept previous
+        # workspaces
+        self._display_workspaces()
+        self._update_stale_marks()
+        self._show_configured()
+
+    def _add_workspaces(self, workspaces: typing.List[Workspace]) -> None:
+        assert self._instance is not None
+        for workspace in workspaces:
+            # FIXME : bug utf8 ? https://bugs.python.org/issue42225
+            if self._instance.is_enabled(workspace.id):
+                self._workspace_lists.add_right(workspace.id, workspace.normalized_name)
+            else:
+                self._workspace_lists.add_left(workspace.id, workspace.normalized_name)
+
+    def _display_workspaces(self) -> None:
+        assert self._instance is not None
+        self._workspace_lists.update(
+            (
+                workspace.id,
+                workspace.normalized_name,
+                self._instance.is_enabled(workspace.id),
+            )
+            for workspace in self._instance.all_workspaces
         )
-        self._apply_workspaces_button.grid(row=8, column=0)
+
+
+class LazyTabFrame(ttk.Frame):
+    # Placeholder of instance tab, its content is built when tab is shown and
+    # freed once not shown for a while
+    def __init__(self, parent, app: "App", instance: Instance, **kwargs):
+        ttk.Frame.__init__(self, parent, **kwargs)
+        self._app = app
+        self._instance = instance
+        self._content: typing.Optional[TabFrame] = None
+        self._free_after_id: typing.Optional[str] = None
+        self._wait_label: typing.Optional[tk.Label] = None
+        self.shown = False
+
+    def show(self) -> None:
+        self.shown = True
+        if self._free_after_id is not None:
+            self.after_cancel(self._free_after_id)
+            self._free_after_id = None
+        # Built once password is known, its field would be empty and loading
+        # would be refused meanwhile (see password_received)
+        if self._app.password_pending(self._instance):
+            if self._wait_label is None:
+                self._wait_label = tk.Label(
+                    self, text="Récupération du mot de passe ..."
+                )
+                self._wait_label.pack()
+            return
+        if self._wait_label is not None:
+            self._wait_label.destroy()
+            self._wait_label = None
+        if self._content is None:
+            with tracer.span("tab.build", self._instance.address):
+                self._content = TabFrame(self, self._app, self._instance)
+            self._content.pack(expand=True, fill="both")
+        if self._instance.stale and self._instance.password_loaded:
+            self._app._load_instance(self._instance)
+
+    def password_received(self) -> None:
+        if self.shown and self._content is None and self.winfo_exists():
+            self.show()
+
+    def hide(self) -> None:
+        self.shown = False
+        if self._content is not None and self._free_after_id is None:
+            self._free_after_id = self.after(TAB_FREE_DELAY, self._free)
+
+    def refresh(self) -> None:
+        self._app._update_tab_text(self._instance)
+        if self._content is not None:
+            self._content.refresh()
+
+    def reload(self) -> None:
+        self._app._update_tab_text(self._instance)
+        if self._content is not None:
+            self._content.reload()
+
+    def receive_workspaces(
+        self, workspaces: typing.List[Workspace], first: bool
+    ) -> None:
+        # Not built tab will display instance workspaces when shown
+        if self._content is not None and self.winfo_exists():
+            self._content.receive_workspaces(workspaces, first)
+
+    def destroy(self) -> None:
+        if self._free_after_id is not None:
+            self.after_cancel(self._free_after_id)
+            self._free_after_id = None
+        super().destroy()
+
+    def _free(self) -> None:
+        self._free_after_id = None
+        if self._content is not None and not self.shown:
+            print(f"Free tab of instance {self._instance.address}")
+            self._content.destroy()
+            self._content = None
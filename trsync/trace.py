@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import dataclasses
+import heapq
+import json
+import os
+import pathlib
+import threading
+import time
+import typing
+
+# Count of slowest operations kept in memory
+SLOWEST_COUNT = 20
+
+
+@dataclasses.dataclass
+class Span:
+    name: str
+    instance: typing.Optional[str]
+    # Seconds, from time.perf_counter
+    start: float
+    duration: float = 0.0
+    status_code: typing.Optional[int] = None
+    # Bytes received or sent
+    size: typing.Optional[int] = None
+    error: typing.Optional[str] = None
+    # Thread or asyncio task which run the operation
+    lane: str = ""
+
+    def set(
+        self,
+        status_code: typing.Optional[int] = None,
+        size: typing.Optional[int] = None,
+    ) -> None:
+        if status_code is not None:
+            self.status_code = status_code
+        if size is not None:
+            self.size = (self.size or 0) + size
+
+    def count(self, chunks: typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+        for chunk in chunks:
+            self.set(size=len(chunk))
+            yield chunk
+
+    async def count_async(
+        self, chunks: typing.AsyncIterable[bytes]
+    ) -> typing.AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.set(size=len(chunk))
+            yield chunk
+
+
+class Tracer:
+    def __init__(self, slowest_count: int = SLOWEST_COUNT) -> None:
+        self._slowest_count = slowest_count
+        self._lock = threading.Lock()
+        self._listeners: typing.List[typing.Callable[[Span], None]] = []
+        # Min heap on duration, so fastest of kept spans is replaced first
+        self._slowest: typing.List[typing.Tuple[float, int, Span]] = []
+        self._counter = 0
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, instance: typing.Optional[str] = None
+    ) -> typing.Iterator[Span]:
+        span = self.start(name, instance)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            self.finish(span)
+
+    def start(self, name: str, instance: typing.Optional[str] = None) -> Span:
+        # For operations ending in another callback, see span for others
+        return Span(name=name, instance=instance, start=time.perf_counter())
+
+    def finish(self, span: Span) -> None:
+        span.duration = time.perf_counter() - span.start
+        span.lane = _lane()
+        self._record(span)
+
+    def add_listener(self, listener: typing.Callable[[Span], None]) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: typing.Callable[[Span], None]) -> None:
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def slowest(self) -> typing.List[Span]:
+        with self._lock:
+            return [span for _, _, span in sorted(self._slowest, reverse=True)]
+
+    def summary(self) -> str:
+        lines = ["Slowest operations :"]
+        for span in self.slowest():
+            details = [
+                f"{key}={value}"
+                for key, value in (
+                    ("instance", span.instance),
+                    ("status", span.status_code),
+                    ("size", span.size),
+                    ("error", span.error),
+                )
+                if value is not None
+            ]
+            lines.append(
+                " ".join([f"{span.duration * 1000:10.1f}ms", span.name, *details])
+            )
+        return "\n".join(lines)
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self._counter += 1
+            item = (span.duration, self._counter, span)
+            if len(self._slowest) < self._slowest_count:
+                heapq.heappush(self._slowest, item)
+            elif span.duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener(span)
+
+
+class ChromeTraceWriter:
+    # Collect spans as Chrome trace events (chrome://tracing, Perfetto)
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._events: typing.List[typing.Dict[str, typing.Any]] = []
+        self._lanes: typing.Dict[str, int] = {}
+
+    def add(self, span: Span) -> None:
+        args = {
+            key: value
+            for key, value in (
+                ("instance", span.instance),
+                ("status_code", span.status_code),
+                ("size", span.size),
+                ("error", span.error),
+            )
+            if value is not None
+        }
+        with self._lock:
+            if (lane_id := self._lanes.get(span.lane)) is None:
+                lane_id = self._lanes[span.lane] = len(self._lanes) + 1
+            self._events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": span.start * 1_000_000,
+                    "dur": span.duration * 1_000_000,
+                    "pid": os.getpid(),
+                    "tid": lane_id,
+                    "args": args,
+                }
+            )
+
+    def write(self, path: pathlib.Path) -> None:
+        with self._lock:
+            events = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": lane_id,
+                    "args": {"name": lane},
+                }
+                for lane, lane_id in self._lanes.items()
+            ] + self._events
+
+        with path.open("w") as trace_file:
+            json.dump({"traceEvents": events}, trace_file)
+
+
+def _lane() -> str:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+
+# Tracer shared by all the process
+tracer = Tracer()
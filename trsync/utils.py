@@ -1,66 +1,576 @@
+import bisect
+import itertools
+import re
 import tkinter as tk
 from tkinter import ttk
 import typing
 
+from trsync.model import fold_workspace_name
+
+Key = typing.Hashable
+
+# Count of rows displayed by lists
+VISIBLE_ROWS = 10
+# Subset keys are ordered by sorting them when they are less than this
+# fraction of index keys, else by walking index keys
+SORT_SUBSET_RATIO = 0.25
+# Narrowed filter result is checked key by key when it has less keys than this
+NARROW_SCAN_SIZE = 2000
+# Greater than any character, to find end of words starting by a prefix
+LAST_CHARACTER = chr(0x10FFFF)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> typing.List[str]:
+    return TOKEN_PATTERN.findall(fold_workspace_name(text))
+
+
+# Keep keys in insertion order with O(log n) add, remove and positional access.
+# Removed keys leave an empty slot, counted by a Fenwick tree, until slots are
+# compacted.
+class OrderedIndex:
+    def __init__(self, keys: typing.Iterable[Key] = ()) -> None:
+        self._slots: typing.List[typing.Optional[Key]] = []
+        self._positions: typing.Dict[Key, int] = {}
+        self._tree: typing.List[int] = [0]
+        self.extend(keys)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._positions
+
+    def __iter__(self) -> typing.Iterator[Key]:
+        return (key for key in self._slots if key is not None)
+
+    def add(self, key: Key) -> None:
+        if key in self._positions:
+            return
+
+        slot = len(self._slots)
+        self._slots.append(key)
+        self._positions[key] = slot
+        if len(self._slots) >= len(self._tree):
+            self._rebuild()
+        else:
+            self._tree_add(slot, 1)
+
+    def extend(self, keys: typing.Iterable[Key]) -> None:
+        positions = self._positions
+        self._slots.extend(key for key in dict.fromkeys(keys) if key not in positions)
+        self._rebuild()
+
+    def remove(self, key: Key) -> None:
+        slot = self._positions.pop(key)
+        self._slots[slot] = None
+        self._tree_add(slot, -1)
+        if len(self._slots) - len(self._positions) > max(64, len(self._positions)):
+            self._rebuild()
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._positions.clear()
+        self._tree = [0]
+
+    def keys_view(self) -> typing.KeysView[Key]:
+        return self._positions.keys()
+
+    def subset(self, keys: typing.Collection[Key]) -> "OrderedIndex":
+        # Index of given keys (which must be present), in same order
+        subset = OrderedIndex()
+        if len(keys) == len(self._positions):
+            subset._slots = list(self._slots)
+        elif len(keys) < len(self._positions) * SORT_SUBSET_RATIO:
+            subset._slots = sorted(keys, key=self._positions.__getitem__)
+        else:
+            subset._slots = [key for key in self._slots if key in keys]
+        subset._rebuild()
+        return subset
+
+    def slice(self, start: int, count: int) -> typing.List[Key]:
+        if start >= len(self._positions) or count <= 0:
+            return []
+
+        keys = []
+        slot = self._find(start)
+        while len(keys) < count and slot < len(self._slots):
+            if (key := self._slots[slot]) is not None:
+                keys.append(key)
+            slot += 1
+        return keys
+
+    def _tree_add(self, slot: int, delta: int) -> None:
+        index = slot + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _find(self, position: int) -> int:
+        # Slot of the key at given position (among present keys)
+        capacity = len(self._tree) - 1
+        slot = 0
+        remaining = position + 1
+        step = capacity
+        while step:
+            if slot + step <= capacity and self._tree[slot + step] < remaining:
+                slot += step
+                remaining -= self._tree[slot]
+            step >>= 1
+        return slot
+
+    def _rebuild(self) -> None:
+        # Drop empty slots and build tree with room for next additions
+        self._slots = [key for key in self._slots if key is not None]
+        self._positions = dict(zip(self._slots, range(len(self._slots))))
+        capacity = 1
+        while capacity <= len(self._slots):
+            capacity <<= 1
+        self._tree = [0] + _fenwick_tree(len(self._slots), capacity)
+
+
+def _fenwick_tree(count: int, capacity: int) -> typing.List[int]:
+    # Nodes (from 1 to capacity) of Fenwick tree where only first count slots
+    # are used. Halves are built by copy instead of node by node.
+    if count == 0:
+        return [0] * capacity
+    if capacity == 1:
+        return [count]
+    half = capacity // 2
+    if count >= half:
+        left = _fenwick_tree(half, half)
+        right = left[:] if count == capacity else _fenwick_tree(count - half, half)
+    else:
+        left = _fenwick_tree(count, half)
+        right = [0] * half
+    right[-1] = count
+    return left + right
+
+
+# Find keys by prefixes of their label words. Words are kept sorted to find
+# words starting by a prefix with a binary search.
+class PrefixIndex:
+    def __init__(self) -> None:
+        self._words: typing.List[str] = []
+        self._listed_words: typing.Set[str] = set()
+        self._new_words: typing.List[str] = []
+        self._keys_by_word: typing.Dict[str, typing.Set[Key]] = {}
+        self._words_by_key: typing.Dict[Key, typing.Tuple[str, ...]] = {}
+        # Count of words of _words which are not used anymore
+        self._unused_words = 0
+
+    def __len__(self) -> int:
+        return len(self._words_by_key)
+
+    def add(self, key: Key, label: str) -> None:
+        words = tuple(dict.fromkeys(tokenize(label)))
+        if (previous_words := self._words_by_key.get(key)) == words:
+            return
+        if previous_words is not None:
+            self.remove(key)
+
+        self._words_by_key[key] = words
+        for word in words:
+            if (keys := self._keys_by_word.get(word)) is None:
+                keys = self._keys_by_word[word] = set()
+                # Sorted on next lookup, so adding a lot of keys stay linear
+                if word not in self._listed_words:
+                    self._listed_words.add(word)
+                    self._new_words.append(word)
+            keys.add(key)
+
+    def remove(self, key: Key) -> None:
+        for word in self._words_by_key.pop(key, ()):
+            keys = self._keys_by_word[word]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_word[word]
+                self._unused_words += 1
+
+    def clear(self) -> None:
+        self._words.clear()
+        self._listed_words.clear()
+        self._new_words.clear()
+        self._keys_by_word.clear()
+        self._words_by_key.clear()
+        self._unused_words = 0
+
+    def lookup(self, query: typing.Sequence[str]) -> typing.Set[Key]:
+        # Keys having, for each query prefix, a word starting by it
+        if not query:
+            return set(self._words_by_key)
+
+        self._sort_words()
+        keys: typing.Optional[typing.Set[Key]] = None
+        # Longest prefix is likely the most selective one
+        for prefix in sorted(set(query), key=len, reverse=True):
+            start = bisect.bisect_left(self._words, prefix)
+            end = bisect.bisect_left(self._words, prefix + LAST_CHARACTER, start)
+            prefix_keys: typing.Set[Key] = set().union(
+                *map(
+                    self._keys_by_word.get,
+                    self._words[start:end],
+                    itertools.repeat(()),
+                )
+            )
+            keys = prefix_keys if keys is None else keys & prefix_keys
+            if not keys:
+                break
+        assert keys is not None
+        return keys
+
+    def matches(self, key: Key, query: typing.Sequence[str]) -> bool:
+        words = self._words_by_key.get(key, ())
+        return all(any(word.startswith(prefix) for word in words) for prefix in query)
+
+    def _sort_words(self) -> None:
+        # Words not used anymore are dropped once they are the majority
+        if self._unused_words > len(self._keys_by_word):
+            self._words = sorted(self._keys_by_word)
+            self._listed_words = set(self._words)
+            self._unused_words = 0
+        elif self._new_words:
+            self._words.extend(self._new_words)
+            self._words.sort()
+        self._new_words.clear()
+
+
+# Listbox displaying only visible rows of (possibly) a lot of keys, which can
+# be filtered by typing beginning of label words
+class VirtualList(tk.Frame):
+    def __init__(
+        self,
+        parent,
+        labels: typing.Dict[Key, str],
+        on_activate: typing.Callable[[Key], None],
+        search: typing.Optional[PrefixIndex] = None,
+        rows: int = VISIBLE_ROWS,
+        **kwargs,
+    ):
+        tk.Frame.__init__(self, parent, **kwargs)
+        self._labels = labels
+        self._on_activate = on_activate
+        self._search = search if search is not None else PrefixIndex()
+        self._rows = rows
+        self._index = OrderedIndex()
+        # Keys matching query, in index order (None when not filtered)
+        self._filtered: typing.Optional[OrderedIndex] = None
+        self._query_text = ""
+        self._query: typing.List[str] = []
+        self._selected: typing.Set[Key] = set()
+        self._displayed: typing.List[Key] = []
+        self._offset = 0
+        self._render_scheduled = False
+
+        self._query_var = tk.StringVar(self)
+        self._query_var.trace_add("write", self._on_query_changed)
+        self._query_entry = ttk.Entry(self, textvariable=self._query_var)
+        self._query_entry.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self._listbox = tk.Listbox(
+            self,
+            height=rows,
+            selectmode=tk.EXTENDED,
+            exportselection=False,
+        )
+        self._listbox.grid(row=1, column=0)
+        self._listbox.bind("<<ListboxSelect>>", self._on_select)
+        self._listbox.bind("<Double-Button-1>", self._on_double_click)
+        self._listbox.bind("<MouseWheel>", self._on_mouse_wheel)
+        self._listbox.bind("<Button-4>", self._on_mouse_wheel)
+        self._listbox.bind("<Button-5>", self._on_mouse_wheel)
+        self._scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self._scrollbar.grid(row=1, column=1, sticky="ns")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._index
+
+    @property
+    def filtered(self) -> bool:
+        return self._filtered is not None
+
+    def keys(self) -> typing.Iterator[Key]:
+        return iter(self._index)
+
+    def visible_keys(self) -> typing.Iterator[Key]:
+        return iter(self._view)
+
+    def selection(self) -> typing.List[Key]:
+        return [key for key in self._view if key in self._selected]
+
+    def add(self, key: Key) -> None:
+        self._index.add(key)
+        if self._filtered is not None and self._search.matches(key, self._query):
+            self._filtered.add(key)
+        self._schedule_render()
+
+    def extend(self, keys: typing.Iterable[Key]) -> None:
+        keys = list(keys)
+        self._index.extend(keys)
+        if self._filtered is not None:
+            self._filtered.extend(
+                key for key in keys if self._search.matches(key, self._query)
+            )
+        self._schedule_render()
+
+    def remove(self, key: Key) -> None:
+        self._index.remove(key)
+        if self._filtered is not None and key in self._filtered:
+            self._filtered.remove(key)
+        self._selected.discard(key)
+        self._schedule_render()
+
+    def clear(self) -> None:
+        self._index.clear()
+        if self._filtered is not None:
+            self._filtered.clear()
+        self._selected.clear()
+        self._offset = 0
+        self._schedule_render()
+
+    def relabel(self, key: Key) -> None:
+        # Label of key changed, it may match filter or not anymore
+        if self._filtered is not None:
+            if not self._search.matches(key, self._query):
+                if key in self._filtered:
+                    self._filtered.remove(key)
+            elif key not in self._filtered:
+                self._filtered = self._index.subset(
+                    self._filtered.keys_view() | {key}
+                )
+        self._schedule_render()
+
+    def set_query(self, text: str) -> None:
+        query_text = fold_workspace_name(text)
+        query = tokenize(text)
+        if not query:
+            self._filtered = None
+        elif self._filtered is not None and query_text.startswith(self._query_text):
+            # Typing more characters can only narrow previous result, which is
+            # kept when few keys do not match anymore
+            if len(self._filtered) <= NARROW_SCAN_SIZE:
+                removed = {
+                    key
+                    for key in self._filtered
+                    if not self._search.matches(key, query)
+                }
+                matching = self._filtered.keys_view() - removed
+            else:
+                matching = self._filtered.keys_view() & self._search.lookup(query)
+                removed = self._filtered.keys_view() - matching
+            if len(removed) <= len(matching):
+                for key in removed:
+                    self._filtered.remove(key)
+            else:
+                self._filtered = self._filtered.subset(matching)
+        else:
+            matching = self._index.keys_view() & self._search.lookup(query)
+            self._filtered = self._index.subset(matching)
+
+        self._query_text = query_text
+        self._query = query
+        self._offset = 0
+        self._schedule_render()
+
+    @property
+    def _view(self) -> OrderedIndex:
+        return self._filtered if self._filtered is not None else self._index
+
+    def _on_query_changed(self, *args) -> None:
+        self.set_query(self._query_var.get())
+
+    def _schedule_render(self) -> None:
+        # Several changes made in a row cause only one render
+        if not self._render_scheduled:
+            self._render_scheduled = True
+            self.after_idle(self._render)
+
+    def _render(self) -> None:
+        self._render_scheduled = False
+        view = self._view
+        self._offset = max(0, min(self._offset, len(view) - self._rows))
+        self._displayed = view.slice(self._offset, self._rows)
+        self._listbox.delete(0, tk.END)
+        if self._displayed:
+            self._listbox.insert(
+                0, *(self._labels[key] for key in self._displayed)
+            )
+        for row, key in enumerate(self._displayed):
+            if key in self._selected:
+                self._listbox.selection_set(row)
+
+        if view:
+            self._scrollbar.set(
+                self._offset / len(view),
+                min(1.0, (self._offset + self._rows) / len(view)),
+            )
+        else:
+            self._scrollbar.set(0.0, 1.0)
+
+    def _scroll_to(self, offset: int) -> None:
+        if offset != self._offset:
+            self._offset = offset
+            self._schedule_render()
+
+    def _yview(self, *args) -> None:
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self._view)))
+        elif args[0] == "scroll":
+            step = self._rows if args[2] == "pages" else 1
+            self._scroll_to(self._offset + int(args[1]) * step)
+
+    def _on_mouse_wheel(self, event) -> str:
+        if event.num == 4 or event.delta > 0:
+            self._scroll_to(self._offset - 1)
+        else:
+            self._scroll_to(self._offset + 1)
+        return "break"
+
+    def _on_select(self, event) -> None:
+        selected_rows = set(self._listbox.curselection())
+        for row, key in enumerate(self._displayed):
+            if row in selected_rows:
+                self._selected.add(key)
+            else:
+                self._selected.discard(key)
+
+    def _on_double_click(self, event) -> None:
+        row = self._listbox.nearest(event.y)
+        if 0 <= row < len(self._displayed):
+            self._on_activate(self._displayed[row])
+
 
 class DoubleLists(tk.Frame):
     def __init__(self, parent, left_label: str, right_label: str, **kwargs):
         tk.Frame.__init__(self, parent, **kwargs)
+        self._labels: typing.Dict[Key, str] = {}
+        # Labels words of both lists
+        self._search = PrefixIndex()
 
         self._left_label = tk.Label(self, text=left_label)
         self._left_label.grid(row=0, column=0)
-        self._left_listbox = tk.Listbox(self)
-        self._left_listbox.grid(row=1, column=0)
-        self._left_listbox.bind("<<ListboxSelect>>", self._on_left_selected)
-        self._left_values: typing.List[str] = []
+        self._left_list = VirtualList(
+            self, self._labels, self._on_left_activated, self._search
+        )
+        self._left_list.grid(row=1, column=0)
+
+        self._buttons = tk.Frame(self)
+        self._buttons.grid(row=1, column=1)
+        for row, (text, command) in enumerate(
+            [
+                (">", self._move_selection_right),
+                (">>", self.move_all_right),
+                ("<", self._move_selection_left),
+                ("<<", self.move_all_left),
+            ]
+        ):
+            ttk.Button(self._buttons, text=text, width=3, command=command).grid(
+                row=row, column=0
+            )
 
         self._right_label = tk.Label(self, text=right_label)
-        self._right_label.grid(row=0, column=1)
-        self._right_listbox = tk.Listbox(self)
-        self._right_listbox.grid(row=1, column=1)
-        self._right_listbox.bind("<<ListboxSelect>>", self._on_right_selected)
-        self._right_values: typing.List[str] = []
+        self._right_label.grid(row=0, column=2)
+        self._right_list = VirtualList(
+            self, self._labels, self._on_right_activated, self._search
+        )
+        self._right_list.grid(row=1, column=2)
 
     def reset(self) -> None:
-        self._left_listbox.delete(0, tk.END)
-        self._right_listbox.delete(0, tk.END)
-        self._left_values.clear()
-        self._right_values.clear()
+        self._left_list.clear()
+        self._right_list.clear()
+        self._labels.clear()
+        self._search.clear()
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self._labels
 
-    def add_right(self, item: str) -> None:
-        self._right_listbox.insert(tk.END, item)
-        self._right_values.append(item)
+    def add_right(self, key: Key, label: str) -> None:
+        self._put(key, label, right=True)
 
-    def add_left(self, item: str) -> None:
-        self._left_listbox.insert(tk.END, item)
-        self._left_values.append(item)
+    def add_left(self, key: Key, label: str) -> None:
+        self._put(key, label, right=False)
+
+    def update(self, items: typing.Iterable[typing.Tuple[Key, str, bool]]) -> None:
+        # Make lists contain given (key, label, right) items. Only added,
+        # removed, moved or relabeled keys are changed.
+        wanted = {key: (label, right) for key, label, right in items}
+        for key in [key for key in self._labels if key not in wanted]:
+            if key in self._left_list:
+                self._left_list.remove(key)
+            else:
+                self._right_list.remove(key)
+            del self._labels[key]
+            self._search.remove(key)
+        for key, (label, right) in wanted.items():
+            self._put(key, label, right)
+
+    def get_right_ids(self) -> typing.Iterator[Key]:
+        return self._right_list.keys()
+
+    def get_left_ids(self) -> typing.Iterator[Key]:
+        return self._left_list.keys()
 
     def get_right_values(self) -> typing.List[str]:
-        return self._right_values[:]
+        return [self._labels[key] for key in self._right_list.keys()]
 
     def get_left_values(self) -> typing.List[str]:
-        return self._left_values[:]
-
-    def _on_left_selected(self, event) -> None:
-        widget = event.widget
-        selection = widget.curselection()
-        if selection:
-            selected_index = int(selection[0])
-            selected_value = widget.get(selected_index)
-            self.add_right(selected_value)
-            self._left_listbox.delete(selected_index)
-            self._left_values.remove(selected_value)
-
-    def _on_right_selected(self, event) -> None:
-        widget = event.widget
-        selection = widget.curselection()
-        if selection:
-            selected_index = int(selection[0])
-            selected_value = widget.get(selected_index)
-            self.add_left(selected_value)
-            self._right_listbox.delete(selected_index)
-            self._right_values.remove(selected_value)
-
-
-def normalize_workspace_name(name: str) -> str:
-    return name.encode("ascii", "ignore").decode()
+        return [self._labels[key] for key in self._left_list.keys()]
+
+    def move_right(self, keys: typing.Iterable[Key]) -> None:
+        self._move(keys, self._left_list, self._right_list)
+
+    def move_left(self, keys: typing.Iterable[Key]) -> None:
+        self._move(keys, self._right_list, self._left_list)
+
+    def move_all_right(self) -> None:
+        self._move_all(self._left_list, self._right_list)
+
+    def move_all_left(self) -> None:
+        self._move_all(self._right_list, self._left_list)
+
+    def _put(self, key: Key, label: str, right: bool) -> None:
+        destination, source = (
+            (self._right_list, self._left_list)
+            if right
+            else (self._left_list, self._right_list)
+        )
+        relabeled = key in self._labels and self._labels[key] != label
+        if relabeled or key not in self._labels:
+            self._labels[key] = label
+            self._search.add(key, label)
+        if key in source:
+            source.remove(key)
+        if key not in destination:
+            destination.add(key)
+        elif relabeled:
+            destination.relabel(key)
+
+    def _move(
+        self, keys: typing.Iterable[Key], source: VirtualList, destination: VirtualList
+    ) -> None:
+        for key in list(keys):
+            source.remove(key)
+            destination.add(key)
+
+    def _move_all(self, source: VirtualList, destination: VirtualList) -> None:
+        # Only keys matching filter are moved
+        if source.filtered:
+            self._move(source.visible_keys(), source, destination)
+            return
+        destination.extend(source.keys())
+        source.clear()
+
+    def _move_selection_right(self) -> None:
+        self.move_right(self._left_list.selection())
+
+    def _move_selection_left(self) -> None:
+        self.move_left(self._right_list.selection())
+
+    def _on_left_activated(self, key: Key) -> None:
+        self.move_right([key])
+
+    def _on_right_activated(self, key: Key) -> None:
+        self.move_left([key])
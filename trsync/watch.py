@@ -0,0 +1,134 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import threading
+import typing
+
+# Seconds between two config file checks when inotify is not available
+POLL_INTERVAL = 1.0
+# Seconds during which successive file events are coalesced
+COALESCE_DELAY = 0.1
+
+# inotify constants, see <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ConfigWatcher:
+    # Call on_change (from watcher thread) when watched file changed. Directory
+    # is watched because file is replaced (and not modified) by atomic writes
+    def __init__(
+        self,
+        path: pathlib.Path,
+        on_change: typing.Callable[[], None],
+        poll_interval: float = POLL_INTERVAL,
+    ) -> None:
+        self._path = path
+        self._on_change = on_change
+        self._poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+        self._inotify_fd: typing.Optional[int] = None
+        self._wake_read_fd: typing.Optional[int] = None
+        self._wake_write_fd: typing.Optional[int] = None
+
+    def start(self) -> None:
+        self._inotify_fd = _inotify_watch(self._path.parent)
+        if self._inotify_fd is not None:
+            self._wake_read_fd, self._wake_write_fd = os.pipe()
+            target = self._watch_inotify
+        else:
+            print(f"Watch {self._path} by polling")
+            target = self._watch_polling
+        self._thread = threading.Thread(
+            target=target, name="trsync-config-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._wake_write_fd is not None:
+            os.write(self._wake_write_fd, b"\0")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._inotify_fd, self._wake_read_fd, self._wake_write_fd):
+            if fd is not None:
+                os.close(fd)
+        self._inotify_fd = self._wake_read_fd = self._wake_write_fd = None
+
+    def _watch_inotify(self) -> None:
+        assert self._inotify_fd is not None and self._wake_read_fd is not None
+        name = os.fsencode(self._path.name)
+        changed = False
+        while not self._stop.is_set():
+            # Once a change is seen, wait a bit more to coalesce following events
+            readable, _, _ = select.select(
+                [self._inotify_fd, self._wake_read_fd],
+                [],
+                [],
+                COALESCE_DELAY if changed else None,
+            )
+            if self._wake_read_fd in readable:
+                return
+            if not readable:
+                changed = False
+                self._on_change()
+                continue
+
+            try:
+                buffer = os.read(self._inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                if buffer[offset : offset + length].rstrip(b"\0") == name:
+                    changed = True
+                offset += length
+
+    def _watch_polling(self) -> None:
+        last = _file_signature(self._path)
+        while not self._stop.wait(self._poll_interval):
+            if (signature := _file_signature(self._path)) != last:
+                last = signature
+                self._on_change()
+
+
+def _file_signature(
+    path: pathlib.Path,
+) -> typing.Optional[typing.Tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _inotify_watch(folder: pathlib.Path) -> typing.Optional[int]:
+    if not hasattr(os, "pipe") or not (library := ctypes.util.find_library("c")):
+        return None
+    try:
+        libc = ctypes.CDLL(library, use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+    fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+        os.close(fd)
+        return None
+    return fd